@@ -0,0 +1,76 @@
+# Benchmark the payload reduction of the compact result format.
+# Runs every `sparql_query_examples` entry of the MIE files and compares the size of
+# the endpoint's CSV with the compact CSV/TSV produced by `run_sparql`.
+# Run this from the repository root:
+#   uv run script/bench_compact.py [dbname ...]
+import asyncio
+import os
+import sys
+
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import compact_results  # noqa: E402
+from server import MIE_DIR, SHEX_DIR, SPARQL_ENDPOINT, execute_sparql, execute_sparql_bindings  # noqa: E402
+
+CONCURRENCY = 4
+
+
+def load_examples(dbnames):
+    examples = []
+    for dbname in dbnames:
+        path = os.path.join(MIE_DIR, f"{dbname}.yaml")
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as file:
+            data = yaml.safe_load(file)
+        for i, example in enumerate(data.get("sparql_query_examples") or []):
+            if isinstance(example, dict) and example.get("sparql"):
+                examples.append((dbname, example.get("title") or f"example {i + 1}", example["sparql"]))
+    return examples
+
+
+async def measure(semaphore, namespaces, dbname, title, query):
+    async with semaphore:
+        try:
+            csv_text = await execute_sparql(query, dbname)
+            results = await execute_sparql_bindings(query, dbname)
+        except Exception as e:
+            return dbname, title, None, f"{type(e).__name__}: {e}"
+    sizes = {
+        "csv": len(csv_text.encode("utf-8")),
+        "compact_csv": len(compact_results.compact_bindings(
+            results["vars"], results["bindings"], namespaces, ",").encode("utf-8")),
+        "compact_tsv": len(compact_results.compact_bindings(
+            results["vars"], results["bindings"], namespaces, "\t").encode("utf-8")),
+        "rows": len(results["bindings"]),
+    }
+    return dbname, title, sizes, None
+
+
+async def main(dbnames):
+    namespaces = compact_results.load_prefix_table(MIE_DIR, SHEX_DIR)
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    examples = load_examples(dbnames)
+    results = await asyncio.gather(*(measure(semaphore, namespaces, *ex) for ex in examples))
+
+    totals = {"csv": 0, "compact_csv": 0, "compact_tsv": 0}
+    print(f"{'database':<10} {'rows':>6} {'csv':>9} {'c-csv':>9} {'c-tsv':>9} {'ratio':>6}  example")
+    for dbname, title, sizes, error in results:
+        if error:
+            print(f"{dbname:<10} {'-':>6} {'-':>9} {'-':>9} {'-':>9} {'-':>6}  {title} [{error}]")
+            continue
+        for key in totals:
+            totals[key] += sizes[key]
+        ratio = sizes["compact_tsv"] / sizes["csv"] if sizes["csv"] else 1.0
+        print(f"{dbname:<10} {sizes['rows']:>6} {sizes['csv']:>9} {sizes['compact_csv']:>9} "
+              f"{sizes['compact_tsv']:>9} {ratio:>6.2f}  {title}")
+    if totals["csv"]:
+        print(f"\nTotal: csv={totals['csv']} compact_csv={totals['compact_csv']} "
+              f"({totals['compact_csv'] / totals['csv']:.1%}) compact_tsv={totals['compact_tsv']} "
+              f"({totals['compact_tsv'] / totals['csv']:.1%})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:] or sorted(SPARQL_ENDPOINT.keys())))
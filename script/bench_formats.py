@@ -0,0 +1,248 @@
+# Benchmark the SPARQL result formats and compressions of each type of backend.
+# Sends one SELECT query per backend (Virtuoso at RDF Portal, GraphDB at plod.dbcls.jp,
+# Blazegraph at Wikidata) in every result format (JSON, TSV, XML, CSV) and with every
+# content encoding httpx can decode here, and reports the bytes on the wire, the size of
+# the decompressed body, and the CPU time of the whole download plus the time spent in the
+# decoders of `result_formats` (the best of --repeat runs).
+# With --stub, the backends are replaced by an in-process stub that serves a synthetic
+# result in each format and encoding, which measures the client side only; like the real
+# backend, it serves TSV in Virtuoso's dialect (quoted variable names, IRIs as quoted
+# strings, no datatypes or languages) for the Virtuoso endpoint. The "typed" column tells
+# whether the served format keeps the term types (`result_formats` requires them for typed
+# callers).
+# Run this from the repository root:
+#   uv run script/bench_formats.py [backend ...] [--repeat 3]
+#   uv run script/bench_formats.py --stub --rows 20000
+import argparse
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+import time
+import zlib
+from xml.sax.saxutils import escape, quoteattr
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import http_client  # noqa: E402
+from result_formats import DECODERS, MEDIA_TYPES, format_of  # noqa: E402
+
+BACKENDS = {
+    "virtuoso": (
+        "https://rdfportal.org/backend/sib/sparql",
+        "PREFIX up: <http://purl.uniprot.org/core/>\n"
+        "SELECT ?protein ?mnemonic ?organism ?created WHERE {\n"
+        "  ?protein a up:Protein ; up:mnemonic ?mnemonic ; up:organism ?organism ; up:created ?created .\n"
+        "} LIMIT 10000",
+    ),
+    "graphdb": (
+        "https://plod.dbcls.jp/repositories/RDFPortal_VoID2",
+        "SELECT ?s ?p ?o WHERE { ?s ?p ?o } LIMIT 10000",
+    ),
+    "blazegraph": (
+        "https://query.wikidata.org/sparql",
+        "PREFIX wd: <http://www.wikidata.org/entity/>\n"
+        "PREFIX wdt: <http://www.wikidata.org/prop/direct/>\n"
+        "PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>\n"
+        "SELECT ?item ?label ?mass WHERE {\n"
+        "  ?item wdt:P31 wd:Q11173 ; rdfs:label ?label ; wdt:P2067 ?mass . FILTER(LANG(?label) = \"en\")\n"
+        "} LIMIT 10000",
+    ),
+}
+HEADERS = {"User-Agent": "RDFPortal-MCP bench_formats.py"}
+ENCODINGS = ["identity"] + http_client.ENCODINGS
+
+
+# --- Stub backend ---
+def synthetic_result(rows):
+    variables = ["item", "label", "mass", "note"]
+    bindings = []
+    for i in range(rows):
+        binding = {
+            "item": {"type": "uri", "value": f"http://purl.uniprot.org/uniprot/P{i:05d}"},
+            "label": {"type": "literal", "value": f"protein {i % 977}", "xml:lang": "en"},
+            "mass": {"type": "literal", "value": str(10000 + i * 7),
+                     "datatype": "http://www.w3.org/2001/XMLSchema#integer"},
+        }
+        if i % 3 == 0:
+            binding["note"] = {"type": "literal", "value": f"line one\tof {i}\nline \"two\""}
+        bindings.append(binding)
+    return variables, bindings
+
+
+def _tsv_term(term):
+    if term["type"] == "uri":
+        return f"<{term['value']}>"
+    if term["type"] == "bnode":
+        return f"_:{term['value']}"
+    value = term["value"].replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace('"', '\\"')
+    if "xml:lang" in term:
+        return f"\"{value}\"@{term['xml:lang']}"
+    if "datatype" in term:
+        return f"\"{value}\"^^<{term['datatype']}>"
+    return f"\"{value}\""
+
+
+def _virtuoso_tsv_term(term):
+    value = term["value"].replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace('"', '\\"')
+    if term.get("datatype", "").endswith(("#integer", "#decimal", "#double")):
+        return value
+    return f"\"{value}\""
+
+
+def _xml_term(term):
+    if term["type"] == "uri":
+        return f"<uri>{escape(term['value'])}</uri>"
+    if term["type"] == "bnode":
+        return f"<bnode>{escape(term['value'])}</bnode>"
+    attributes = ""
+    if "xml:lang" in term:
+        attributes = f" xml:lang={quoteattr(term['xml:lang'])}"
+    elif "datatype" in term:
+        attributes = f" datatype={quoteattr(term['datatype'])}"
+    return f"<literal{attributes}>{escape(term['value'])}</literal>"
+
+
+def serialize(name, variables, bindings, dialect="w3c"):
+    if name == "tsv" and dialect == "virtuoso":
+        lines = ["\t".join(f'"{v}"' for v in variables)]
+        lines += ["\t".join(_virtuoso_tsv_term(b[v]) if v in b else "" for v in variables) for b in bindings]
+        return ("\n".join(lines) + "\n").encode("utf-8")
+    if name == "json":
+        return json.dumps({"head": {"vars": variables}, "results": {"bindings": bindings}}).encode("utf-8")
+    if name == "tsv":
+        lines = ["\t".join(f"?{v}" for v in variables)]
+        lines += ["\t".join(_tsv_term(b[v]) if v in b else "" for v in variables) for b in bindings]
+        return ("\n".join(lines) + "\n").encode("utf-8")
+    if name == "csv":
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\r\n")
+        writer.writerow(variables)
+        writer.writerows([b[v]["value"] if v in b else "" for v in variables] for b in bindings)
+        return out.getvalue().encode("utf-8")
+    head = "".join(f"<variable name={quoteattr(v)}/>" for v in variables)
+    results = "".join(
+        "<result>" + "".join(f"<binding name={quoteattr(v)}>{_xml_term(b[v])}</binding>" for v in variables if v in b)
+        + "</result>\n" for b in bindings)
+    return ('<?xml version="1.0"?>\n<sparql xmlns="http://www.w3.org/2005/sparql-results#">'
+            f"<head>{head}</head><results>\n{results}</results></sparql>\n").encode("utf-8")
+
+
+def compress(encoding, body):
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    if encoding == "deflate":
+        return zlib.compress(body, 6)
+    if encoding == "br":
+        import brotli
+        return brotli.compress(body, quality=5)
+    if encoding == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    return body
+
+
+def stub_transport(rows):
+    variables, bindings = synthetic_result(rows)
+    virtuoso = httpx.URL(BACKENDS["virtuoso"][0]).host
+    bodies = {(name, dialect): serialize(name, variables, bindings, dialect)
+              for name in MEDIA_TYPES for dialect in ("w3c", "virtuoso")}
+    compressed = {}
+
+    def handler(request):
+        name = format_of(request.headers["accept"]) or "json"
+        dialect = "virtuoso" if request.url.host == virtuoso else "w3c"
+        encoding = request.headers.get("accept-encoding", "identity").split(",")[0].strip()
+        key = (name, dialect, encoding)
+        if key not in compressed:
+            compressed[key] = compress(encoding, bodies[name, dialect])
+        headers = {"Content-Type": MEDIA_TYPES[name]}
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return httpx.Response(200, headers=headers, content=chunks(compressed[key]))
+
+    async def chunks(data, size=65536):
+        for i in range(0, len(data), size):
+            yield data[i:i + size]
+
+    return httpx.MockTransport(handler)
+
+
+# --- Measurement ---
+async def measure(client, endpoint, query, name, encoding):
+    headers = {"Accept": MEDIA_TYPES[name], "Accept-Encoding": encoding, **HEADERS}
+    cpu_started, started = time.process_time(), time.perf_counter()
+    async with client.stream("POST", endpoint, data={"query": query}, headers=headers) as response:
+        response.raise_for_status()
+        served = format_of(response.headers.get("content-type", ""))
+        if served is None:
+            raise ValueError(f"unexpected content type {response.headers.get('content-type')}")
+        decoder = DECODERS[served]()
+        decode_seconds, body_bytes = 0.0, 0
+        async for chunk in response.aiter_bytes():
+            body_bytes += len(chunk)
+            t = time.perf_counter()
+            decoder.feed(chunk)
+            decode_seconds += time.perf_counter() - t
+        t = time.perf_counter()
+        _, bindings = decoder.close()
+        decode_seconds += time.perf_counter() - t
+        return {
+            "served": served,
+            "typed": served in ("json", "xml") or (served == "tsv" and decoder.w3c),
+            "encoding": response.headers.get("content-encoding", "identity"),
+            "rows": len(bindings),
+            "wire": response.num_bytes_downloaded,
+            "body": body_bytes,
+            "seconds": time.perf_counter() - started,
+            "cpu": time.process_time() - cpu_started,
+            "decode": decode_seconds,
+        }
+
+
+async def bench_backend(client, backend, endpoint, query, repeat):
+    print(f"\n{backend}: {endpoint}")
+    print(f"{'format':<6} {'encoding':<9} {'served':<13} {'rows':>6} {'wire KB':>9} {'body KB':>9} "
+          f"{'wall ms':>8} {'cpu ms':>8} {'decode ms':>9} {'typed':>5}")
+    for name in MEDIA_TYPES:
+        for encoding in ENCODINGS:
+            best = None
+            try:
+                for _ in range(repeat):
+                    result = await measure(client, endpoint, query, name, encoding)
+                    if best is None or result["cpu"] < best["cpu"]:
+                        best = result
+            except Exception as e:
+                print(f"{name:<6} {encoding:<9} [{type(e).__name__}: {str(e).splitlines()[0][:80]}]")
+                continue
+            served = best["served"] + ("" if best["encoding"] == "identity" else "+" + best["encoding"])
+            print(f"{name:<6} {encoding:<9} {served:<13} {best['rows']:>6} {best['wire'] / 1024:>9.1f} "
+                  f"{best['body'] / 1024:>9.1f} {best['seconds'] * 1000:>8.1f} {best['cpu'] * 1000:>8.1f} "
+                  f"{best['decode'] * 1000:>9.1f} {'yes' if best['typed'] else 'no':>5}")
+
+
+async def main(args):
+    transport = stub_transport(args.rows) if args.stub else None
+    async with httpx.AsyncClient(transport=transport, timeout=args.timeout) as client:
+        for backend in args.backends or list(BACKENDS):
+            endpoint, query = BACKENDS[backend]
+            await bench_backend(client, backend, endpoint, query, args.repeat)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the SPARQL result formats and compressions of each backend.")
+    parser.add_argument("backends", nargs="*", help=f"Backends to benchmark: {', '.join(BACKENDS)} (default all).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per format and encoding; the best is reported.")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds per request.")
+    parser.add_argument("--stub", action="store_true", help="Serve a synthetic result from an in-process stub.")
+    parser.add_argument("--rows", type=int, default=20000, help="Rows of the synthetic result of --stub.")
+    args = parser.parse_args()
+    unknown = [b for b in args.backends if b not in BACKENDS]
+    if unknown:
+        parser.error(f"unknown backends: {', '.join(unknown)}")
+    asyncio.run(main(args))
@@ -0,0 +1,86 @@
+# Benchmark cold-start time and memory of the two-process setup against `unified.py`.
+# Each server is started as Claude Desktop does (stdio), and timed until it has answered
+# `initialize` and `tools/list`. The resident set size is read once it is ready.
+# Run this from the repository root:
+#   uv run script/bench_startup.py [runs]
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SETUPS = {
+    "two processes": ["src/server.py", "src/api_tools.py"],
+    "unified": ["src/unified.py"],
+}
+
+
+def rss_kib(pid):
+    try:
+        with open(f"/proc/{pid}/status", "r") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return int(subprocess.run(["ps", "-o", "rss=", "-p", str(pid)], capture_output=True, text=True).stdout.strip() or 0)
+
+
+def request(process, id, method, params=None):
+    message = {"jsonrpc": "2.0", "method": method, "params": params or {}}
+    if id is not None:
+        message["id"] = id
+    process.stdin.write(json.dumps(message) + "\n")
+    process.stdin.flush()
+    if id is None:
+        return None
+    while True:
+        line = process.stdout.readline()
+        if not line:
+            raise RuntimeError(f"Server exited during {method}")
+        reply = json.loads(line)
+        if reply.get("id") == id:
+            return reply
+
+
+def start(script):
+    """Start a server and return (process, seconds until tools/list answered, number of tools)."""
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, script], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL, text=True)
+    request(process, 1, "initialize", {
+        "protocolVersion": "2025-06-18", "capabilities": {},
+        "clientInfo": {"name": "bench_startup", "version": "0"}})
+    request(process, None, "notifications/initialized")
+    tools = request(process, 2, "tools/list")["result"]["tools"]
+    return process, time.perf_counter() - started, len(tools)
+
+
+def measure(scripts):
+    """Start the servers of a setup one after the other; return total start time, RSS and tools."""
+    results = []
+    try:
+        for script in scripts:
+            results.append(start(script))
+        return (sum(r[1] for r in results), sum(rss_kib(r[0].pid) for r in results),
+                sum(r[2] for r in results))
+    finally:
+        processes = [r[0] for r in results]
+        for process in processes:
+            process.kill()
+            process.wait()
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"{'setup':<16}{'start (s)':>12}{'RSS (MiB)':>12}{'tools':>8}")
+    for name, scripts in SETUPS.items():
+        samples = [measure(scripts) for _ in range(runs)]
+        seconds = statistics.median(s[0] for s in samples)
+        rss = statistics.median(s[1] for s in samples) / 1024
+        print(f"{name:<16}{seconds:>12.2f}{rss:>12.1f}{samples[0][2]:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# Build or refresh the local cross-reference link tables used by the `map_ids` tool.
+# Every link set of `link_tables.LINK_SETS` is extracted from its database with paginated
+# SELECT queries and written to a memory-mapped table under ~/.cache/rdfportal-mcp/links
+# (or $RDFPORTAL_CACHE_DIR/links). By default only the tables that are missing or older than
+# the update frequency of their database (from its MIE file) are rebuilt, so the script can
+# run from cron; --force rebuilds the named (or all) link sets.
+# Run this from the repository root:
+#   uv run script/build_link_tables.py [link_set ...] [--force]
+#   uv run script/build_link_tables.py --list
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import http_client  # noqa: E402
+import link_tables  # noqa: E402
+from server import MIE_DIR, SPARQL_ENDPOINT  # noqa: E402
+
+
+def list_tables():
+    print(f"{'link set':<22} {'namespaces':<26} {'database':<9} {'update':<10} {'links':>9}  built")
+    for entry in link_tables.status(MIE_DIR):
+        namespaces = f"{entry['source']} -> {entry['target']}"
+        state = entry["built"] or "never"
+        if entry["stale"] and entry["built"]:
+            state += " (stale)"
+        print(f"{entry['name']:<22} {namespaces:<26} {entry['dbname']:<9} {entry['update_frequency'] or '-':<10} "
+              f"{entry['links']:>9}  {state}")
+
+
+async def main(args):
+    try:
+        report = await link_tables.build(SPARQL_ENDPOINT, MIE_DIR, args.link_sets, args.force,
+                                         log=lambda message: print(message, flush=True))
+    finally:
+        await http_client.aclose()
+    if not report:
+        print("All link tables are up to date.")
+    return 1 if any("error" in entry for entry in report) else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or refresh the local cross-reference link tables.")
+    parser.add_argument("link_sets", nargs="*", help=f"Link sets to build: {', '.join(link_tables.LINK_SETS)} (default all stale).")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the tables are up to date.")
+    parser.add_argument("--list", action="store_true", help="Show the link sets and the state of their tables, and exit.")
+    args = parser.parse_args()
+    unknown = [name for name in args.link_sets if name not in link_tables.LINK_SETS]
+    if unknown:
+        parser.error(f"unknown link sets: {', '.join(unknown)}")
+    if args.list:
+        list_tables()
+        sys.exit(0)
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,225 @@
+# Validate the SPARQL and RDF examples of all databases and watch for regressions.
+# Runs every `sparql_query_examples` entry and every `sample_rdf_entries` entry (as an ASK
+# query checking that the triples exist) of the MIE files, and every sparql-examples/*.rq
+# (against the endpoint named in its `# Endpoint:` header; files without one are reported
+# as skipped), concurrently with a limit per SPARQL endpoint. Latency, row counts and
+# failures are appended to a JSONL history file (~/.cache/rdfportal-mcp/validation_history.jsonl
+# or under $RDFPORTAL_CACHE_DIR), and examples that started failing, returned no rows or
+# got slower since the previous run are flagged (the exit status is 1 if any are).
+# With --stub, the endpoints are replaced by an in-process stub that answers every query
+# after a fixed delay, which makes the run a deterministic throughput benchmark.
+# Run this from the repository root:
+#   uv run script/validate_examples.py [dbname ...] [--kinds query,rdf,rq] [--per-backend 2]
+#   uv run script/validate_examples.py --stub --stub-latency 0.05
+import argparse
+import asyncio
+import datetime
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import mie_cache  # noqa: E402
+from compact_results import PREFIX_PATTERN, load_prefix_table  # noqa: E402
+from id_cache import CACHE_DIR  # noqa: E402
+from server import MIE_DIR, SHEX_DIR, SPARQL_ENDPOINT, SPARQL_EXAMPLES  # noqa: E402
+
+KINDS = ("query", "rdf", "rq")
+DEFAULT_HISTORY = os.path.join(CACHE_DIR, "validation_history.jsonl")
+SLOWER_FACTOR = 1.5  # flag examples taking this many times longer than in the previous run,
+SLOWER_MIN_DELTA = 0.5  # and at least this many seconds longer.
+TURTLE_PREFIX = re.compile(r"^\s*@prefix\s+([\w.-]*):\s*<([^>]*)>\s*\.\s*$", re.IGNORECASE | re.MULTILINE)
+RQ_ENDPOINT = re.compile(r"^#\s*Endpoint:\s*(https?://\S+)", re.MULTILINE)
+
+
+def rdf_to_ask(rdf, declared, namespaces):
+    """Turn a Turtle sample into an ASK query for its triples."""
+    prefixes = dict(declared)
+    prefixes.update(TURTLE_PREFIX.findall(rdf))
+    body = TURTLE_PREFIX.sub("", rdf).strip()
+    labels = {label: ns for ns, label in namespaces.items()}
+    for label in set(re.findall(r"(?<![\w<:/#\"])([A-Za-z][\w.-]*):(?=[\w])", body)):
+        if label not in prefixes and label in labels:
+            prefixes[label] = labels[label]
+    header = "".join(f"PREFIX {label}: <{ns}>\n" for label, ns in prefixes.items())
+    return f"{header}ASK WHERE {{\n{body}\n}}"
+
+
+def load_examples(dbnames, kinds, rq_names=None):
+    """
+    The examples of the MIE files of `dbnames`, and of the sparql-examples/*.rq files named
+    in `rq_names` (all of them if None).
+    """
+    namespaces = load_prefix_table(MIE_DIR, SHEX_DIR)
+    examples = []
+    for dbname in dbnames:
+        path = os.path.join(MIE_DIR, f"{dbname}.yaml")
+        if os.path.exists(path):
+            data = mie_cache.load_yaml(path)
+            endpoint = SPARQL_ENDPOINT.get(dbname) or (data.get("schema_info") or {}).get("endpoint")
+            declared = dict(PREFIX_PATTERN.findall(str(data.get("shape_expressions") or "")))
+            if "query" in kinds:
+                for i, example in enumerate(data.get("sparql_query_examples") or []):
+                    if isinstance(example, dict) and example.get("sparql"):
+                        examples.append({"id": f"{dbname}/query/{i + 1}", "title": example.get("title", ""),
+                                         "endpoint": endpoint, "kind": "query", "sparql": example["sparql"]})
+            if "rdf" in kinds:
+                for i, entry in enumerate(data.get("sample_rdf_entries") or []):
+                    if isinstance(entry, dict) and entry.get("rdf"):
+                        examples.append({"id": f"{dbname}/rdf/{i + 1}", "title": entry.get("title", ""),
+                                         "endpoint": endpoint, "kind": "rdf",
+                                         "sparql": rdf_to_ask(entry["rdf"], declared, namespaces)})
+    if "rq" in kinds:
+        for rq_path in sorted(glob.glob(os.path.join(SPARQL_EXAMPLES, "*.rq"))):
+            name = os.path.splitext(os.path.basename(rq_path))[0]
+            if rq_names is not None and name not in rq_names:
+                continue
+            with open(rq_path, "r", encoding="utf-8") as file:
+                text = file.read()
+            header = RQ_ENDPOINT.search(text)
+            examples.append({"id": f"{name}/rq/1", "title": os.path.basename(rq_path), "kind": "rq",
+                             "endpoint": header.group(1) if header else None, "sparql": text})
+    return examples
+
+
+def stub_transport(latency):
+    """A stand-in endpoint: a fixed delay, then a small answer derived from the query text."""
+    async def handler(request):
+        await asyncio.sleep(latency)
+        query = httpx.QueryParams(request.content.decode("utf-8")).get("query", "")
+        if re.search(r"\bASK\b", query, re.IGNORECASE):
+            return httpx.Response(200, json={"head": {}, "boolean": True})
+        rows = int(hashlib.sha256(query.encode("utf-8")).hexdigest(), 16) % 10 + 1
+        return httpx.Response(200, json={"head": {"vars": ["x"]}, "results": {
+            "bindings": [{"x": {"type": "literal", "value": str(i)}} for i in range(rows)]}})
+    return httpx.MockTransport(handler)
+
+
+async def run_example(client, semaphores, example, timeout):
+    record = {"id": example["id"], "kind": example["kind"], "title": example["title"],
+              "endpoint": example["endpoint"], "ok": False, "skipped": False, "latency": None, "rows": None,
+              "error": None}
+    if not example["endpoint"]:
+        record["skipped"] = True
+        record["error"] = "No endpoint" if example["kind"] != "rq" else "No '# Endpoint:' header"
+        return record
+    async with semaphores[example["endpoint"]]:
+        started = time.perf_counter()
+        try:
+            response = await client.post(example["endpoint"], data={"query": example["sparql"]},
+                                         headers={"Accept": "application/sparql-results+json"}, timeout=timeout)
+            response.raise_for_status()
+            data = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            record["latency"] = round(time.perf_counter() - started, 3)
+            record["error"] = f"{type(e).__name__}: {e}"[:300]
+            return record
+        record["latency"] = round(time.perf_counter() - started, 3)
+    if "boolean" in data:
+        record["rows"] = int(bool(data["boolean"]))
+        record["ok"] = bool(data["boolean"])
+        if not record["ok"]:
+            record["error"] = "The RDF example was not found in the database"
+    else:
+        record["rows"] = len(data.get("results", {}).get("bindings", []))
+        record["ok"] = True
+    return record
+
+
+def previous_run(history):
+    """The records of the most recent run in the history file, keyed by example ID."""
+    if not history or not os.path.exists(history):
+        return {}
+    runs = defaultdict(dict)
+    last = None
+    with open(history, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            runs[record["run"]][record["id"]] = record
+            last = record["run"]
+    return runs[last] if last else {}
+
+
+def regressions(record, previous):
+    """The reasons to flag an example, compared with its previous record."""
+    if previous is None or record.get("skipped"):
+        return []
+    flags = []
+    if previous["ok"] and not record["ok"]:
+        flags.append("now failing")
+    elif record["ok"] and previous["ok"] and previous["rows"] and not record["rows"]:
+        flags.append("no rows")
+    if (record["ok"] and previous["ok"] and record["latency"] is not None and previous["latency"] is not None
+            and record["latency"] > previous["latency"] * SLOWER_FACTOR
+            and record["latency"] - previous["latency"] > SLOWER_MIN_DELTA):
+        flags.append(f"slower ({previous['latency']:.2f}s -> {record['latency']:.2f}s)")
+    return flags
+
+
+async def main(args):
+    dbnames = args.dbnames or sorted(SPARQL_ENDPOINT.keys())
+    kinds = [k for k in args.kinds.split(",") if k]
+    unknown = [k for k in kinds if k not in KINDS]
+    if unknown:
+        sys.exit(f"Unknown kinds {unknown}. Supported kinds are {', '.join(KINDS)}.")
+    history = args.history if args.history is not None else (None if args.stub else DEFAULT_HISTORY)
+    examples = load_examples(dbnames, kinds, set(args.dbnames) if args.dbnames else None)
+    previous = previous_run(history)
+    semaphores = defaultdict(lambda: asyncio.Semaphore(args.per_backend))
+    transport = stub_transport(args.stub_latency) if args.stub else None
+    limits = httpx.Limits(max_connections=args.concurrency)
+
+    started = time.perf_counter()
+    async with httpx.AsyncClient(transport=transport, limits=limits) as client:
+        records = await asyncio.gather(*(run_example(client, semaphores, ex, args.timeout) for ex in examples))
+    elapsed = time.perf_counter() - started
+
+    run_id = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+    flagged = 0
+    print(f"{'example':<22} {'ok':<4} {'latency':>8} {'rows':>6}  title")
+    for record in records:
+        record["run"] = run_id
+        flags = regressions(record, previous.get(record["id"]))
+        flagged += bool(flags)
+        latency = f"{record['latency']:.2f}" if record["latency"] is not None else "-"
+        rows = record["rows"] if record["rows"] is not None else "-"
+        note = f" [{record['error']}]" if record["error"] else ""
+        note += f" <-- {', '.join(flags)}" if flags else ""
+        status = "skip" if record["skipped"] else "yes" if record["ok"] else "NO"
+        print(f"{record['id']:<22} {status:<4} {latency:>8} {rows:>6}  {record['title']}{note}")
+
+    failed = sum(not r["ok"] and not r["skipped"] for r in records)
+    skipped = sum(r["skipped"] for r in records)
+    print(f"\n{len(records)} examples, {failed} failed, {skipped} skipped, {flagged} flagged, "
+          f"{elapsed:.2f}s ({len(records) / elapsed if elapsed else 0:.1f} examples/s)")
+    if history:
+        os.makedirs(os.path.dirname(os.path.abspath(history)), exist_ok=True)
+        with open(history, "a", encoding="utf-8") as file:
+            for record in records:
+                file.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return 1 if flagged else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate the SPARQL and RDF examples of the MIE files.")
+    parser.add_argument("dbnames", nargs="*", help="Databases (MIE files) and sparql-examples/*.rq names to validate (default: all).")
+    parser.add_argument("--kinds", default=",".join(KINDS), help="Comma-separated kinds: query, rdf, rq.")
+    parser.add_argument("--per-backend", type=int, default=2, help="Concurrent queries per SPARQL endpoint.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent queries in total.")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds per query.")
+    parser.add_argument("--history", default=None,
+                        help=f"JSONL history file (default {DEFAULT_HISTORY}; none with --stub).")
+    parser.add_argument("--stub", action="store_true", help="Answer queries with an in-process stub endpoint.")
+    parser.add_argument("--stub-latency", type=float, default=0.05, help="Seconds the stub takes per query.")
+    sys.exit(asyncio.run(main(parser.parse_args())))
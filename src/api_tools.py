@@ -1,17 +1,32 @@
+import asyncio
 import httpx
 from fastmcp import FastMCP
 from typing import List, Dict, Annotated
 from pydantic import Field
+import itertools
 import json
+import time
+from urllib.parse import urljoin
 
+import http_client
+import image_cache
+import scheduler
+from batching import MicroBatcher, coalesce
+from id_cache import cached_lookup
+from pagination import collect
+from sparqlist import call_sparqlist, describe_apis, describe_chains, gtc_image_entry, run_chain
 
 mcp = FastMCP("TogoMCP Support API Tools")
+mcp.add_middleware(scheduler.SessionMiddleware())
 
 ######################################
 #####　Database-specific tools ########
 ######################################
 # DB: UniProt
+UNIPROT_MAX_PAGE_SIZE = 500
+
 @mcp.tool(enabled=True)
+@cached_lookup("uniprot", is_negative=lambda tsv: len(tsv.strip().splitlines()) <= 1)
 async def search_uniprot_entity(query: str, limit: int = 20) -> str:
     """
     Search for a UniProt entity ID by query.
@@ -28,17 +43,38 @@ async def search_uniprot_entity(query: str, limit: int = 20) -> str:
         "query": query,
         "fields": "accession,protein_name,organism_name",
         "format": "tsv",
-        "size": limit 
+        "size": max(1, min(limit, UNIPROT_MAX_PAGE_SIZE))
     }
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params)
-    response.raise_for_status()
-    data = response.text
-    
-    return data
+    header = []
+    async with http_client.session() as client:
+        async def fetch_page(next_url):
+            # Later pages are addressed by the cursor URL in the `Link: <...>; rel="next"` header.
+            if next_url is None:
+                response = await client.get(url, params=params)
+            else:
+                response = await client.get(next_url)
+            response.raise_for_status()
+            lines = response.text.splitlines()
+            if lines and not header:
+                header.append(lines[0])
+            return lines[1:], response.links.get("next", {}).get("url")
+
+        rows = await collect(fetch_page, limit)
+    if not header:
+        return ""
+    return "\n".join(header + rows) + "\n"
 
 # DB: ChEMBL
-async def search_chembl_generic(entity_type: str, query: str, limit: int = 20) -> dict:
+CHEMBL_API = "https://www.ebi.ac.uk"
+CHEMBL_MAX_PAGE_SIZE = 1000
+CHEMBL_LIST_KEYS = {
+    "chembl_id_lookup": "chembl_id_lookups",
+    "target": "targets",
+    "molecule": "molecules",
+}
+
+@cached_lookup("chembl", is_negative=lambda bulk: bulk.get("page_meta", {}).get("total_count", 0) == 0)
+async def search_chembl_generic(entity_type: str, query: str, limit: int = 20, offset: int = 0) -> dict:
     """
     Search for ChEMBL ID by query.
 
@@ -46,22 +82,38 @@ async def search_chembl_generic(entity_type: str, query: str, limit: int = 20) -
         entity_type (str): The type of entity to search for.
         query (str): The query string to search for.
         limit (int): The maximum number of results to return.
+        offset (int): The number of results to skip.
 
     Returns:
-        A dictionary parsed from the JSON response.
-    """
-    url = f"https://www.ebi.ac.uk/chembl/api/data/{entity_type}/search.json"
-    params = {"q": query, "limit": limit}
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params)
-    response.raise_for_status()
-    return response.json()
+        A dictionary with the `page_meta` of the first page and up to `limit` results
+        under the entity's list key (e.g. "molecules").
+    """
+    url = f"{CHEMBL_API}/chembl/api/data/{entity_type}/search.json"
+    list_key = CHEMBL_LIST_KEYS.get(entity_type, entity_type + "s")
+    page_meta = {}
+    async with http_client.session() as client:
+        async def fetch_page(next_path):
+            if next_path is None:
+                params = {"q": query, "limit": max(1, min(limit, CHEMBL_MAX_PAGE_SIZE)), "offset": offset}
+                response = await client.get(url, params=params)
+            else:
+                response = await client.get(urljoin(CHEMBL_API, next_path))
+            response.raise_for_status()
+            data = response.json()
+            meta = data.get("page_meta", {})
+            if not page_meta:
+                page_meta.update(meta)
+            return data.get(list_key, []), meta.get("next")
+
+        results = await collect(fetch_page, limit)
+    return {"page_meta": page_meta, list_key: results}
 
 
 @mcp.tool()
 async def search_chembl_id_lookup(
     query: Annotated[str, Field(description="The query string to search for.")],
-    limit: Annotated[int, Field(description="The maximum number of results to return.")] = 20
+    limit: Annotated[int, Field(description="The maximum number of results to return.")] = 20,
+    offset: Annotated[int, Field(description="The number of results to skip, to continue a previous search.")] = 0
     ) -> dict:
     """
     Search for ChEMBL ID by query.
@@ -69,7 +121,7 @@ async def search_chembl_id_lookup(
     Returns:
         str: A JSON-formatted string containing the search results.
     """
-    bulk = await search_chembl_generic("chembl_id_lookup", query, limit)
+    bulk = await search_chembl_generic("chembl_id_lookup", query, limit, offset)
     total_count = bulk.get("page_meta", {}).get("total_count", 0)
     parsed_results = []
     for result in bulk.get("chembl_id_lookups", []):
@@ -81,11 +133,11 @@ async def search_chembl_id_lookup(
     return {"total_count": total_count, "results": parsed_results}
 
 @mcp.tool()
-async def search_chembl_target(query: str, limit: int = 20) -> dict:
+async def search_chembl_target(query: str, limit: int = 20, offset: int = 0) -> dict:
     """
-    Search for ChEMBL target by query.
+    Search for ChEMBL target by query. Use `offset` to continue a previous search.
     """
-    bulk = await search_chembl_generic("target", query, limit)
+    bulk = await search_chembl_generic("target", query, limit, offset)
     total_count = bulk.get("page_meta", {}).get("total_count", 0)
 
     parsed_results = []
@@ -102,11 +154,11 @@ async def search_chembl_target(query: str, limit: int = 20) -> dict:
 
 
 @mcp.tool()
-async def search_chembl_molecule(query: str, limit: int = 20) -> dict:
+async def search_chembl_molecule(query: str, limit: int = 20, offset: int = 0) -> dict:
     """
-    Search for ChEMBL molecule by query.
+    Search for ChEMBL molecule by query. Use `offset` to continue a previous search.
     """
-    bulk = await search_chembl_generic("molecule", query, limit)
+    bulk = await search_chembl_generic("molecule", query, limit, offset)
     total_count = bulk.get("page_meta", {}).get("total_count", 0)
     parsed_results = []
     for molecule in bulk.get("molecules", []):
@@ -158,7 +210,7 @@ async def get_chembl_entity_by_id(service: str, chembl_id: str) -> str:
 
     """
     url = f"https://www.ebi.ac.uk/chembl/api/data/{service}/{chembl_id}.json"
-    async with httpx.AsyncClient() as client:
+    async with http_client.session() as client:
         response = await client.get(url)
     response.raise_for_status()
     return response.text
@@ -166,6 +218,7 @@ async def get_chembl_entity_by_id(service: str, chembl_id: str) -> str:
 
 # DB: PubChem
 @mcp.tool()
+@cached_lookup("pubchem")
 async def get_pubchem_compound_id(compound_name: str) -> str:
     """
     Get a PubChem compound ID
@@ -176,12 +229,13 @@ async def get_pubchem_compound_id(compound_name: str) -> str:
     Returns: PubChem Compound ID in the JSON format
     """
     url = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/name/{compound_name}/cids/JSON"
-    async with httpx.AsyncClient() as client:
+    async with http_client.session() as client:
         response = await client.get(url)
     response.raise_for_status()
     return response.text
 
 @mcp.tool()
+@coalesce
 async def get_compound_attributes_from_pubchem(pubchem_compound_id: str) -> str:
     """
     Get compound attributes from PubChem RDF
@@ -193,7 +247,7 @@ async def get_compound_attributes_from_pubchem(pubchem_compound_id: str) -> str:
     """
     url = "https://togodx.dbcls.jp/human/sparqlist/api/metastanza_pubchem_compound"
     params = {"id": pubchem_compound_id}
-    async with httpx.AsyncClient() as client:
+    async with http_client.session() as client:
         response = await client.get(url, params=params)
     response.raise_for_status()
     return response.text
@@ -215,18 +269,20 @@ async def search_pdb_entity(db: str, query: str, limit: int = 20) -> str:
     Returns:
         str: A JSON-formatted string containing the search results.
     """
-    url = f"https://pdbj.org/rest/newweb/search/{db}?query={query}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
+    url = f"https://pdbj.org/rest/newweb/search/{db}"
+    async with http_client.session() as client:
+        response = await client.get(url, params={"query": query})
     response.raise_for_status()
-    # Parse the response as JSON
-    total_results = response.json().get("total", 0)
-    result_list = [{entry[0]: entry[1]} for entry in response.json().get("results", [])[:limit]]
+    # Parse the response as JSON (once). The PDBj search API has no paging parameters.
+    data = response.json()
+    total_results = data.get("total", 0)
+    result_list = [{entry[0]: entry[1]} for entry in itertools.islice(data.get("results", []), limit)]
     response_dict = {"total": total_results, "results": result_list}
     return json.dumps(response_dict)
 
 # DB: MeSH
 @mcp.tool()
+@cached_lookup("mesh", is_negative=lambda text: text.strip() in ("", "[]"))
 async def search_mesh_entity(query: str, limit: int = 10) -> str:
     """
     Search for MeSH ID by query.
@@ -242,7 +298,7 @@ async def search_mesh_entity(query: str, limit: int = 10) -> str:
     params = {"label": query,
               "match": "contains",
               "limit": limit}
-    async with httpx.AsyncClient() as client:
+    async with http_client.session() as client:
         response = await client.get(url, params=params)
     response.raise_for_status()
     return response.text
@@ -250,8 +306,11 @@ async def search_mesh_entity(query: str, limit: int = 10) -> str:
 # DB: Wikidata
 WIKIDATA_URL = "https://www.wikidata.org/w/api.php"
 HEADER = {"Accept": "application/json", "User-Agent": "foobar"}
+WIKIDATA_NOT_FOUND = "No results found. Consider changing the search term."
+WIKIDATA_MAX_IDS = 50
 
 
+@cached_lookup("wikidata", is_negative=lambda title: title == WIKIDATA_NOT_FOUND)
 async def search_wikidata(query: str, is_entity: bool = True) -> str:
     """
     Search for a Wikidata item or property ID by its query.
@@ -266,15 +325,15 @@ async def search_wikidata(query: str, is_entity: bool = True) -> str:
         "srwhat": "text",
         "format": "json",
     }
-    async with httpx.AsyncClient() as client:
+    async with http_client.session() as client:
         response = await client.get(WIKIDATA_URL, headers=HEADER, params=params)
     response.raise_for_status()
     try:
         title = response.json()["query"]["search"][0]["title"]
         title = title.split(":")[-1]
         return title
-    except KeyError:
-        return "No results found. Consider changing the search term."
+    except (KeyError, IndexError):
+        return WIKIDATA_NOT_FOUND
 
 
 @mcp.tool(
@@ -308,6 +367,41 @@ async def search_wikidata_property(query: str) -> str:
     return await search_wikidata(query, is_entity=False)
 
 
+async def fetch_wikidata_entities(entity_ids: List[str], props: str, language: str = "") -> Dict[str, dict]:
+    """
+    Fetch several Wikidata entities with one `wbgetentities` request (the API accepts up to 50 IDs).
+    If the batch is rejected (e.g. because one ID is invalid), the IDs are fetched one by one.
+    """
+    params = {
+        "action": "wbgetentities",
+        "ids": "|".join(entity_ids),
+        "props": props,
+        "format": "json",
+    }
+    if language:
+        params["languages"] = language
+    async with http_client.session() as client:
+        response = await client.get(WIKIDATA_URL, headers=HEADER, params=params)
+    response.raise_for_status()
+    data = response.json()
+    if "error" in data and len(entity_ids) > 1:
+        singles = await asyncio.gather(
+            *(fetch_wikidata_entities([entity_id], props, language) for entity_id in entity_ids),
+            return_exceptions=True)
+        return {k: v for single in singles if isinstance(single, dict) for k, v in single.items()}
+    return data.get("entities", {})
+
+_wikidata_batchers: Dict[tuple, MicroBatcher] = {}
+
+def wikidata_batcher(props: str, language: str = "") -> MicroBatcher:
+    """The micro-batcher collecting concurrent `wbgetentities` lookups with the same props and language."""
+    key = (props, language)
+    if key not in _wikidata_batchers:
+        _wikidata_batchers[key] = MicroBatcher(
+            lambda ids: fetch_wikidata_entities(ids, props, language), max_batch=WIKIDATA_MAX_IDS)
+    return _wikidata_batchers[key]
+
+
 @mcp.tool()
 async def get_wikidata_properties(entity_id: str) -> List[str]:
     """
@@ -319,17 +413,8 @@ async def get_wikidata_properties(entity_id: str) -> List[str]:
     Returns:
         list: A list of property IDs associated with the given entity ID. If no properties are found, an empty list is returned.
     """
-    params = {
-        "action": "wbgetentities",
-        "ids": entity_id,
-        "props": "claims",
-        "format": "json",
-    }
-    async with httpx.AsyncClient() as client:
-        response = await client.get(WIKIDATA_URL, headers=HEADER, params=params)
-    response.raise_for_status()
-    data = response.json()
-    return list(data.get("entities", {}).get(entity_id, {}).get("claims", {}).keys())
+    entity_data = await wikidata_batcher("claims").get(entity_id) or {}
+    return list(entity_data.get("claims", {}).keys())
 
 @mcp.tool()
 async def get_wikidata_metadata(entity_id: str, language: str = "en") -> Dict[str, str]:
@@ -343,18 +428,10 @@ async def get_wikidata_metadata(entity_id: str, language: str = "en") -> Dict[st
     Returns:
         dict: A dictionary containing the label and description of the entity, if available.
     """
-    params = {
-        "action": "wbgetentities",
-        "ids": entity_id,
-        "props": "labels|descriptions",
-        "languages": language,  # specify the desired language
-        "format": "json",
-    }
-    async with httpx.AsyncClient() as client:
-        response = await client.get(WIKIDATA_URL, params=params)
-    response.raise_for_status()
-    data = response.json()
-    entity_data = data.get("entities", {}).get(entity_id, {})
+    return await wikidata_metadata(entity_id, language)
+
+async def wikidata_metadata(entity_id: str, language: str = "en") -> Dict[str, str]:
+    entity_data = await wikidata_batcher("labels|descriptions", language).get(entity_id) or {}
     label = (
         entity_data.get("labels", {}).get(language, {}).get("value", "No label found")
     )
@@ -365,6 +442,168 @@ async def get_wikidata_metadata(entity_id: str, language: str = "en") -> Dict[st
     )
     return {"Label": label, "Descriptions": descriptions}
 
+@mcp.tool()
+async def get_wikidata_metadata_bulk(entity_ids: List[str], language: str = "en") -> Dict[str, Dict[str, str]]:
+    """
+    Retrieve the label and description for many Wikidata entity IDs at once.
+    The IDs are fetched in batches of up to 50 per upstream request.
+
+    Args:
+        entity_ids (list): The entity IDs to retrieve metadata for.
+        language (str): The language code for the labels and descriptions (default is "en"). Use ISO 639-1 codes.
+
+    Returns:
+        dict: A dictionary from entity ID to its label and description.
+    """
+    with scheduler.priority("batch"):
+        results = await asyncio.gather(*(wikidata_metadata(entity_id, language) for entity_id in entity_ids))
+    return dict(zip(entity_ids, results))
+
+# Multi-service entity resolution
+RESOLVER_DEADLINES = {
+    "chembl_molecule": 5.0,
+    "chembl_target": 5.0,
+    "pubchem": 5.0,
+    "mesh": 5.0,
+    "wikidata": 6.0,
+    "uniprot": 6.0,
+}
+RESOLVER_SERVICES = {
+    "any": list(RESOLVER_DEADLINES),
+    "compound": ["chembl_molecule", "pubchem", "mesh", "wikidata"],
+    "protein": ["uniprot", "chembl_target", "wikidata"],
+    "disease": ["mesh", "wikidata"],
+}
+
+
+def _confidence(query: str, label: str, rank: int) -> float:
+    """Heuristic confidence from label similarity, decayed by the service's own ranking."""
+    q, l = query.strip().lower(), (label or "").strip().lower()
+    if not l:
+        similarity = 0.5
+    elif q == l:
+        similarity = 1.0
+    elif q in l or l in q:
+        similarity = 0.8
+    else:
+        similarity = 0.5
+    return round(similarity * max(0.5, 1.0 - 0.05 * rank), 3)
+
+
+def _candidate(service: str, identifier: str, label: str, rank: int, query: str, **extra) -> dict:
+    return {"service": service, "id": identifier, "label": label,
+            "confidence": _confidence(query, label, rank), **extra}
+
+
+async def _resolve_chembl(entity_type: str, query: str, limit: int) -> List[dict]:
+    bulk = await search_chembl_generic(entity_type, query, limit)
+    service = f"chembl_{entity_type}"
+    id_key = f"{entity_type}_chembl_id"
+    return [_candidate(service, item.get(id_key), item.get("pref_name") or "", rank, query)
+            for rank, item in enumerate(bulk.get(CHEMBL_LIST_KEYS[entity_type], []))]
+
+
+async def _resolve_pubchem(query: str, limit: int) -> List[dict]:
+    try:
+        data = json.loads(await get_pubchem_compound_id.fn(query))
+    except LookupError:  # a 404 for an unknown name, see `cached_lookup`
+        return []
+    cids = data.get("IdentifierList", {}).get("CID", [])[:limit]
+    # The name lookup matches synonyms exactly, so the query itself is the label.
+    return [_candidate("pubchem", str(cid), query, rank, query) for rank, cid in enumerate(cids)]
+
+
+async def _resolve_mesh(query: str, limit: int) -> List[dict]:
+    terms = json.loads(await search_mesh_entity.fn(query, limit) or "[]")
+    return [_candidate("mesh", term.get("resource", "").rsplit("/", 1)[-1], term.get("label", ""), rank, query)
+            for rank, term in enumerate(terms)]
+
+
+async def _resolve_wikidata(query: str, limit: int) -> List[dict]:
+    entity_id = await search_wikidata(query, is_entity=True)
+    if entity_id == WIKIDATA_NOT_FOUND:
+        return []
+    metadata = await wikidata_metadata(entity_id)
+    return [_candidate("wikidata", entity_id, metadata["Label"], 0, query, description=metadata["Descriptions"])]
+
+
+async def _resolve_uniprot(query: str, limit: int) -> List[dict]:
+    lines = (await search_uniprot_entity.fn(query, limit)).splitlines()[1:]
+    candidates = []
+    for rank, line in enumerate(lines):
+        fields = line.split("\t")
+        name = fields[1] if len(fields) > 1 else ""
+        organism = fields[2] if len(fields) > 2 else ""
+        candidates.append(_candidate("uniprot", fields[0], name, rank, query, organism=organism))
+    return candidates
+
+
+RESOLVERS = {
+    "chembl_molecule": lambda query, limit: _resolve_chembl("molecule", query, limit),
+    "chembl_target": lambda query, limit: _resolve_chembl("target", query, limit),
+    "pubchem": _resolve_pubchem,
+    "mesh": _resolve_mesh,
+    "wikidata": _resolve_wikidata,
+    "uniprot": _resolve_uniprot,
+}
+
+
+@mcp.tool()
+async def resolve_entity(
+    query: Annotated[str, Field(description='The name to resolve, e.g. "imatinib" or "BRCA1".')],
+    entity_type: Annotated[str, Field(description=f"The kind of entity, which selects the services to ask. Supported values are {', '.join(RESOLVER_SERVICES)}.")] = "any",
+    limit: Annotated[int, Field(description="The maximum number of candidates per service.")] = 5,
+    timeout: Annotated[float, Field(description="Overall deadline in seconds. Services that have not answered by then are skipped.")] = 8.0,
+    min_confidence: Annotated[float, Field(description="Return as soon as a candidate with at least this confidence (0-1) is found. 0 waits for all services.")] = 0.0
+    ) -> dict:
+    """
+    Resolve a name to identifiers in ChEMBL, PubChem, MeSH, Wikidata and UniProt with one call.
+    The services are queried concurrently, each with its own deadline.
+
+    Returns:
+        dict: The candidates from all services ranked by confidence, and the status of each service.
+    """
+    if entity_type not in RESOLVER_SERVICES:
+        raise ValueError(f"Unknown entity type: {entity_type}. Supported values are {', '.join(RESOLVER_SERVICES)}.")
+    started = time.monotonic()
+    tasks = {
+        asyncio.ensure_future(asyncio.wait_for(RESOLVERS[service](query, limit),
+                                               min(RESOLVER_DEADLINES[service], timeout))): service
+        for service in RESOLVER_SERVICES[entity_type]
+    }
+    status = {}
+    candidates = []
+    pending = set(tasks)
+    reason = "timeout"
+    while pending:
+        remaining = timeout - (time.monotonic() - started)
+        if remaining <= 0:
+            break
+        done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            service = tasks[task]
+            try:
+                found = task.result()
+                candidates.extend(found)
+                status[service] = f"{len(found)} candidates"
+            except asyncio.TimeoutError:
+                status[service] = "timeout"
+            except Exception as e:
+                status[service] = f"error: {type(e).__name__}: {e}"
+        if min_confidence > 0 and any(c["confidence"] >= min_confidence for c in candidates):
+            reason = "skipped (confidence threshold reached)"
+            break
+    for task in pending:
+        task.cancel()
+        status[tasks[task]] = reason
+    candidates.sort(key=lambda c: c["confidence"], reverse=True)
+    return {
+        "query": query,
+        "candidates": candidates,
+        "services": status,
+        "elapsed_seconds": round(time.monotonic() - started, 3),
+    }
+
 # DB: Glycosmos
 @mcp.tool(enabled=True)
 async def glycoepitope_epitope_gtc(epitopeID: str) -> str:
@@ -378,14 +617,7 @@ async def glycoepitope_epitope_gtc(epitopeID: str) -> str:
     Returns:
         glytoucanID (str): The GlyTouCan ID associated with the given glycoepitope."
     """
-    url = f"https://sparqlist.glycosmos.org/sparqlist/api/glycoepitope_epitope_gtc"
-    params = {
-        "epitopeID": epitopeID
-    }
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params)
-    response.raise_for_status()
-    data = response.json()
+    data = await call_sparqlist("glycoepitope_epitope_gtc", {"epitopeID": epitopeID})
     return json.dumps(data)
 
 @mcp.tool(enabled=True) # TODO: output should be epitope_id, NOT motif_id
@@ -403,14 +635,7 @@ async def glytoucan_id_to_epitope_id(glytoucan_id: str) -> str:
             - glytoucan_id: GlyTouCan accession number (e.g., "G58955OJ")
             - motif_id: Identifier of GlycoEpitope databse (e.g., "EP0111")
     """
-    url = f"https://api.alpha.glycosmos.org/sparqlist/glytoucan_id_to_epitope_id"
-    params = {
-        "glytoucan_id": glytoucan_id
-    }
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params)
-    response.raise_for_status()
-    data = response.json()
+    data = await call_sparqlist("glytoucan_id_to_epitope_id", {"glytoucan_id": glytoucan_id})
     return json.dumps(data)
 
 
@@ -419,7 +644,8 @@ async def gtc_image(accession: str,
                     style: str = "extended", 
                     notation: str = "snfg", 
                     format: str = "svg", 
-                    graph: str = "http://rdf.glytoucan.org/image"
+                    graph: str = "http://rdf.glytoucan.org/image",
+                    response_mode: str = "inline"
                     ) -> str:
     """
     Get image data from GlyTouCan
@@ -448,25 +674,71 @@ async def gtc_image(accession: str,
             The RDF graph URI to use as the data source.
             Default is "http://rdf.glytoucan.org/image".
 
+        response_mode (str, optional):
+            "inline" (default) returns the image data.
+            "reference" returns a `glycan-image://` resource URI to read the image from instead.
+
     Returns:
         format: json
         fields:
             - image_tag: Ready-to-use `<img>` HTML tag string
             - image_base64: Base64-encoded string of the image
+        or, with response_mode="reference":
+            - resource_uri, mime_type, size, sha256
     """
-    url = f"https://sparqlist.glycosmos.org/sparqlist/api/gtc_image"
-    params = {
-        "accession": accession,
-        "style": style,
-        "notation": notation,
-        "format": format,
-        "graph": graph
-    }
+    if response_mode not in ("inline", "reference"):
+        return f"Error: Unknown response_mode: {response_mode}. Supported values are inline, reference."
+    entry, text = await gtc_image_entry(accession, style, notation, format, graph)
+    if entry is None:
+        return f"Error: No image is available for {accession}: {text}"
+    if response_mode == "reference":
+        return json.dumps({"accession": accession, **image_cache.reference_response(entry)})
+    return json.dumps(image_cache.inline_response(entry))
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params)
-    response.raise_for_status()
-    return response.text
+
+@mcp.tool(enabled=True)
+async def prefetch_gtc_images(accessions: List[str],
+                              style: str = "extended",
+                              notation: str = "snfg",
+                              format: str = "svg",
+                              graph: str = "http://rdf.glytoucan.org/image"
+                              ) -> str:
+    """
+    Fetch the images of many GlyTouCan accessions into the image cache and return references to them.
+    The images are fetched concurrently; cached images are not fetched again.
+
+    Args:
+        accessions (list): GlyTouCan accession numbers, e.g. ["G39023AU", "G00055MO"].
+        style, notation, format, graph: As for `gtc_image`.
+
+    Returns:
+        format: json
+        fields (per accession):
+            - resource_uri, mime_type, size, sha256, or error
+    """
+    async def fetch(accession):
+        try:
+            entry, text = await gtc_image_entry(accession, style, notation, format, graph)
+        except httpx.HTTPError as e:
+            return {"accession": accession, "error": f"{type(e).__name__}: {e}"}
+        if entry is None:
+            return {"accession": accession, "error": f"No image is available: {text}"}
+        return {"accession": accession, **image_cache.reference_response(entry)}
+
+    with scheduler.priority("background"):
+        return json.dumps(await asyncio.gather(*(fetch(a) for a in dict.fromkeys(accessions))))
+
+
+@mcp.resource("glycan-image://svg/{digest}", mime_type="image/svg+xml")
+def glycan_image_svg(digest: str) -> str:
+    """A cached GlyTouCan image in SVG format (see `gtc_image` with response_mode="reference")."""
+    return image_cache.read(digest, "svg").decode("utf-8")
+
+
+@mcp.resource("glycan-image://png/{digest}", mime_type="image/png")
+def glycan_image_png(digest: str) -> bytes:
+    """A cached GlyTouCan image in PNG format (see `gtc_image` with response_mode="reference")."""
+    return image_cache.read(digest, "png")
 
 
 @mcp.tool(enabled=True)
@@ -489,14 +761,7 @@ async def gtc_external_id(accNum: str) -> str:
             - description: Description of the partner database
             - partnerurl: Homepage of the partner database
     """
-    url = f"https://sparqlist.glycosmos.org/sparqlist/api/gtc_external_id"
-    params = {
-        "accNum": accNum
-    }
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params)
-    response.raise_for_status()
-    data = response.json()
+    data = await call_sparqlist("gtc_external_id", {"accNum": accNum})
     return json.dumps(data)
 
 
@@ -523,15 +788,7 @@ async def gene_and_organism_annotation(tax_id: str, gene_id: str) -> str:
             - alternative_name: Alternate names
             - lineage: Full taxonomic lineage
     """
-    url = f"https://sparqlist.glycosmos.org/sparqlist/api/gene_and_organism_annotation"
-    params = {
-        "tax_id": tax_id,
-        "gene_id": gene_id
-    }
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params)
-    response.raise_for_status()
-    data = response.json()
+    data = await call_sparqlist("gene_and_organism_annotation", {"tax_id": tax_id, "gene_id": gene_id})
     return json.dumps(data)
 
 
@@ -550,14 +807,7 @@ async def uniprot_aa_seq(up_id: str) -> str:
             - aa_seq: full amino acid sequence string
             - length: length of the sequence in amino acids
     """
-    url = f"https://sparqlist.glycosmos.org/sparqlist/api/uniprot_aa_seq"
-    params = {
-        "up_id": up_id
-    }
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params)
-    response.raise_for_status()
-    data = response.json()
+    data = await call_sparqlist("uniprot_aa_seq", {"up_id": up_id})
     return json.dumps(data)
 
 
@@ -578,14 +828,7 @@ async def gtcId2Seq(id: str) -> str:
             - WURCS: WURCS sequence string (if available)
             - GlycoCT: GlycoCT sequence string (if available)
     """
-    url = f"https://sparqlist.glycosmos.org/sparqlist/api/gtcId2Seq"
-    params = {
-        "id": id
-    }
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params)
-    response.raise_for_status()
-    data = response.json()
+    data = await call_sparqlist("gtcId2Seq", {"id": id})
     return json.dumps(data)
 
 
@@ -604,14 +847,7 @@ async def disease_bind_glycan(disease: str) -> str:
             - disease: Label of the disease (e.g., Influenza)
             - glytoucan_id: GlyTouCan accession number (e.g. "G99053DY")
     """
-    url = f"https://api.alpha.glycosmos.org/sparqlist/disease_bind_glycan"
-    params = {
-        "disease": disease
-    }
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params)
-    response.raise_for_status()
-    data = response.json()
+    data = await call_sparqlist("disease_bind_glycan", {"disease": disease})
     return json.dumps(data)
 
 
@@ -633,15 +869,44 @@ async def epitope_id_to_epitope_name(epitope_id: str) -> str:
             - epitope_id: Identifier of GlycoEpitope databse (e.g., "EP0111")        
             - epitope_name: epitope name (e.g., "GT1a alpha")
     """
-    url = f"https://api.alpha.glycosmos.org/sparqlist/epitope_id_to_epitope_name"
-    params = {
-        "epitope_id": epitope_id
-    }
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params)
-    response.raise_for_status()
-    data = response.json()
+    data = await call_sparqlist("epitope_id_to_epitope_name", {"epitope_id": epitope_id})
     return json.dumps(data)
 
+@mcp.tool(
+    enabled=True,
+    name="call_glycosmos_api",
+    description="Call any GlyCosmos SPARQList API described in the mapping file. Available APIs:\n" + describe_apis(),
+)
+async def call_glycosmos_api(
+    api_name: Annotated[str, Field(description="The SPARQList API name.")],
+    params: Annotated[Dict[str, str], Field(description="The API parameters. Optional parameters take their documented defaults.")]
+    ) -> str:
+    """
+    Call a GlyCosmos SPARQList API by name.
+
+    Returns:
+        str: The JSON response of the API.
+    """
+    return json.dumps(await call_sparqlist(api_name, params))
+
+
+@mcp.tool(
+    enabled=True,
+    name="run_glycosmos_chain",
+    description="Run a chain of GlyCosmos SPARQList APIs in one call, with the fan-out of each step in parallel. Available chains:\n" + describe_chains(),
+)
+async def run_glycosmos_chain(
+    chain_name: Annotated[str, Field(description="The chain name.")],
+    inputs: Annotated[Dict[str, str], Field(description='Values for the parameters taken from the question, e.g. {"disease": "Influenza"}.')]
+    ) -> str:
+    """
+    Run a chain of GlyCosmos SPARQList APIs, e.g. disease -> GlyTouCan IDs -> epitope IDs -> epitope names.
+
+    Returns:
+        str: A JSON object with the calls made by each step and the chain's final outputs.
+    """
+    return json.dumps(await run_chain(chain_name, inputs))
+
+
 if __name__ == "__main__":
     mcp.run()
@@ -0,0 +1,100 @@
+import asyncio
+import functools
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+# --- Micro-batching of per-ID REST calls ---
+# Concurrent per-ID calls are collected for a short window and sent upstream as one
+# batched request where the service accepts several IDs (e.g. Wikidata `ids=Q1|Q2|...`).
+# For services that only accept one ID per request, identical concurrent calls are at
+# least coalesced into a single request (`SingleFlight`).
+
+BATCH_WINDOW = 0.02  # seconds to wait for more IDs before sending a batch
+
+
+class MicroBatcher:
+    """
+    Collects keys requested concurrently and resolves them with one call to `fetch_batch`.
+
+    Args:
+        fetch_batch: Async function taking a list of keys and returning a dict from key to
+            value. Keys missing from the returned dict resolve to None.
+        max_batch (int): The maximum number of keys per upstream request.
+        window (float): Seconds to wait for more keys after the first one arrives.
+    """
+
+    def __init__(self, fetch_batch: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+                 max_batch: int = 50, window: float = BATCH_WINDOW):
+        self.fetch_batch = fetch_batch
+        self.max_batch = max_batch
+        self.window = window
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.upstream_requests = 0
+
+    async def get(self, key: Hashable) -> Any:
+        future = self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[key] = future
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.window, self._flush)
+        # Shield so that one cancelled caller does not cancel the shared future.
+        return await asyncio.shield(future)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            keys = list(self._pending)[: self.max_batch]
+            futures = {key: self._pending.pop(key) for key in keys}
+            asyncio.ensure_future(self._run(futures))
+
+    async def _run(self, futures: Dict[Hashable, asyncio.Future]) -> None:
+        self.upstream_requests += 1
+        try:
+            results = await self.fetch_batch(list(futures))
+        except Exception as e:
+            for future in futures.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key, future in futures.items():
+            if not future.done():
+                future.set_result(results.get(key))
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: while a call for a key is in flight, other
+    callers with the same key wait for its result instead of sending their own request.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.upstream_requests = 0
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is None:
+            self.upstream_requests += 1
+            future = asyncio.ensure_future(factory())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+
+def coalesce(func):
+    """Decorator applying `SingleFlight` to an async function, keyed by its arguments."""
+    flight = SingleFlight()
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items())))
+        return await flight.run(key, lambda: func(*args, **kwargs))
+
+    wrapper.flight = flight
+    return wrapper
@@ -0,0 +1,181 @@
+import csv
+import glob
+import io
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+import mie_cache
+
+# --- Compact result format ---
+# SPARQL results are dominated by long, repeated IRIs. The compact format
+#   1. rewrites IRIs as CURIEs using the prefixes declared in the MIE files and ShEx schemas,
+#   2. dictionary-encodes columns whose values repeat often enough to pay for a dictionary,
+#   3. writes minimally quoted CSV or TSV.
+# The prefixes and dictionaries actually used are listed in "#" header lines so that the
+# output can be expanded back to the original values. Dictionary entries are tab-separated
+# `code=value` pairs; values are escaped as in TSV.
+
+PREFIX_PATTERN = re.compile(r"^\s*PREFIX\s+([A-Za-z][\w.-]*|):\s*<([^>\s]+)>", re.IGNORECASE | re.MULTILINE)
+DICT_CODE_PREFIX = "#"
+
+
+@lru_cache(maxsize=4)
+def load_prefix_table(mie_dir: str = "mie", shex_dir: str = "shex") -> Dict[str, str]:
+    """
+    Build a namespace-to-prefix table from the PREFIX declarations in the MIE files and ShEx schemas.
+
+    MIE files are read first, so their prefix labels win. When the same label is declared for
+    different namespaces, later namespaces are labelled after their last path segment if that
+    is still free (e.g. `uniprot:`), and get a numbered label (e.g. `gene2:`) otherwise.
+
+    Returns:
+        dict: Mapping from namespace IRI to prefix label.
+    """
+    texts = []
+    for path in sorted(glob.glob(os.path.join(mie_dir, "*.yaml"))):
+        try:
+            data = mie_cache.load_yaml(path)
+        except (IOError, OSError, yaml.YAMLError):
+            continue
+        if isinstance(data, dict) and isinstance(data.get("shape_expressions"), str):
+            texts.append(data["shape_expressions"])
+    for path in sorted(glob.glob(os.path.join(shex_dir, "*.shex"))):
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                texts.append(file.read())
+        except (IOError, OSError):
+            continue
+
+    namespaces: Dict[str, str] = {}
+    labels: Dict[str, str] = {}
+    for text in texts:
+        for label, namespace in PREFIX_PATTERN.findall(text):
+            if not label or namespace in namespaces:
+                continue
+            candidate, n = label, 2
+            if candidate in labels:
+                segment = re.sub(r"[^A-Za-z0-9]", "", re.split(r"[/#]", namespace.rstrip("/#_"))[-1])
+                if segment[:1].isalpha() and segment not in labels:
+                    candidate = segment
+            while candidate in labels and labels[candidate] != namespace:
+                candidate, n = f"{label}{n}", n + 1
+            labels[candidate] = namespace
+            namespaces[namespace] = candidate
+    return namespaces
+
+
+class IRICompactor:
+    """
+    Rewrites IRIs as CURIEs using the longest matching namespace.
+    Results are memoized per IRI, as the same IRIs recur throughout a result set.
+    """
+
+    def __init__(self, namespaces: Dict[str, str]):
+        self.namespaces = namespaces
+        self.delimiters = {ns[-1] for ns in namespaces}
+        self.used: Dict[str, str] = {}
+        self._memo: Dict[str, str] = {}
+
+    def compact(self, iri: str) -> str:
+        curie = self._memo.get(iri)
+        if curie is not None:
+            return curie
+        curie = iri
+        # Walk candidate namespace boundaries from the right so the longest namespace wins.
+        for i in range(len(iri) - 1, 0, -1):
+            if iri[i - 1] not in self.delimiters:
+                continue
+            label = self.namespaces.get(iri[:i])
+            if label is not None:
+                local = iri[i:]
+                if not any(ch.isspace() for ch in local):
+                    curie = f"{label}:{local}"
+                    self.used[label] = iri[:i]
+                break
+        self._memo[iri] = curie
+        return curie
+
+
+def _dictionary_pays_off(values: List[str]) -> bool:
+    distinct: Dict[str, int] = {}
+    for v in values:
+        if v:
+            distinct[v] = distinct.get(v, 0) + 1
+    if len(distinct) == len([v for v in values if v]):
+        return False
+    plain = sum(len(v) for v in values)
+    code_len = len(DICT_CODE_PREFIX) + len(str(len(distinct)))
+    encoded = sum(len(v) + code_len + 1 for v in distinct) + code_len * len(values)
+    return encoded < plain
+
+
+def compact_bindings(variables: List[str], bindings: List[Dict[str, Any]],
+                     namespaces: Optional[Dict[str, str]] = None,
+                     delimiter: str = ",", dictionary: bool = True) -> str:
+    """
+    Render SPARQL JSON result bindings in the compact format.
+
+    Args:
+        variables (list): The result variables (`head.vars` of the SPARQL JSON result).
+        bindings (list): The raw bindings (`results.bindings`), with `type` and `value` per term.
+        namespaces (dict, optional): Namespace-to-prefix table. Defaults to `load_prefix_table()`.
+        delimiter (str): "," for CSV or "\\t" for TSV.
+        dictionary (bool): Dictionary-encode columns with many repeated values.
+
+    Returns:
+        str: The compact result text.
+    """
+    compactor = IRICompactor(load_prefix_table() if namespaces is None else namespaces)
+    if not variables:
+        variables = []
+        for binding in bindings:
+            for key in binding:
+                if key not in variables:
+                    variables.append(key)
+
+    columns: Dict[str, List[str]] = {var: [] for var in variables}
+    for binding in bindings:
+        for var in variables:
+            term = binding.get(var)
+            if term is None:
+                value = ""
+            elif term.get("type") == "uri":
+                value = compactor.compact(term["value"])
+            else:
+                value = term.get("value", "")
+            columns[var].append(value)
+
+    header_lines = [f"# PREFIX {label}: <{ns}>" for label, ns in sorted(compactor.used.items())]
+    if dictionary:
+        for var in variables:
+            values = columns[var]
+            if not _dictionary_pays_off(values):
+                continue
+            codes: Dict[str, str] = {}
+            for v in values:
+                if v and v not in codes:
+                    codes[v] = f"{DICT_CODE_PREFIX}{len(codes)}"
+            header_lines.append(f"# DICT {var}\t" + "\t".join(f"{code}={_escape_tsv(v)}" for v, code in codes.items()))
+            columns[var] = [codes.get(v, "") for v in values]
+
+    out = io.StringIO()
+    for line in header_lines:
+        out.write(line + "\n")
+    if delimiter == "\t":
+        out.write("\t".join(variables) + "\n")
+        for i in range(len(bindings)):
+            out.write("\t".join(_escape_tsv(columns[var][i]) for var in variables) + "\n")
+    else:
+        writer = csv.writer(out, delimiter=delimiter, lineterminator="\n")
+        writer.writerow(variables)
+        for i in range(len(bindings)):
+            writer.writerow([columns[var][i] for var in variables])
+    return out.getvalue()
+
+
+def _escape_tsv(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
@@ -0,0 +1,283 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import weakref
+from collections.abc import Mapping
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Set, Tuple, TypeVar
+
+import httpx
+import yaml
+
+import http_client
+import scheduler
+
+# --- Registry of SPARQL endpoints ---
+# The endpoints of the databases are read from a YAML file (`resources/endpoints.yaml`, or
+# $RDFPORTAL_ENDPOINTS_FILE) that maps each database to one URL or to a list of mirrors.
+# The file is checked for changes every few seconds when the registry is used and reloaded
+# without a restart; an invalid edit is reported and the previous registry kept.
+# Every URL is probed in the background (a trivial ASK query at background priority), which
+# also keeps a warm connection to each backend from startup on. A query goes to the healthy
+# candidate with the lowest probe latency and, if that replica cannot be reached or answers
+# 502/503/504, to the next one. A replica that fails is avoided until a probe succeeds again
+# or its back-off, which doubles with every consecutive failure, has passed.
+# A mirror marked `failover_only` (e.g. a different engine over the same data, which may not
+# support every query of the primary) is only used while the other replicas are failing.
+# `registry` is a read-only mapping from database to the URL a query would be sent to now,
+# so it can be used wherever the former `SPARQL_ENDPOINT` dict was.
+
+ENDPOINTS_FILE = os.environ.get("RDFPORTAL_ENDPOINTS_FILE", "resources/endpoints.yaml")
+RELOAD_CHECK_SECONDS = 5.0
+PROBE_QUERY = "ASK {}"
+PROBE_INTERVAL = 60.0  # seconds between probe rounds
+PROBE_TIMEOUT = 10.0
+LATENCY_WEIGHT = 0.3  # weight of the newest probe in the latency average
+BACKOFF_SECONDS = 30.0  # a failed replica is avoided this long, doubled per consecutive failure,
+MAX_BACKOFF_SECONDS = 600.0  # up to this long
+FAILOVER_STATUS = {502, 503, 504}
+FAILOVER_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError, httpx.ReadError)
+
+T = TypeVar("T")
+
+
+class Replica:
+    """Health and probe latency of one endpoint URL."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.latency: Optional[float] = None
+        self.failures = 0
+        self.down_until = 0.0
+        self.last_probe: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def healthy(self, now: float) -> bool:
+        return self.failures == 0 or now >= self.down_until
+
+    def succeeded(self, latency: Optional[float] = None) -> None:
+        if latency is not None:
+            self.latency = latency if self.latency is None else (
+                LATENCY_WEIGHT * latency + (1 - LATENCY_WEIGHT) * self.latency)
+        self.failures = 0
+        self.down_until = 0.0
+        self.last_error = None
+
+    def failed(self, error: str) -> None:
+        self.failures += 1
+        self.down_until = time.monotonic() + min(BACKOFF_SECONDS * 2 ** (self.failures - 1), MAX_BACKOFF_SECONDS)
+        self.last_error = error
+
+
+def _parse(data: Any) -> Tuple[Dict[str, List[str]], Dict[str, Set[str]]]:
+    """The candidate URLs of each database, and those of them that are failover-only."""
+    if not isinstance(data, dict):
+        raise ValueError("expected a mapping from database names to URLs")
+    candidates, failover_only = {}, {}
+    for dbname, entries in data.items():
+        entries = entries if isinstance(entries, list) else [entries]
+        urls, fallbacks = [], set()
+        for entry in entries:
+            url = entry.get("url") if isinstance(entry, dict) else entry
+            if not isinstance(url, str) or not url.startswith(("http://", "https://")):
+                raise ValueError(f"'{dbname}' needs an http(s) URL, or a list of URLs or of {{url, failover_only}} entries")
+            if url not in urls:
+                urls.append(url)
+            if isinstance(entry, dict) and entry.get("failover_only"):
+                fallbacks.add(url)
+        if not urls or fallbacks == set(urls):
+            raise ValueError(f"'{dbname}' needs at least one URL that is not failover-only")
+        candidates[str(dbname)] = urls
+        failover_only[str(dbname)] = fallbacks
+    return candidates, failover_only
+
+
+class EndpointRegistry(Mapping):
+    """Database name -> the URL of its preferred replica, reloaded from the registry file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._candidates: Dict[str, List[str]] = {}
+        self._failover_only: Dict[str, Set[str]] = {}
+        self._replicas: Dict[str, Replica] = {}
+        self._version: Optional[Tuple[int, int]] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self.reload(strict=True)
+
+    def reload(self, strict: bool = False) -> bool:
+        """Read the registry file if it changed. Returns whether it was reloaded."""
+        try:
+            stat = os.stat(self.path)
+        except OSError as e:
+            return self._unreadable(e, strict)
+        version = (stat.st_mtime_ns, stat.st_size)
+        if version == self._version:
+            return False
+        self._version = version  # a broken edit is reported once
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                candidates, failover_only = _parse(yaml.safe_load(f))
+        except (OSError, ValueError, yaml.YAMLError) as e:
+            return self._unreadable(e, strict)
+        with self._lock:
+            self._candidates = candidates
+            self._failover_only = failover_only
+            self._replicas = {url: self._replicas.get(url) or Replica(url)
+                              for urls in candidates.values() for url in urls}
+        return True
+
+    def _unreadable(self, error: Exception, strict: bool) -> bool:
+        if strict:
+            raise ValueError(f"Cannot read the SPARQL endpoint registry {self.path}: {error}") from error
+        if self._version is not None:
+            print(f"Warning: keeping the previous SPARQL endpoints; cannot reload {self.path}: {error}",
+                  file=sys.stderr)
+        if isinstance(error, OSError):
+            self._version = None
+        return False
+
+    def _check(self) -> None:
+        now = time.monotonic()
+        if now - self._checked >= RELOAD_CHECK_SECONDS:
+            self._checked = now
+            self.reload()
+
+    def candidates(self, dbname: str) -> List[str]:
+        """
+        The URLs of a database in the order they are tried: healthy ones by latency (failover-only
+        ones last), then the others.
+        """
+        self._check()
+        urls = self._candidates[dbname]
+        if len(urls) == 1:
+            return list(urls)
+        now = time.monotonic()
+        fallbacks = self._failover_only.get(dbname, set())
+
+        def order(item: Tuple[int, str]) -> Tuple[bool, bool, float, float, int]:
+            position, url = item
+            replica = self._replicas[url]
+            healthy = replica.healthy(now)
+            latency = replica.latency if replica.latency is not None else float("inf")
+            return (not healthy, url in fallbacks, 0.0 if healthy else replica.down_until, latency, position)
+
+        return [url for _, url in sorted(enumerate(urls), key=order)]
+
+    def __getitem__(self, dbname: str) -> str:
+        return self.candidates(dbname)[0]
+
+    def __iter__(self) -> Iterator[str]:
+        self._check()
+        return iter(list(self._candidates))
+
+    def __len__(self) -> int:
+        self._check()
+        return len(self._candidates)
+
+    def urls(self) -> List[str]:
+        self._check()
+        return list(self._replicas)
+
+    def replica(self, url: str) -> Optional[Replica]:
+        return self._replicas.get(url)
+
+    def health(self) -> List[Dict[str, Any]]:
+        self._check()
+        now = time.monotonic()
+        databases: Dict[str, List[str]] = {}
+        fallbacks: Dict[str, List[str]] = {}
+        for dbname, urls in self._candidates.items():
+            for url in urls:
+                databases.setdefault(url, []).append(dbname)
+                if url in self._failover_only.get(dbname, set()):
+                    fallbacks.setdefault(url, []).append(dbname)
+        return [{
+            "url": url,
+            "databases": databases.get(url, []),
+            "failover_only_for": fallbacks.get(url, []),
+            "healthy": replica.healthy(now),
+            "latency_ms": round(replica.latency * 1000, 1) if replica.latency is not None else None,
+            "consecutive_failures": replica.failures,
+            "last_probe_seconds_ago": round(time.time() - replica.last_probe) if replica.last_probe else None,
+            "last_error": replica.last_error,
+        } for url, replica in self._replicas.items()]
+
+
+registry = EndpointRegistry(ENDPOINTS_FILE)
+
+
+def _describe(error: BaseException) -> str:
+    message = str(error).splitlines()[0] if str(error) else ""
+    return f"{type(error).__name__}: {message}" if message else type(error).__name__
+
+
+async def failover(dbname: str, send: Callable[[str], Awaitable[T]]) -> T:
+    """
+    Call `send(url)` with the preferred replica of a database, and with the next ones while
+    the replica cannot be reached or answers 502, 503 or 504. Other errors are raised at once.
+    """
+    ensure_probing()
+    last_error: Optional[BaseException] = None
+    for url in registry.candidates(dbname):
+        try:
+            return await send(url)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code not in FAILOVER_STATUS:
+                raise
+            last_error = e
+        except FAILOVER_ERRORS as e:
+            last_error = e
+        replica = registry.replica(url)
+        if replica is not None:
+            replica.failed(_describe(last_error))
+    raise last_error
+
+
+# --- Background probes ---
+_probers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Task]" = weakref.WeakKeyDictionary()
+
+
+async def probe(url: str) -> None:
+    replica = registry.replica(url)
+    started = time.perf_counter()
+    try:
+        async with http_client.session() as client:
+            response = await client.post(url, data={"query": PROBE_QUERY}, timeout=PROBE_TIMEOUT,
+                                         headers={"Accept": "application/sparql-results+json"})
+        response.raise_for_status()
+    except (httpx.HTTPError, OSError) as e:
+        if replica is not None:
+            replica.failed(_describe(e))
+    else:
+        if replica is not None:
+            replica.succeeded(time.perf_counter() - started)
+    if replica is not None:
+        replica.last_probe = time.time()
+
+
+async def probe_all() -> None:
+    """Probe every URL of the registry once, concurrently."""
+    registry.reload()
+    with scheduler.priority("background"):
+        await asyncio.gather(*(probe(url) for url in registry.urls()))
+
+
+async def _probe_forever() -> None:
+    while True:
+        await probe_all()
+        await asyncio.sleep(PROBE_INTERVAL)
+
+
+def ensure_probing() -> None:
+    """Start the probes on the running event loop, unless they are running already."""
+    loop = asyncio.get_running_loop()
+    task = _probers.get(loop)
+    if task is None or task.done():
+        _probers[loop] = loop.create_task(_probe_forever())
+
+
+def health() -> List[Dict[str, Any]]:
+    """Health, probe latency and databases of every endpoint URL."""
+    return registry.health()
@@ -0,0 +1,78 @@
+import asyncio
+import weakref
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+
+import httpx
+
+from scheduler import ScheduledTransport
+
+# --- Shared HTTP connection pool ---
+# All outbound requests of the servers go through one `httpx.AsyncClient` per event loop,
+# so that connections (and TLS sessions) to the SPARQL endpoints and REST APIs are reused
+# across tool calls, and across servers when both run in one process (`unified.py`).
+# Requests are admitted by `scheduler` (priority classes and per-host rate limits), and
+# counted per host for monitoring. Responses are requested compressed.
+
+# Compressed responses: zstd and brotli when their decoders (the `zstandard` and `brotli`
+# packages, see the "compression" extra) are installed, gzip and deflate otherwise.
+ENCODINGS = ["gzip", "deflate"]
+try:
+    import brotli  # noqa: F401  (enables the br decoder of httpx)
+    ENCODINGS.insert(0, "br")
+except ImportError:
+    pass
+try:
+    import zstandard  # noqa: F401  (enables the zstd decoder of httpx)
+    ENCODINGS.insert(0, "zstd")
+except ImportError:
+    pass
+ACCEPT_ENCODING = ", ".join(ENCODINGS)
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+request_counts: Counter = Counter()
+error_counts: Counter = Counter()
+
+
+async def _count_request(request: httpx.Request) -> None:
+    request_counts[request.url.host] += 1
+
+
+async def _count_response(response: httpx.Response) -> None:
+    if response.is_error:
+        error_counts[response.request.url.host] += 1
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared client of the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            transport=ScheduledTransport(httpx.AsyncHTTPTransport()),
+            headers={"Accept-Encoding": ACCEPT_ENCODING},
+            event_hooks={"request": [_count_request], "response": [_count_response]})
+        _clients[loop] = client
+    return client
+
+
+@asynccontextmanager
+async def session() -> AsyncIterator[httpx.AsyncClient]:
+    """
+    Drop-in replacement for `async with httpx.AsyncClient() as client:` that yields the
+    shared client and leaves it open for the next caller.
+    """
+    yield get_client()
+
+
+async def aclose() -> None:
+    """Close the client of the running event loop (e.g. on shutdown)."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    """Requests and error responses per host since startup."""
+    return {host: {"requests": count, "errors": error_counts[host]} for host, count in request_counts.items()}
@@ -0,0 +1,161 @@
+import functools
+import inspect
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+import httpx
+
+# --- Persistent identifier-resolution cache ---
+# Name-to-ID lookups (PubChem, MeSH, Wikidata, ChEMBL, UniProt) rarely change, so their
+# answers are kept in an on-disk SQLite database shared across sessions, with an in-memory
+# LRU tier in front. Each service has its own TTL; "not found" answers are cached too,
+# with a shorter TTL.
+
+CACHE_DIR = os.environ.get("RDFPORTAL_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "rdfportal-mcp"))
+ID_CACHE_FILE = os.path.join(CACHE_DIR, "id_cache.sqlite")
+HOT_TIER_SIZE = 4096
+
+DAY = 24 * 60 * 60
+SERVICE_TTL = {
+    "pubchem": 30 * DAY,
+    "mesh": 30 * DAY,
+    "chembl": 30 * DAY,
+    "wikidata": 7 * DAY,
+    "uniprot": 7 * DAY,
+}
+DEFAULT_TTL = 7 * DAY
+NEGATIVE_TTL = 1 * DAY
+
+_hot: "OrderedDict[Tuple[str, str], Tuple[Any, bool, float]]" = OrderedDict()
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+
+
+def _connect() -> Optional[sqlite3.Connection]:
+    global _conn
+    if _conn is None:
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            _conn = sqlite3.connect(ID_CACHE_FILE, check_same_thread=False, isolation_level=None)
+            _conn.execute("PRAGMA journal_mode=WAL")
+            _conn.execute("PRAGMA synchronous=NORMAL")
+            _conn.execute(
+                "CREATE TABLE IF NOT EXISTS id_cache ("
+                " service TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " negative INTEGER NOT NULL, expires REAL NOT NULL,"
+                " PRIMARY KEY (service, key))"
+            )
+        except (sqlite3.Error, OSError) as e:
+            # Fall back to the in-memory tier only.
+            print(f"Warning: ID cache disabled on disk ({ID_CACHE_FILE}): {e}", file=sys.stderr)
+            _conn = None
+            return None
+    return _conn
+
+
+def _hot_put(entry_key: Tuple[str, str], value: Any, negative: bool, expires: float) -> None:
+    _hot[entry_key] = (value, negative, expires)
+    _hot.move_to_end(entry_key)
+    while len(_hot) > HOT_TIER_SIZE:
+        _hot.popitem(last=False)
+
+
+def get(service: str, key: str) -> Optional[Tuple[Any, bool]]:
+    """
+    Look up a cached answer.
+
+    Returns:
+        tuple: `(value, negative)` if a fresh entry exists, otherwise None.
+    """
+    entry_key = (service, key)
+    now = time.time()
+    with _lock:
+        hit = _hot.get(entry_key)
+        if hit is not None:
+            if hit[2] > now:
+                _hot.move_to_end(entry_key)
+                return hit[0], hit[1]
+            del _hot[entry_key]
+        conn = _connect()
+        if conn is None:
+            return None
+        row = conn.execute(
+            "SELECT value, negative, expires FROM id_cache WHERE service = ? AND key = ?", entry_key
+        ).fetchone()
+        if row is None or row[2] <= now:
+            return None
+        value = json.loads(row[0])
+        _hot_put(entry_key, value, bool(row[1]), row[2])
+        return value, bool(row[1])
+
+
+def put(service: str, key: str, value: Any, negative: bool = False) -> None:
+    """Store an answer with the service's TTL (or `NEGATIVE_TTL` for "not found" answers)."""
+    ttl = NEGATIVE_TTL if negative else SERVICE_TTL.get(service, DEFAULT_TTL)
+    expires = time.time() + ttl
+    with _lock:
+        _hot_put((service, key), value, negative, expires)
+        conn = _connect()
+        if conn is not None:
+            conn.execute(
+                "INSERT OR REPLACE INTO id_cache (service, key, value, negative, expires) VALUES (?, ?, ?, ?, ?)",
+                (service, key, json.dumps(value), int(negative), expires),
+            )
+
+
+def clear(service: Optional[str] = None) -> None:
+    """Remove all cached answers, or only those of one service."""
+    with _lock:
+        for entry_key in [k for k in _hot if service is None or k[0] == service]:
+            del _hot[entry_key]
+        conn = _connect()
+        if conn is not None:
+            if service is None:
+                conn.execute("DELETE FROM id_cache")
+            else:
+                conn.execute("DELETE FROM id_cache WHERE service = ?", (service,))
+
+
+def cached_lookup(service: str, is_negative: Optional[Callable[[Any], bool]] = None):
+    """
+    Decorator caching the results of an async lookup function per service and arguments.
+
+    Args:
+        service (str): The service name, which selects the TTL (see `SERVICE_TTL`).
+        is_negative (callable, optional): Returns True for results meaning "not found";
+            those are cached with `NEGATIVE_TTL`. An HTTP 404 from the service is cached
+            as "not found" as well, and raised as `LookupError` (also on the first call).
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = json.dumps([func.__name__, bound.arguments], sort_keys=True, default=str)
+            hit = get(service, key)
+            if hit is not None:
+                value, negative = hit
+                if negative and isinstance(value, dict) and "not_found" in value:
+                    raise LookupError(value["not_found"])
+                return value
+            try:
+                result = await func(*args, **kwargs)
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code == 404:
+                    not_found = f"Not found: {e.request.url}"
+                    put(service, key, {"not_found": not_found}, negative=True)
+                    raise LookupError(not_found) from e
+                raise
+            put(service, key, result, negative=bool(is_negative and is_negative(result)))
+            return result
+
+        return wrapper
+    return decorator
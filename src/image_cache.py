@@ -0,0 +1,161 @@
+import base64
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from id_cache import CACHE_DIR
+
+# --- Content-addressed cache for GlyTouCan images ---
+# Rendered images are stored once per content hash (identical renderings share one file)
+# and indexed by the request that produced them: (accession, style, notation, format, graph).
+# The least recently used images are evicted once the files exceed `IMAGE_CACHE_MAX_BYTES`.
+
+IMAGE_CACHE_DIR = os.path.join(CACHE_DIR, "images")
+IMAGE_INDEX_FILE = os.path.join(IMAGE_CACHE_DIR, "index.sqlite")
+IMAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+IMAGE_BASE64_PLACEHOLDER = "{image_base64}"
+MIME_TYPES = {"svg": "image/svg+xml", "png": "image/png"}
+
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+
+
+def _connect() -> Optional[sqlite3.Connection]:
+    global _conn
+    if _conn is None:
+        try:
+            os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+            _conn = sqlite3.connect(IMAGE_INDEX_FILE, check_same_thread=False, isolation_level=None)
+            _conn.execute("PRAGMA journal_mode=WAL")
+            _conn.execute(
+                "CREATE TABLE IF NOT EXISTS images ("
+                " accession TEXT NOT NULL, style TEXT NOT NULL, notation TEXT NOT NULL,"
+                " format TEXT NOT NULL, graph TEXT NOT NULL,"
+                " digest TEXT NOT NULL, size INTEGER NOT NULL, tag_template TEXT NOT NULL,"
+                " last_access REAL NOT NULL,"
+                " PRIMARY KEY (accession, style, notation, format, graph))"
+            )
+            _conn.execute("CREATE INDEX IF NOT EXISTS images_digest ON images (digest)")
+        except (sqlite3.Error, OSError) as e:
+            print(f"Warning: image cache disabled ({IMAGE_INDEX_FILE}): {e}", file=sys.stderr)
+            _conn = None
+    return _conn
+
+
+def blob_path(digest: str, format: str) -> str:
+    return os.path.join(IMAGE_CACHE_DIR, digest[:2], f"{digest}.{format}")
+
+
+def resource_uri(digest: str, format: str) -> str:
+    return f"glycan-image://{format}/{digest}"
+
+
+def lookup(accession: str, style: str, notation: str, format: str, graph: str) -> Optional[Dict[str, Any]]:
+    """
+    Find a cached rendering.
+
+    Returns:
+        dict: `digest`, `size`, `format` and `tag_template` of the image, or None if not cached.
+    """
+    with _lock:
+        conn = _connect()
+        if conn is None:
+            return None
+        key = (accession, style, notation, format, graph)
+        row = conn.execute(
+            "SELECT digest, size, tag_template FROM images"
+            " WHERE accession = ? AND style = ? AND notation = ? AND format = ? AND graph = ?", key
+        ).fetchone()
+        if row is None:
+            return None
+        if not os.path.exists(blob_path(row[0], format)):
+            conn.execute("DELETE FROM images WHERE accession = ? AND style = ? AND notation = ?"
+                         " AND format = ? AND graph = ?", key)
+            return None
+        conn.execute("UPDATE images SET last_access = ? WHERE accession = ? AND style = ? AND notation = ?"
+                     " AND format = ? AND graph = ?", (time.time(), *key))
+    return {"digest": row[0], "size": row[1], "format": format, "tag_template": row[2]}
+
+
+def store(accession: str, style: str, notation: str, format: str, graph: str,
+          image_base64: str, image_tag: str = "") -> Dict[str, Any]:
+    """
+    Store a rendering returned by the gtc_image API.
+
+    Args:
+        image_base64 (str): The base64-encoded image.
+        image_tag (str): The `<img>` tag returned with it. The base64 data inside it is
+            replaced by a placeholder, so the tag can be rebuilt without storing the data twice.
+
+    Returns:
+        dict: `digest`, `size`, `format` and `tag_template` of the stored image.
+    """
+    data = base64.b64decode(image_base64)
+    digest = hashlib.sha256(data).hexdigest()
+    tag_template = image_tag.replace(image_base64, IMAGE_BASE64_PLACEHOLDER) if image_tag else ""
+    entry = {"digest": digest, "size": len(data), "format": format, "tag_template": tag_template}
+    with _lock:
+        conn = _connect()
+        if conn is None:
+            return entry
+        path = blob_path(digest, format)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as file:
+                file.write(data)
+            os.replace(tmp, path)
+        conn.execute(
+            "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (accession, style, notation, format, graph, digest, len(data), tag_template, time.time()))
+        _evict(conn)
+    return entry
+
+
+def _evict(conn: sqlite3.Connection) -> None:
+    # Count each distinct file once, as several requests may share one rendering.
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, format, size FROM images)").fetchone()[0]
+    if total <= IMAGE_CACHE_MAX_BYTES:
+        return
+    rows = conn.execute(
+        "SELECT digest, format, size, MAX(last_access) AS used FROM images GROUP BY digest, format ORDER BY used"
+    ).fetchall()
+    for digest, format, size, _ in rows:
+        if total <= IMAGE_CACHE_MAX_BYTES:
+            break
+        conn.execute("DELETE FROM images WHERE digest = ? AND format = ?", (digest, format))
+        try:
+            os.remove(blob_path(digest, format))
+        except OSError:
+            pass
+        total -= size
+
+
+def read(digest: str, format: str) -> bytes:
+    """Read a cached image by its content hash."""
+    if format not in MIME_TYPES or not all(c in "0123456789abcdef" for c in digest):
+        raise ValueError(f"Invalid image reference: {format}/{digest}")
+    with open(blob_path(digest, format), "rb") as file:
+        return file.read()
+
+
+def inline_response(entry: Dict[str, Any]) -> Dict[str, str]:
+    """Rebuild the gtc_image API response (`image_tag`, `image_base64`) from a cached image."""
+    image_base64 = base64.b64encode(read(entry["digest"], entry["format"])).decode("ascii")
+    tag = entry["tag_template"].replace(IMAGE_BASE64_PLACEHOLDER, image_base64) if entry["tag_template"] else (
+        f'<img src="data:{MIME_TYPES.get(entry["format"], "application/octet-stream")};base64,{image_base64}"/>')
+    return {"image_tag": tag, "image_base64": image_base64}
+
+
+def reference_response(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """A compact reference to a cached image, to be read through the MCP resource."""
+    return {
+        "resource_uri": resource_uri(entry["digest"], entry["format"]),
+        "mime_type": MIME_TYPES.get(entry["format"], "application/octet-stream"),
+        "size": entry["size"],
+        "sha256": entry["digest"],
+    }
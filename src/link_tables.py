@@ -0,0 +1,522 @@
+import array
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import http_client
+import mie_cache
+import query_stats
+import result_formats
+import scheduler
+from id_cache import CACHE_DIR
+
+# --- Local cross-reference link tables ---
+# Translating identifiers between databases (UniProt, PDB, ChEMBL targets, Reactome, MeSH,
+# MONDO) follows the `cross_references` patterns of the MIE files. Instead of a live query
+# per hop, every link set below is extracted in bulk (keyset-paginated SELECTs at batch
+# priority) and stored in a table file that is memory-mapped for lookups. A table holds
+#   - the identifiers of each side, sorted, as an offsets array into a UTF-8 blob, so an
+#     identifier is found by binary search and from then on known by its integer index;
+#   - the links in both directions in compressed sparse row form: the indexes linked to the
+#     i-th identifier are `links[starts[i]:starts[i + 1]]`.
+# A lookup touches a few pages of the file and takes microseconds. A table is rebuilt once it
+# is older than the update frequency of its database (`update_frequency` in the MIE file);
+# the new file replaces the old one atomically, so lookups are never blocked by a rebuild.
+
+LINKS_DIR = os.path.join(CACHE_DIR, "links")
+MANIFEST_FILE = os.path.join(LINKS_DIR, "manifest.json")
+PAGE_SIZE = 10_000  # rows per extraction query (the usual Virtuoso result cap)
+MAX_HOPS = 4  # longest route filled in between two consecutive namespaces of a path
+
+DAY = 24 * 60 * 60
+# Words of `update_frequency` and the age at which a table is refreshed; the first match wins.
+UPDATE_INTERVALS = [
+    ("daily", 1 * DAY),
+    ("biweekly", 14 * DAY),
+    ("weekly", 7 * DAY),
+    ("bimonthly", 61 * DAY),
+    ("monthly", 30 * DAY),
+    ("quarterly", 91 * DAY),
+    ("semiannual", 182 * DAY),
+    ("biannual", 182 * DAY),
+    ("annual", 365 * DAY),
+    ("yearly", 365 * DAY),
+]
+DEFAULT_UPDATE_INTERVAL = 30 * DAY
+
+# Table file: header, then source offsets and blob, target offsets and blob, forward starts
+# and links, reverse starts and links. Arrays are 32-bit unsigned integers in the byte order
+# of the machine that built the table (recorded in the manifest).
+MAGIC = b"RPLINKS1"
+HEADER = struct.Struct("<8s5Q")  # magic, sources, targets, links, source blob bytes, target blob bytes
+ITEM_SIZE = array.array("I").itemsize
+
+
+class Namespace:
+    """An identifier space, and the IRI and CURIE prefixes stripped from its identifiers."""
+
+    def __init__(self, name: str, prefixes: Iterable[str], display: str = "", upper: bool = False):
+        self.name = name
+        self.prefixes = [p.lower() for p in prefixes]
+        self.display = display
+        self.upper = upper
+
+    def canonical(self, value: str) -> str:
+        value = value.strip()
+        lowered = value.lower()
+        for prefix in self.prefixes:
+            if lowered.startswith(prefix):
+                value = value[len(prefix):]
+                break
+        return value.upper() if self.upper else value
+
+
+NAMESPACES = {ns.name: ns for ns in [
+    Namespace("uniprot", ["http://purl.uniprot.org/uniprot/", "uniprot:", "uniprotkb:"], upper=True),
+    Namespace("pdb", ["http://rdf.wwpdb.org/pdb/", "https://rdf.wwpdb.org/pdb/", "pdb:"], upper=True),
+    Namespace("chembl_target", ["http://rdf.ebi.ac.uk/resource/chembl/target/", "chembl.target:"], upper=True),
+    Namespace("reactome", ["http://identifiers.org/reactome/", "reactome:"]),
+    Namespace("mesh", ["http://id.nlm.nih.gov/mesh/", "http://identifiers.org/mesh/", "mesh:"], upper=True),
+    Namespace("mondo", ["http://purl.obolibrary.org/obo/MONDO_", "mondo:", "mondo_"], display="MONDO:"),
+]}
+
+
+class LinkSet:
+    """
+    A set of links between two namespaces, extracted from one database. `where` is a graph
+    pattern binding ?source and ?target, following the MIE cross-reference `pattern`.
+    """
+
+    def __init__(self, name: str, dbname: str, source: str, target: str, relation: str, pattern: str,
+                 where: str, prefixes: str = "", graph: str = ""):
+        self.name = name
+        self.dbname = dbname
+        self.source = source
+        self.target = target
+        self.relation = relation
+        self.pattern = pattern
+        self.where = where
+        self.prefixes = prefixes
+        self.graph = graph
+
+    def query(self, after: Optional[Tuple[str, str]] = None) -> str:
+        """The query for the page of links that follows the link `after` (keyset pagination)."""
+        keyset = ""
+        if after is not None:
+            source, target = (json.dumps(value, ensure_ascii=False) for value in after)
+            keyset = (f"  FILTER(STR(?source) > {source} || "
+                      f"(STR(?source) = {source} && STR(?target) > {target}))\n")
+        graph = f"FROM <{self.graph}>\n" if self.graph else ""
+        return (f"{self.prefixes}SELECT DISTINCT ?source ?target\n{graph}WHERE {{\n{self.where}{keyset}}}\n"
+                f"ORDER BY STR(?source) STR(?target)\nLIMIT {PAGE_SIZE}")
+
+
+LINK_SETS = {link_set.name: link_set for link_set in [
+    LinkSet(
+        "uniprot_pdb", "uniprot", "uniprot", "pdb", "has structure", "rdfs:seeAlso",
+        "  ?source a up:Protein ;\n"
+        "          up:reviewed 1 ;\n"
+        "          rdfs:seeAlso ?target .\n"
+        "  FILTER(STRSTARTS(STR(?target), \"http://rdf.wwpdb.org/pdb/\"))\n",
+        "PREFIX up: <http://purl.uniprot.org/core/>\nPREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>\n",
+    ),
+    LinkSet(
+        "uniprot_reactome", "uniprot", "uniprot", "reactome", "participates in pathway", "rdfs:seeAlso",
+        "  ?source a up:Protein ;\n"
+        "          up:reviewed 1 ;\n"
+        "          rdfs:seeAlso ?target .\n"
+        "  FILTER(STRSTARTS(STR(?target), \"http://identifiers.org/reactome/\"))\n",
+        "PREFIX up: <http://purl.uniprot.org/core/>\nPREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>\n",
+    ),
+    LinkSet(
+        "pdb_uniprot", "pdb", "pdb", "uniprot", "has sequence of", "pdbx:struct_ref",
+        "  ?source a pdbx:datablock ;\n"
+        "          pdbx:has_struct_refCategory/pdbx:has_struct_ref ?ref .\n"
+        "  ?ref pdbx:struct_ref.db_name \"UNP\" ;\n"
+        "       pdbx:struct_ref.pdbx_db_accession ?target .\n",
+        "PREFIX pdbx: <http://rdf.wwpdb.org/schema/pdbx-v50.owl#>\n",
+        "http://rdfportal.org/dataset/pdbj",
+    ),
+    LinkSet(
+        "chembl_target_uniprot", "chembl", "chembl_target", "uniprot", "has component", "cco:targetCmptXref",
+        "  ?source cco:hasTargetComponent ?component .\n"
+        "  ?component cco:targetCmptXref ?target .\n"
+        "  FILTER(STRSTARTS(STR(?target), \"http://purl.uniprot.org/uniprot/\"))\n",
+        "PREFIX cco: <http://rdf.ebi.ac.uk/terms/chembl#>\n",
+        "http://rdf.ebi.ac.uk/dataset/chembl",
+    ),
+    LinkSet(
+        "chembl_target_mesh", "chembl", "chembl_target", "mesh", "is targeted by a drug indicated for",
+        "cco:hasMesh",
+        "  ?mechanism cco:hasTarget ?source ;\n"
+        "             cco:hasMolecule ?molecule .\n"
+        "  ?molecule cco:hasDrugIndication ?indication .\n"
+        "  ?indication cco:hasMesh ?target .\n",
+        "PREFIX cco: <http://rdf.ebi.ac.uk/terms/chembl#>\n",
+        "http://rdf.ebi.ac.uk/dataset/chembl",
+    ),
+    LinkSet(
+        "mondo_mesh", "mondo", "mondo", "mesh", "has database cross-reference", "oboInOwl:hasDbXref",
+        "  ?source a owl:Class ;\n"
+        "          oboInOwl:hasDbXref ?target .\n"
+        "  FILTER(STRSTARTS(STR(?target), \"MESH:\"))\n",
+        "PREFIX owl: <http://www.w3.org/2002/07/owl#>\n"
+        "PREFIX oboInOwl: <http://www.geneontology.org/formats/oboInOwl#>\n",
+        "http://rdfportal.org/ontology/mondo",
+    ),
+]}
+
+
+def table_path(name: str) -> str:
+    return os.path.join(LINKS_DIR, f"{name}.links")
+
+
+# --- Table files ---
+class _Identifiers:
+    """The sorted identifiers of one side of a table, indexable and searchable without decoding all of them."""
+
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]])
+
+    def index(self, identifier: str) -> int:
+        """The index of an identifier, or -1."""
+        key = identifier.encode("utf-8")
+        i = bisect.bisect_left(self, key)
+        return i if i < len(self) and self[i] == key else -1
+
+    def text(self, i: int) -> str:
+        return self[i].decode("utf-8")
+
+
+class LinkTable:
+    """A memory-mapped table file."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, sources, targets, links, source_bytes, target_bytes = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f"Not a link table: {path}")
+        view = memoryview(self._map)
+        position = HEADER.size
+
+        def take(count: int) -> memoryview:
+            nonlocal position
+            section = view[position:position + count * ITEM_SIZE].cast("I")
+            position += count * ITEM_SIZE
+            return section
+
+        def take_blob(size: int) -> memoryview:
+            nonlocal position
+            section = view[position:position + size]
+            position += _padded(size)
+            return section
+
+        self.sources = _Identifiers(take(sources + 1), take_blob(source_bytes))
+        self.targets = _Identifiers(take(targets + 1), take_blob(target_bytes))
+        self._forward = (take(sources + 1), take(links))
+        self._reverse = (take(targets + 1), take(links))
+        self.links = links
+
+    def lookup(self, identifier: str, reverse: bool = False) -> List[str]:
+        """The identifiers linked to `identifier` (a source, or a target if `reverse`)."""
+        keys, values = (self.targets, self.sources) if reverse else (self.sources, self.targets)
+        starts, links = self._reverse if reverse else self._forward
+        i = keys.index(identifier)
+        if i < 0:
+            return []
+        return [values.text(j) for j in links[starts[i]:starts[i + 1]]]
+
+
+def _padded(size: int) -> int:
+    return (size + ITEM_SIZE - 1) // ITEM_SIZE * ITEM_SIZE
+
+
+def _sorted_identifiers(identifiers: Set[str]) -> Tuple[List[str], array.array, bytes]:
+    # Sorted by code point, which is the byte order of their UTF-8 encodings used by the lookups.
+    ordered = sorted(identifiers)
+    offsets = array.array("I", [0])
+    encoded = []
+    for identifier in ordered:
+        data = identifier.encode("utf-8")
+        encoded.append(data)
+        offsets.append(offsets[-1] + len(data))
+    return ordered, offsets, b"".join(encoded)
+
+
+def _csr(pairs: List[Tuple[int, int]], size: int) -> Tuple[array.array, array.array]:
+    starts = array.array("I", bytes(ITEM_SIZE * (size + 1)))
+    for key, _ in pairs:
+        starts[key + 1] += 1
+    for i in range(size):
+        starts[i + 1] += starts[i]
+    return starts, array.array("I", [value for _, value in pairs])
+
+
+def write_table(path: str, links: Iterable[Tuple[str, str]]) -> Dict[str, int]:
+    """Write the (source, target) links to a table file, replacing it atomically."""
+    links = set(links)
+    sources, source_offsets, source_blob = _sorted_identifiers({s for s, _ in links})
+    targets, target_offsets, target_blob = _sorted_identifiers({t for _, t in links})
+    source_index = {s: i for i, s in enumerate(sources)}
+    target_index = {t: i for i, t in enumerate(targets)}
+    forward = sorted((source_index[s], target_index[t]) for s, t in links)
+    reverse = sorted((t, s) for s, t in forward)
+    forward_starts, forward_links = _csr(forward, len(sources))
+    reverse_starts, reverse_links = _csr(reverse, len(targets))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(sources), len(targets), len(links), len(source_blob), len(target_blob)))
+        for offsets, blob in ((source_offsets, source_blob), (target_offsets, target_blob)):
+            f.write(offsets.tobytes())
+            f.write(blob + bytes(_padded(len(blob)) - len(blob)))
+        for section in (forward_starts, forward_links, reverse_starts, reverse_links):
+            f.write(section.tobytes())
+    os.replace(temporary, path)
+    return {"sources": len(sources), "targets": len(targets), "links": len(links)}
+
+
+_tables: Dict[str, Tuple[Tuple[int, int], LinkTable]] = {}
+_lock = threading.Lock()
+
+
+def open_table(name: str) -> Optional[LinkTable]:
+    """The mapped table of a link set, reopened when the file has been rebuilt; None if it was never built."""
+    path = table_path(name)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        cached = _tables.get(name)
+        if cached is None or cached[0] != version:
+            cached = _tables[name] = (version, LinkTable(path))
+        return cached[1]
+
+
+# --- Manifest and refresh ---
+def read_manifest() -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(MANIFEST_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _write_manifest(manifest: Dict[str, Dict[str, Any]]) -> None:
+    os.makedirs(LINKS_DIR, exist_ok=True)
+    temporary = f"{MANIFEST_FILE}.{os.getpid()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(temporary, MANIFEST_FILE)
+
+
+def update_interval(mie_dir: str, dbname: str) -> Tuple[str, float]:
+    """The `update_frequency` of a database's MIE file and the table age (seconds) it stands for."""
+    try:
+        data = mie_cache.load_yaml(os.path.join(mie_dir, f"{dbname}.yaml")) or {}
+    except (OSError, ValueError):
+        data = {}
+    schema_info = data.get("schema_info") or {}
+    frequency = str((schema_info.get("version") or {}).get("update_frequency")
+                    or schema_info.get("update_frequency") or "")
+    lowered = frequency.lower()
+    for word, seconds in UPDATE_INTERVALS:
+        if word in lowered:
+            return frequency, seconds
+    return frequency, DEFAULT_UPDATE_INTERVAL
+
+
+def _built(manifest: Dict[str, Dict[str, Any]], name: str) -> Optional[Dict[str, Any]]:
+    entry = manifest.get(name)
+    if entry is None or entry.get("byteorder") != sys.byteorder or not os.path.exists(table_path(name)):
+        return None
+    return entry
+
+
+def is_stale(manifest: Dict[str, Dict[str, Any]], link_set: LinkSet, mie_dir: str) -> bool:
+    entry = _built(manifest, link_set.name)
+    return entry is None or time.time() - entry["built"] > update_interval(mie_dir, link_set.dbname)[1]
+
+
+def status(mie_dir: str) -> List[Dict[str, Any]]:
+    """Namespaces, size, age and freshness of every link set."""
+    manifest = read_manifest()
+    report = []
+    for link_set in LINK_SETS.values():
+        frequency, _ = update_interval(mie_dir, link_set.dbname)
+        entry = _built(manifest, link_set.name)
+        built = entry is not None
+        report.append({
+            "name": link_set.name,
+            "source": link_set.source,
+            "target": link_set.target,
+            "relation": link_set.relation,
+            "dbname": link_set.dbname,
+            "pattern": link_set.pattern,
+            "update_frequency": frequency or None,
+            "built": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(entry["built"])) if built else None,
+            "links": entry["links"] if built else 0,
+            "stale": is_stale(manifest, link_set, mie_dir),
+        })
+    return report
+
+
+async def extract(link_set: LinkSet, endpoint: str) -> Set[Tuple[str, str]]:
+    """All links of a link set, as canonical (source, target) identifiers."""
+    source, target = NAMESPACES[link_set.source], NAMESPACES[link_set.target]
+    links: Set[Tuple[str, str]] = set()
+    after = None
+    async with http_client.session() as client:
+        while True:
+            query = link_set.query(after)
+            with query_stats.track(query, link_set.dbname) as call:
+                results = await result_formats.fetch_bindings(client, endpoint, query, typed=False)
+                call.bytes = results["body_bytes"]
+                call.rows = len(results["bindings"])
+            page = [(b["source"]["value"], b["target"]["value"])
+                    for b in results["bindings"] if "source" in b and "target" in b]
+            # Read until an empty page rather than a short one: endpoints may cap results below PAGE_SIZE.
+            if not page or page[-1] == after:
+                return links
+            links.update((source.canonical(s), target.canonical(t)) for s, t in page)
+            after = page[-1]
+
+
+async def build(endpoints: Dict[str, str], mie_dir: str, names: Optional[List[str]] = None,
+                force: bool = False, log=None) -> List[Dict[str, Any]]:
+    """
+    Extract and write the link sets that are stale (or all of `names` with `force`).
+
+    Returns:
+        list: Name, number of links and seconds of each rebuilt link set, or its error.
+    """
+    unknown = [name for name in names or [] if name not in LINK_SETS]
+    if unknown:
+        raise ValueError(f"Unknown link sets: {', '.join(unknown)}. Supported link sets are {', '.join(LINK_SETS)}.")
+    manifest = read_manifest()
+    selected = [LINK_SETS[name] for name in names or LINK_SETS
+                if force or is_stale(manifest, LINK_SETS[name], mie_dir)]
+    report = []
+    for link_set in selected:
+        started = time.perf_counter()
+        try:
+            with scheduler.priority("batch"):
+                links = await extract(link_set, endpoints[link_set.dbname])
+            counts = write_table(table_path(link_set.name), links)
+        except Exception as e:
+            report.append({"name": link_set.name, "error": f"{type(e).__name__}: {e}"})
+            if log:
+                log(f"{link_set.name}: {type(e).__name__}: {e}")
+            continue
+        seconds = round(time.perf_counter() - started, 1)
+        manifest = read_manifest()
+        manifest[link_set.name] = {**counts, "built": time.time(), "seconds": seconds,
+                                   "dbname": link_set.dbname, "byteorder": sys.byteorder}
+        _write_manifest(manifest)
+        report.append({"name": link_set.name, "links": counts["links"], "seconds": seconds})
+        if log:
+            log(f"{link_set.name}: {counts['links']} links in {seconds} s")
+    return report
+
+
+# --- Mapping ---
+def _neighbors() -> Dict[str, List[Tuple[str, str, bool]]]:
+    """namespace -> (neighbor namespace, link set, reverse) for every link set, in both directions."""
+    neighbors: Dict[str, List[Tuple[str, str, bool]]] = {name: [] for name in NAMESPACES}
+    for link_set in LINK_SETS.values():
+        neighbors[link_set.source].append((link_set.target, link_set.name, False))
+        neighbors[link_set.target].append((link_set.source, link_set.name, True))
+    return neighbors
+
+
+def route(source: str, target: str) -> List[str]:
+    """The shortest chain of namespaces from `source` to `target`, both included."""
+    neighbors = _neighbors()
+    previous: Dict[str, Optional[str]] = {source: None}
+    queue = deque([source])
+    while queue:
+        namespace = queue.popleft()
+        if namespace == target:
+            path = [namespace]
+            while previous[path[-1]] is not None:
+                path.append(previous[path[-1]])
+            return path[::-1]
+        for neighbor, _, _ in neighbors[namespace]:
+            if neighbor not in previous:
+                previous[neighbor] = namespace
+                queue.append(neighbor)
+    raise ValueError(f"No link sets connect {source} to {target}.")
+
+
+def map_ids(ids: List[str], path: List[str], mie_dir: str) -> Dict[str, Any]:
+    """
+    Translate identifiers along a chain of namespaces, using the link tables only.
+    Consecutive namespaces without a link set between them are joined by the shortest route.
+
+    Returns:
+        dict: The full route, the link sets used, and the identifiers reached from each input
+        identifier (in the last namespace of the route, with its display prefix).
+    """
+    unknown = [namespace for namespace in path if namespace not in NAMESPACES]
+    if unknown:
+        raise ValueError(f"Unknown namespaces: {', '.join(unknown)}. Supported namespaces are {', '.join(NAMESPACES)}.")
+    if len(path) < 2:
+        raise ValueError("The path needs at least two namespaces.")
+    full = [path[0]]
+    for namespace in path[1:]:
+        segment = route(full[-1], namespace)
+        if len(segment) - 1 > MAX_HOPS:
+            raise ValueError(f"The route {' -> '.join(segment)} is too long; give the namespaces in between.")
+        full += segment[1:]
+
+    neighbors = _neighbors()
+    hops = []
+    for source, target in zip(full, full[1:]):
+        tables = []
+        for neighbor, name, reverse in neighbors[source]:
+            if neighbor != target:
+                continue
+            table = open_table(name)
+            if table is None:
+                raise ValueError(f"The link table {name} has not been built. "
+                                 "Build it with `uv run script/build_link_tables.py`.")
+            tables.append((name, table, reverse))
+        hops.append(tables)
+
+    first = NAMESPACES[full[0]]
+    display = NAMESPACES[full[-1]].display
+    mapped: Dict[str, List[str]] = {}
+    for identifier in ids:
+        current = {first.canonical(identifier)}
+        for tables in hops:
+            current = {linked for value in current for _, table, reverse in tables
+                       for linked in table.lookup(value, reverse)}
+            if not current:
+                break
+        mapped[identifier] = [display + value for value in sorted(current)]
+    used = [name for tables in hops for name, _, _ in tables]
+    manifest = read_manifest()
+    return {
+        "route": full,
+        "link_sets": used,
+        "stale_link_sets": [name for name in used if is_stale(manifest, LINK_SETS[name], mie_dir)],
+        "mapped": mapped,
+    }
@@ -0,0 +1,54 @@
+import json
+import os
+import threading
+from typing import Any, Dict, Tuple
+
+import yaml
+
+import shared_store
+
+# --- Cache of parsed MIE files ---
+# Parsing the larger MIE files takes far longer than serving them. Parsed files are kept in
+# process memory and, as JSON, in `shared_store`, so that in a multi-worker deployment a
+# file is parsed by one worker only. Entries are keyed by path, size and modification time,
+# so an edited (or newly saved) file is parsed again.
+
+MIE_CACHE_NAMESPACE = "mie"
+MIE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+shared_store.configure(MIE_CACHE_NAMESPACE, MIE_CACHE_MAX_BYTES)
+
+_parsed: Dict[str, Tuple[str, Any]] = {}
+_lock = threading.Lock()
+
+
+def load_yaml(path: str) -> Any:
+    """
+    Parse a YAML file, using the cache when the file has not changed.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        The parsed content. Callers must not modify it, as it is shared.
+    """
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    with _lock:
+        hit = _parsed.get(path)
+    if hit is not None and hit[0] == key:
+        return hit[1]
+    shared = shared_store.get_text(MIE_CACHE_NAMESPACE, key)
+    if shared is not None:
+        content = json.loads(shared)
+    else:
+        with open(path, "r", encoding="utf-8") as file:
+            content = yaml.safe_load(file)
+        try:
+            shared_store.put_text(MIE_CACHE_NAMESPACE, key, json.dumps(content))
+        except (TypeError, ValueError):
+            # Values without a JSON form (e.g. dates) are kept in this process only.
+            pass
+    with _lock:
+        _parsed[path] = (key, content)
+    return content
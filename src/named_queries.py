@@ -0,0 +1,347 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import yaml
+
+import mie_cache
+import shared_store
+from compact_results import PREFIX_PATTERN
+
+# --- Library of parameterized queries ---
+# The `sparql_query_examples` of the MIE files and the sparql-examples/<db>.rq files are
+# tested queries. Each one is compiled into a named template whose constants become typed
+# parameters:
+#   limit      the final LIMIT,
+#   taxon      an NCBI taxonomy IRI (when the query mentions a single taxon),
+#   accession  the IDs listed in a VALUES block (e.g. `VALUES ?protein { uniprot:P04637 }`),
+#   keyword    the search string of `bif:contains`, of a single-CONTAINS FILTER on a
+#              lower-cased value, or of a REGEX made of plain words.
+# A parameter that is not given keeps the example's value. Values are validated for their
+# type and written into the query as escaped literals or full IRIs, so a parameter cannot
+# change the structure of the query. Long accession lists are split into several queries
+# when the query returns plain rows; with LIMIT, OFFSET, ORDER BY, DISTINCT, grouping or
+# aggregates, the concatenated results would differ from one query's, so they are refused.
+# Results are cached in `shared_store` per template version and parameter values.
+
+CACHE_NAMESPACE = "named_queries"
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+CACHE_TTL = 24 * 3600.0  # seconds
+MAX_LIMIT = 10_000
+MAX_VALUES = 200  # accessions per query; longer lists are sent as several queries
+MAX_KEYWORD_LENGTH = 200
+ACCESSION_SYNTAX = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.:\-]*$")
+KEYWORD_SYNTAX = re.compile(r"^[\w][\w .,'+/-]*$")
+BIF_KEYWORD_SYNTAX = re.compile(r"^[\w][\w .,+/-]*$")  # no quotes inside Virtuoso free-text expressions
+
+FINAL_LIMIT = re.compile(r"\bLIMIT\s+(\d+)(\s*(?:OFFSET\s+\d+\s*)?)$", re.IGNORECASE)
+VALUES_BLOCK = re.compile(r"\bVALUES\s+\?(\w+)\s*\{([^{}]*)\}", re.IGNORECASE)
+VALUES_ITEM = re.compile(r"<([^<>\s]+)>|([A-Za-z][\w.-]*|):([\w.:-]+)|(\S+)")
+TAXON_IRI = re.compile(r"<(http://(?:purl\.uniprot\.org|identifiers\.org)/taxonomy/|"
+                       r"http://purl\.obolibrary\.org/obo/NCBITaxon_)(\d+)>")
+TAXON_NAMESPACES = re.compile(r"(?:/taxonomy/|/NCBITaxon_|/taxon/)$")
+PREFIXED_NUMBER = re.compile(r"(?<![\w:<?$])([A-Za-z][\w.-]*):(\d+)\b")
+BIF_CONTAINS = re.compile(r'\bbif:contains\s+"([^"\\]*)"', re.IGNORECASE)
+CONTAINS_FILTER = re.compile(
+    r'\bFILTER\s*\(\s*CONTAINS\s*\(\s*LCASE\s*\(\s*(?:STR\s*\(\s*)?\?\w+\s*\)?\s*\)\s*,\s*"([^"\\]*)"\s*\)\s*\)',
+    re.IGNORECASE)
+REGEX_FILTER = re.compile(r'\bREGEX\s*\(\s*(?:STR\s*\(\s*)?\?\w+\s*\)?\s*,\s*"([\w |-]+)"', re.IGNORECASE)
+NOT_SPLITTABLE = re.compile(
+    r"\b(?:LIMIT|OFFSET)\s+\d|\b(?:ORDER|GROUP)\s+BY\b|\b(?:DISTINCT|REDUCED|HAVING)\b|"
+    r"\b(?:COUNT|SUM|AVG|MIN|MAX|SAMPLE|GROUP_CONCAT)\s*\(", re.IGNORECASE)
+COMMENT_LINE = re.compile(r"^\s*#.*$", re.MULTILINE)
+REGEX_METACHARACTERS = re.compile(r"([\\.?*+{}()\[\]^$|])")
+RQ_DESCRIPTION = re.compile(r"^#\s*Description:\s*(.+)$", re.MULTILINE)
+
+shared_store.configure(CACHE_NAMESPACE, CACHE_MAX_BYTES)
+
+PARAM_DESCRIPTIONS = {
+    "limit": f"maximum number of rows (1-{MAX_LIMIT})",
+    "taxon": "NCBI taxonomy ID, e.g. 9606 or NCBITaxon:9606",
+    "accession": "list of IDs (local names, CURIEs or IRIs of the example's namespace)",
+    "keyword": "search word or phrase; a list of them matches any",
+}
+
+
+def _string_literal(value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n").replace("\r", "\\r")
+    return f'"{escaped}"'
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")[:60] or "query"
+
+
+class Param:
+    """A typed parameter and the spans of the query text it replaces."""
+
+    def __init__(self, name: str, kind: str, default: Any):
+        self.name = name
+        self.kind = kind
+        self.default = default
+        self.spans: List[Tuple[int, int, Callable[[Any], str]]] = []
+        self.namespaces: List[str] = []  # accession: namespace of the IDs
+        self.label: Optional[str] = None  # accession: prefix label of the namespace
+        self.context = ""  # keyword: "bif", "contains" or "regex"
+
+    def describe(self) -> Dict[str, Any]:
+        return {"type": self.kind, "default": self.default, "description": PARAM_DESCRIPTIONS[self.kind]}
+
+
+def _validate(param: Param, value: Any) -> Any:
+    """The value of a parameter, checked and normalized for its type. Raises ValueError."""
+    if param.kind == "limit":
+        if isinstance(value, bool) or not isinstance(value, (int, str)) or not str(value).isdigit() \
+                or not 1 <= int(value) <= MAX_LIMIT:
+            raise ValueError(f"'{param.name}' must be an integer between 1 and {MAX_LIMIT}.")
+        return int(value)
+    if param.kind == "taxon":
+        match = re.fullmatch(r"(?:(?:NCBITaxon|taxon|taxonomy|txid)[:_]?)?(\d+)", str(value).strip(), re.IGNORECASE)
+        if isinstance(value, bool) or match is None or int(match.group(1)) == 0:
+            raise ValueError(f"'{param.name}' must be an NCBI taxonomy ID such as 9606.")
+        return int(match.group(1))
+    if param.kind == "accession":
+        values = value if isinstance(value, list) else [value]
+        if not values:
+            raise ValueError(f"'{param.name}' must list at least one ID.")
+        ids = []
+        for item in values:
+            item = str(item).strip()
+            for namespace in param.namespaces:
+                if item.startswith(namespace):
+                    item = item[len(namespace):]
+                    break
+            else:
+                label, sep, local = item.partition(":")
+                if sep and label == param.label:
+                    item = local
+            if not ACCESSION_SYNTAX.match(item):
+                raise ValueError(f"Invalid ID for '{param.name}': {item!r}")
+            ids.append(item)
+        return ids
+    # keyword
+    values = value if isinstance(value, list) else [value]
+    syntax = BIF_KEYWORD_SYNTAX if param.context == "bif" else KEYWORD_SYNTAX
+    if not values or any(not isinstance(v, str) or len(v) > MAX_KEYWORD_LENGTH or not syntax.match(v.strip())
+                         for v in values):
+        raise ValueError(f"'{param.name}' must be one or more words (letters, digits, spaces and .,+/- only).")
+    if param.context == "contains" and len(values) > 1:
+        raise ValueError(f"'{param.name}' takes a single keyword in this query.")
+    return [v.strip() for v in values] if isinstance(value, list) else value.strip()
+
+
+class Template:
+    def __init__(self, dbname: str, name: str, title: str, description: str, source: str, sparql: str):
+        self.dbname = dbname
+        self.name = name
+        self.title = title
+        self.description = description
+        self.source = source
+        self.sparql = sparql
+        self.version = hashlib.sha256(sparql.encode("utf-8")).hexdigest()[:16]
+        self.params: Dict[str, Param] = {}
+        self.splittable = not NOT_SPLITTABLE.search(COMMENT_LINE.sub("", sparql))
+        _compile(self)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "title": self.title,
+            "description": self.description,
+            "source": self.source,
+            "params": {name: p.describe() for name, p in self.params.items()},
+        }
+
+    def normalize(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """The validated parameter values. Raises ValueError for unknown or invalid parameters."""
+        unknown = [name for name in params if name not in self.params]
+        if unknown:
+            supported = ", ".join(self.params) or "none"
+            raise ValueError(f"Unknown parameter(s) {', '.join(unknown)} for '{self.name}'. Supported parameters: {supported}.")
+        values = {name: _validate(self.params[name], value) for name, value in sorted(params.items())}
+        if not self.splittable:
+            for name, param in self.params.items():
+                if param.kind == "accession" and len(values.get(name, ())) > MAX_VALUES:
+                    raise ValueError(
+                        f"'{name}' takes at most {MAX_VALUES} IDs in '{self.name}': its results cannot be "
+                        f"combined from several queries (it has LIMIT, ORDER BY, DISTINCT, grouping or "
+                        f"aggregates). Pass a list of parameter objects with up to {MAX_VALUES} IDs each.")
+        return values
+
+    def render(self, values: Dict[str, Any]) -> List[str]:
+        """
+        The queries for validated parameter values: one query, or one per chunk of
+        MAX_VALUES accessions when an accession list is longer than that (only for
+        `splittable` templates, see `normalize`).
+        """
+        chunked = [name for name, p in self.params.items() if p.kind == "accession" and name in values
+                   and len(values[name]) > MAX_VALUES]
+        if not chunked:
+            return [self._render(values)]
+        name = chunked[0]
+        ids = values[name]
+        return [self._render({**values, name: ids[i:i + MAX_VALUES]}) for i in range(0, len(ids), MAX_VALUES)]
+
+    def _render(self, values: Dict[str, Any]) -> str:
+        replacements = sorted(
+            ((start, end, render(values[name])) for name, param in self.params.items() if name in values
+             for start, end, render in param.spans), reverse=True)
+        text = self.sparql
+        for start, end, replacement in replacements:
+            text = text[:start] + replacement + text[end:]
+        return text
+
+
+def _in_spans(position: int, spans: List[Tuple[int, int]]) -> bool:
+    return any(start <= position < end for start, end in spans)
+
+
+def _compile(template: Template) -> None:
+    text = template.sparql
+    prefixes = {label: ns for label, ns in PREFIX_PATTERN.findall(text)}
+    claimed: List[Tuple[int, int]] = []
+
+    # accession: VALUES blocks of IRIs in one namespace, with IDs containing a digit
+    for block in VALUES_BLOCK.finditer(text):
+        namespace, label, ids = None, None, []
+        for item in VALUES_ITEM.finditer(block.group(2)):
+            iri, item_label, local, other = item.groups()
+            if other is not None:
+                break
+            if iri is not None:
+                head, local = re.match(r"(.*?[/#_=])([^/#_=]*)$", iri).groups() if re.search(r"[/#_=]", iri) else ("", iri)
+                item_namespace = head
+            else:
+                item_namespace = prefixes.get(item_label)
+                if item_namespace is None:
+                    break
+            if namespace is None:
+                namespace, label = item_namespace, item_label
+            if item_namespace != namespace or not re.search(r"\d", local):
+                break
+            ids.append(local)
+        else:
+            if not ids or not namespace or TAXON_NAMESPACES.search(namespace):
+                continue  # taxonomy IDs are left to the taxon parameter
+            name = "accession" if "accession" not in template.params else block.group(1)
+            if name in template.params:
+                continue
+            param = Param(name, "accession", ids)
+            param.namespaces = [namespace]
+            param.label = label or next((lb for lb, ns in prefixes.items() if ns == namespace), None)
+            param.spans.append((block.start(2), block.end(2),
+                                lambda ids, ns=namespace: " " + " ".join(f"<{ns}{i}>" for i in ids) + " "))
+            template.params[name] = param
+            claimed.append((block.start(), block.end()))
+
+    # taxon: a single taxonomy ID, as a full IRI or a prefixed name
+    taxa = []
+    for match in TAXON_IRI.finditer(text):
+        if not _in_spans(match.start(), claimed):
+            taxa.append((match.start(2), match.end(2), match.group(2)))
+    for match in PREFIXED_NUMBER.finditer(text):
+        if TAXON_NAMESPACES.search(prefixes.get(match.group(1), "")) and not _in_spans(match.start(), claimed):
+            taxa.append((match.start(2), match.end(2), match.group(2)))
+    if taxa and len({taxon for _, _, taxon in taxa}) == 1:
+        param = Param("taxon", "taxon", int(taxa[0][2]))
+        param.spans = [(start, end, str) for start, end, _ in taxa]
+        template.params["taxon"] = param
+
+    # keyword: the first free-text search, CONTAINS filter or word REGEX
+    candidates = []
+    for match in BIF_CONTAINS.finditer(text):
+        words = re.findall(r"'([^']*)'", match.group(1)) or [match.group(1)]
+        candidates.append((match.start(), match.start(1) - 1, match.end(1) + 1, words if len(words) > 1 else words[0], "bif"))
+    for match in CONTAINS_FILTER.finditer(text):
+        candidates.append((match.start(), match.start(1) - 1, match.end(1) + 1, match.group(1), "contains"))
+    for match in REGEX_FILTER.finditer(text):
+        words = match.group(1).split("|")
+        candidates.append((match.start(), match.start(1) - 1, match.end(1) + 1, words if len(words) > 1 else words[0], "regex"))
+    if candidates:
+        _, start, end, default, context = min(candidates)
+        param = Param("keyword", "keyword", default)
+        param.context = context
+        if context == "bif":
+            render = lambda v: _string_literal(" OR ".join(f"'{w}'" for w in (v if isinstance(v, list) else [v])))
+        elif context == "regex":
+            render = lambda v: _string_literal("|".join(REGEX_METACHARACTERS.sub(r"\\\1", w)
+                                                        for w in (v if isinstance(v, list) else [v])))
+        else:
+            render = lambda v: _string_literal(v.lower())
+        param.spans.append((start, end, render))
+        template.params["keyword"] = param
+
+    # limit: the LIMIT of the outermost query
+    match = FINAL_LIMIT.search(text.rstrip())
+    if match:
+        param = Param("limit", "limit", int(match.group(1)))
+        param.spans.append((match.start(1), match.end(1), str))
+        template.params["limit"] = param
+
+
+# --- The library of all databases ---
+_library: Dict[str, Any] = {"version": None, "templates": {}}
+_lock = threading.Lock()
+
+
+def _sources(mie_dir: str, examples_dir: str, dbnames: List[str]) -> List[Tuple[str, str, str]]:
+    paths = []
+    for dbname in dbnames:
+        for kind, path in (("mie", os.path.join(mie_dir, f"{dbname}.yaml")), ("rq", os.path.join(examples_dir, f"{dbname}.rq"))):
+            if os.path.exists(path):
+                paths.append((dbname, kind, path))
+    return paths
+
+
+def load_library(mie_dir: str, examples_dir: str, dbnames: List[str]) -> Dict[str, Dict[str, Template]]:
+    """Templates per database and name, compiled again when an MIE or .rq file changes."""
+    sources = _sources(mie_dir, examples_dir, dbnames)
+    version = tuple((path, os.stat(path).st_mtime_ns, os.stat(path).st_size) for _, _, path in sources)
+    with _lock:
+        if _library["version"] == version:
+            return _library["templates"]
+    templates: Dict[str, Dict[str, Template]] = {}
+    for dbname, kind, path in sources:
+        entries = []
+        if kind == "mie":
+            try:
+                data = mie_cache.load_yaml(path)
+            except (IOError, OSError, yaml.YAMLError):
+                continue
+            for example in (data.get("sparql_query_examples") or []) if isinstance(data, dict) else []:
+                if isinstance(example, dict) and isinstance(example.get("sparql"), str):
+                    entries.append((example.get("title") or "", str(example.get("description") or
+                                                                     example.get("question") or ""), example["sparql"]))
+        else:
+            with open(path, "r", encoding="utf-8") as file:
+                text = file.read()
+            description = RQ_DESCRIPTION.search(text)
+            description = description.group(1).strip() if description else ""
+            generic = description.lower().rstrip(".") in ("", "sparql description")
+            entries.append(("sparql-examples" if generic else description, "" if generic else description, text))
+        names = templates.setdefault(dbname, {})
+        for title, description, sparql in entries:
+            name, n = _slug(title), 2
+            while name in names:
+                name, n = f"{_slug(title)}_{n}", n + 1
+            names[name] = Template(dbname, name, title, description.strip(), kind, sparql)
+    with _lock:
+        _library["version"] = version
+        _library["templates"] = templates
+    return templates
+
+
+def cache_key(template: Template, values: Dict[str, Any]) -> str:
+    payload = json.dumps([template.dbname, template.name, template.version, values], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def cached_result(key: str) -> Optional[str]:
+    return shared_store.get_text(CACHE_NAMESPACE, key)
+
+
+def cache_result(key: str, text: str) -> None:
+    shared_store.put_text(CACHE_NAMESPACE, key, text, ttl=CACHE_TTL)
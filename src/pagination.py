@@ -0,0 +1,57 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+import scheduler
+
+# --- Paginated iteration over REST search results ---
+# `iterate_pages` turns a page-fetching function into an async generator of items.
+# The next page is requested while the current one is being consumed, and iteration
+# stops (cancelling any prefetch) as soon as `max_items` items have been produced.
+
+PageFetcher = Callable[[Optional[Any]], Awaitable[Tuple[List[Any], Optional[Any]]]]
+
+
+async def iterate_pages(fetch_page: PageFetcher, max_items: Optional[int] = None,
+                        prefetch: bool = True) -> AsyncIterator[Any]:
+    """
+    Iterate over the items of a paginated API.
+
+    Args:
+        fetch_page: Async function taking the cursor of a page (None for the first page) and
+            returning `(items, next_cursor)`; `next_cursor` is None on the last page.
+        max_items (int, optional): Stop after this many items.
+        prefetch (bool): Request the next page while the current page is consumed.
+
+    Yields:
+        The items of each page, in order.
+    """
+    produced = 0
+    pending: Optional[asyncio.Task] = asyncio.ensure_future(fetch_page(None))
+    try:
+        while pending is not None:
+            items, next_cursor = await pending
+            pending = None
+            if not items:
+                return
+            remaining = None if max_items is None else max_items - produced
+            if next_cursor is not None and prefetch and (remaining is None or remaining > len(items)):
+                # Speculative, so it yields to interactive requests (see `scheduler`).
+                with scheduler.priority("batch"):
+                    pending = asyncio.ensure_future(fetch_page(next_cursor))
+            for item in items:
+                if max_items is not None and produced >= max_items:
+                    return
+                produced += 1
+                yield item
+            if max_items is not None and produced >= max_items:
+                return
+            if pending is None and next_cursor is not None:
+                pending = asyncio.ensure_future(fetch_page(next_cursor))
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+
+
+async def collect(fetch_page: PageFetcher, max_items: Optional[int] = None) -> List[Any]:
+    """Collect up to `max_items` items from `iterate_pages` into a list."""
+    return [item async for item in iterate_pages(fetch_page, max_items)]
@@ -0,0 +1,267 @@
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+from id_cache import CACHE_DIR
+
+# --- SPARQL query statistics and slow-query log ---
+# Every query sent to an endpoint is reduced to a fingerprint: comments and PREFIX
+# declarations are dropped, string and numeric literals are replaced by placeholders, as are
+# the IRIs and values inside VALUES blocks and FILTER expressions, `IN (...)` lists become
+# `IN($LIST)` whatever their length, keywords (outside IRIs) are upper-cased and whitespace
+# is collapsed. Queries that differ only in such constants share a fingerprint. Rolling
+# statistics are kept per (fingerprint, dbname); queries answered from the local subgraph
+# cache (`call.source = "local"`) are only counted as local hits, so that the latencies and
+# sizes are those of the endpoint. Calls slower than the threshold are appended with their
+# full text to a JSONL slow-query log, which is rotated (one previous file is kept) once it
+# exceeds SLOW_QUERY_LOG_MAX_BYTES.
+
+SLOW_QUERY_SECONDS = float(os.environ.get("RDFPORTAL_SLOW_QUERY_SECONDS", "10"))
+SLOW_QUERY_LOG = os.path.join(CACHE_DIR, "slow_queries.jsonl")
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+LATENCY_WINDOW = 500  # latest latencies kept per fingerprint for the p95
+MAX_FINGERPRINTS = 5000
+RECENT_SLOW_QUERIES = 200
+SORT_KEYS = ("total_seconds", "p95_seconds", "max_seconds", "count", "error_rate", "bytes", "rows", "local_hits")
+
+NUMBER = r"(?<![\w:.?$-])[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?(?![\w:])"
+TOKEN = re.compile(
+    r'(?P<string>"""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\'|"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\')'
+    r'(?:@[A-Za-z-]+|\^\^(?:<[^>\s]*>|[\w-]*:[\w.-]*))?'
+    r'|(?P<iri><[^<>"{}|^`\\\s]*>)'
+    r'|(?P<comment>#[^\n]*)'
+    rf'|(?P<number>{NUMBER})'
+)
+PREFIX_DECL = re.compile(r"^\s*(?:PREFIX\s+[\w.-]*:\s*<[^>]*>|BASE\s*<[^>]*>)\s*", re.IGNORECASE | re.MULTILINE)
+VALUES_BLOCK = re.compile(r"\bVALUES\s*(\?\w+|\([^)]*\))\s*\{[^{}]*\}", re.IGNORECASE)
+FILTER_START = re.compile(r"\bFILTER\s*\(", re.IGNORECASE)
+KEYWORD = re.compile(
+    r"(?<![\w?$:])(?:select|construct|describe|ask|where|from|named|distinct|reduced|optional|union|minus|"
+    r"graph|service|silent|bind|as|values|filter|not|exists|in|group|by|having|order|asc|desc|limit|offset|a)(?![\w:])",
+    re.IGNORECASE)
+IRI = re.compile(r'(<[^<>"{}|^`\\\s]*>)')
+CALL_SPACE = re.compile(r"(?<![?$\w])([A-Za-z_]\w*)\s+\(")  # `FILTER (` as `FILTER(`
+PAREN_SPACE = re.compile(r"\(\s+|\s+\)|\s*,\s*")
+IN_LIST = re.compile(r"\bIN\s*\([^()]*\)")
+FILTER_CONSTANT = re.compile(r"<[^>\s]*>|(?<![\w?$])[A-Za-z][\w.-]*:[\w.-]+(?!\s*\()")
+
+
+def _strip_filters(text: str) -> str:
+    parts = []
+    position = 0
+    for match in FILTER_START.finditer(text):
+        if match.start() < position:
+            continue
+        depth, end = 1, match.end()
+        while end < len(text) and depth:
+            depth += {"(": 1, ")": -1}.get(text[end], 0)
+            end += 1
+        parts.append(text[position:match.end()])
+        parts.append(FILTER_CONSTANT.sub("$IRI", text[match.end():end]))
+        position = end
+    parts.append(text[position:])
+    return "".join(parts)
+
+
+def normalize(query: str) -> str:
+    """The query with constants replaced by placeholders (`$STR`, `$NUM`, `$IRI`, `$VALUES`, `$LIST`)."""
+    def token(match: re.Match) -> str:
+        if match.group("string") is not None:
+            return " $STR "
+        if match.group("comment") is not None:
+            return " "
+        if match.group("number") is not None:
+            return "$NUM"
+        return match.group("iri")  # kept: only IRIs in VALUES and FILTER are constants
+
+    text = TOKEN.sub(token, PREFIX_DECL.sub("", query))
+    # keywords are upper-cased outside IRIs only (odd parts of the split are IRIs)
+    text = "".join(part if i % 2 else KEYWORD.sub(lambda m: m.group(0) if m.group(0) == "a" else m.group(0).upper(), part)
+                   for i, part in enumerate(IRI.split(text)))
+    text = VALUES_BLOCK.sub(lambda m: f"VALUES {m.group(1)} {{ $VALUES }}", text)
+    text = CALL_SPACE.sub(r"\1(", _strip_filters(text))
+    text = PAREN_SPACE.sub(lambda m: m.group(0).strip() + ("" if m.group(0).strip() != "," else " "), text)
+    text = IN_LIST.sub("IN($LIST)", text)
+    return " ".join(text.split())
+
+
+def fingerprint(query: str) -> str:
+    return hashlib.sha1(normalize(query).encode("utf-8")).hexdigest()[:12]
+
+
+class QueryStats:
+    """Rolling statistics of one fingerprint on one database."""
+
+    def __init__(self, fingerprint: str, dbname: str, normalized: str):
+        self.fingerprint = fingerprint
+        self.dbname = dbname
+        self.normalized = normalized
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.bytes = 0
+        self.rows = 0
+        self.local_hits = 0
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.first_seen = self.last_seen = time.time()
+
+    def add(self, seconds: float, size: int, rows: int, error: bool) -> None:
+        self.count += 1
+        self.errors += error
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.bytes += size
+        self.rows += rows
+        self.latencies.append(seconds)
+        self.last_seen = time.time()
+
+    def add_local(self) -> None:
+        self.local_hits += 1
+        self.last_seen = time.time()
+
+    def p95(self) -> float:
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] if ordered else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "fingerprint": self.fingerprint,
+            "dbname": self.dbname,
+            "count": self.count,
+            "total_seconds": round(self.total_seconds, 3),
+            "mean_seconds": round(self.total_seconds / self.count, 3) if self.count else 0.0,
+            "p95_seconds": round(self.p95(), 3),
+            "max_seconds": round(self.max_seconds, 3),
+            "bytes": self.bytes,
+            "rows": self.rows,
+            "error_rate": round(self.errors / self.count, 3) if self.count else 0.0,
+            "local_hits": self.local_hits,
+            "query": self.normalized,
+        }
+
+
+class Call:
+    """Filled in by the caller of `track` with the size of the answer, and "local" as `source` for local answers."""
+
+    def __init__(self):
+        self.bytes = 0
+        self.rows = 0
+        self.source = "endpoint"
+
+
+_stats: "OrderedDict[tuple, QueryStats]" = OrderedDict()
+_recent_slow: Deque[Dict[str, Any]] = deque(maxlen=RECENT_SLOW_QUERIES)
+_lock = threading.Lock()
+_started = time.time()
+
+
+@contextmanager
+def track(query: str, dbname: str) -> Iterator[Call]:
+    """
+    Time a query sent to an endpoint and record it under its fingerprint.
+
+    Usage:
+        with query_stats.track(sparql_query, dbname) as call:
+            ...  # send the query
+            call.bytes, call.rows = len(response.content), len(rows)
+    """
+    call = Call()
+    error: Optional[str] = None
+    started = time.perf_counter()
+    try:
+        yield call
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}".splitlines()[0][:300]
+        raise
+    finally:
+        _record(query, dbname, time.perf_counter() - started, call, error)
+
+
+def _record(query: str, dbname: str, seconds: float, call: Call, error: Optional[str]) -> None:
+    normalized = normalize(query)
+    key = (hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:12], dbname)
+    with _lock:
+        stats = _stats.get(key)
+        if stats is None:
+            stats = _stats[key] = QueryStats(key[0], dbname, normalized)
+            if len(_stats) > MAX_FINGERPRINTS:
+                _stats.popitem(last=False)
+        _stats.move_to_end(key)
+        if call.source == "local" and error is None:
+            stats.add_local()
+            return
+        stats.add(seconds, call.bytes, call.rows, error is not None)
+    if seconds >= SLOW_QUERY_SECONDS:
+        entry = {"time": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "fingerprint": key[0], "dbname": dbname,
+                 "seconds": round(seconds, 3), "bytes": call.bytes, "rows": call.rows, "error": error, "query": query}
+        _recent_slow.append(entry)
+        try:
+            os.makedirs(os.path.dirname(SLOW_QUERY_LOG), exist_ok=True)
+            if os.path.exists(SLOW_QUERY_LOG) and os.path.getsize(SLOW_QUERY_LOG) > SLOW_QUERY_LOG_MAX_BYTES:
+                os.replace(SLOW_QUERY_LOG, SLOW_QUERY_LOG + ".1")
+            with open(SLOW_QUERY_LOG, "a", encoding="utf-8") as file:
+                file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"Warning: could not write the slow-query log {SLOW_QUERY_LOG}: {e}", file=sys.stderr)
+
+
+def top(sort_by: str = "total_seconds", limit: int = 20, dbname: str = "") -> List[Dict[str, Any]]:
+    """The statistics of the fingerprints ranking highest by `sort_by` (one of `SORT_KEYS`)."""
+    if sort_by not in SORT_KEYS:
+        raise ValueError(f"Unsupported sort key '{sort_by}'. Supported keys are {', '.join(SORT_KEYS)}.")
+    with _lock:
+        rows = [s.as_dict() for s in _stats.values() if not dbname or s.dbname == dbname]
+    rows.sort(key=lambda r: r[sort_by], reverse=True)
+    return rows[:limit]
+
+
+def _lines_from_end(path: str, block_size: int = 65536) -> Iterator[bytes]:
+    """The lines of a file, last first, read in blocks from the end."""
+    with open(path, "rb") as file:
+        position = file.seek(0, os.SEEK_END)
+        rest = b""
+        while position > 0:
+            size = min(block_size, position)
+            position -= size
+            file.seek(position)
+            lines = (file.read(size) + rest).split(b"\n")
+            rest = lines.pop(0)
+            yield from reversed(lines)
+        yield rest
+
+
+def slow_queries(limit: int = 20, fingerprint: str = "") -> List[Dict[str, Any]]:
+    """The most recent slow queries (newest first), from the log files if they are readable."""
+    entries: List[Dict[str, Any]] = []
+    try:
+        for path in (SLOW_QUERY_LOG, SLOW_QUERY_LOG + ".1"):
+            if not os.path.exists(path):
+                continue
+            for line in _lines_from_end(path):
+                if len(entries) >= limit:
+                    return entries
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if not fingerprint or entry.get("fingerprint") == fingerprint:
+                    entries.append(entry)
+        if entries or os.path.exists(SLOW_QUERY_LOG):
+            return entries
+    except OSError:
+        pass
+    with _lock:
+        recent = [e for e in _recent_slow if not fingerprint or e["fingerprint"] == fingerprint]
+    return list(reversed(recent))[:limit]
+
+
+def since() -> float:
+    return _started
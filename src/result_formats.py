@@ -0,0 +1,315 @@
+import codecs
+import csv
+import json
+import random
+import time
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+import http_client
+from result_summary import IRI_SYNTAX, parse_header, parse_term
+
+# --- Negotiation and decoding of SPARQL result formats ---
+# SELECT results are requested (compressed, see `http_client.ACCEPT_ENCODING`) in the result
+# format that decodes fastest for the endpoint. Every endpoint is first tried a few times
+# with each candidate format; after that the format with the lowest decode time per term
+# (row x variable) is used, with an occasional call in another format to follow changes.
+# All formats are decoded incrementally from the response stream into the bindings of the
+# SPARQL JSON format, except JSON itself, which is decoded in one call of the C parser once
+# the body has arrived. CSV does not tell IRIs from literals (values are classified by their
+# syntax), so it is only a candidate when the caller needs plain values (`typed=False`). The
+# same holds for TSV in Virtuoso's dialect (quoted variable names, IRIs as quoted strings):
+# an endpoint answering in it is no longer sent TSV requests from callers needing types.
+
+SPARQL_RESULTS_NS = "{http://www.w3.org/2005/sparql-results#}"
+MEDIA_TYPES = {
+    "json": "application/sparql-results+json",
+    "tsv": "text/tab-separated-values",
+    "xml": "application/sparql-results+xml",
+    "csv": "text/csv",
+}
+TYPED_FORMATS = ("json", "tsv", "xml")
+TRIAL_CALLS = 3  # calls per candidate format before choosing
+EXPLORE_EVERY = 50  # one call in this many uses another candidate format
+DECAY = 0.9  # weight of past calls in the decode cost
+
+
+class JSONDecoder:
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def feed(self, chunk: bytes) -> None:
+        self._chunks.append(chunk)
+
+    def close(self) -> Tuple[List[str], List[Dict[str, Any]]]:
+        data = json.loads(b"".join(self._chunks))
+        return data.get("head", {}).get("vars", []), data["results"]["bindings"]
+
+
+def _tsv_binding(term: str, w3c: bool = True) -> Optional[Dict[str, str]]:
+    kind, value, datatype = parse_term(term, w3c)
+    if kind == "unbound":
+        return None
+    if kind == "iri":
+        return {"type": "uri", "value": value}
+    if kind == "bnode":
+        return {"type": "bnode", "value": value[2:]}
+    if datatype is None:
+        return {"type": "literal", "value": value}
+    if datatype.startswith("@"):
+        return {"type": "literal", "value": value, "xml:lang": datatype[1:]}
+    return {"type": "literal", "value": value, "datatype": datatype}
+
+
+class TSVDecoder:
+    def __init__(self):
+        self.vars: Optional[List[str]] = None
+        self.w3c = True  # whether the header is the W3C `?var` form, see `parse_header`
+        self.bindings: List[Dict[str, Any]] = []
+        self._pending = b""
+
+    def feed(self, chunk: bytes) -> None:
+        lines = (self._pending + chunk).split(b"\n")
+        self._pending = lines.pop()
+        for line in lines:
+            self._line(line.decode("utf-8").rstrip("\r"))
+
+    def _line(self, line: str) -> None:
+        if self.vars is None:
+            self.vars, self.w3c = parse_header(line)
+            return
+        if not line and len(self.vars) != 1:
+            return
+        binding = {}
+        for name, term in zip(self.vars, line.split("\t")):
+            value = _tsv_binding(term, self.w3c)
+            if value is not None:
+                binding[name] = value
+        self.bindings.append(binding)
+
+    def close(self) -> Tuple[List[str], List[Dict[str, Any]]]:
+        if self._pending:
+            self._line(self._pending.decode("utf-8").rstrip("\r"))
+            self._pending = b""
+        return self.vars or [], self.bindings
+
+
+class CSVDecoder:
+    def __init__(self):
+        self.vars: Optional[List[str]] = None
+        self.bindings: List[Dict[str, Any]] = []
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._pending = ""
+        self._record: List[str] = []
+        self._quotes = 0
+
+    def feed(self, chunk: bytes) -> None:
+        lines = (self._pending + self._text.decode(chunk)).split("\n")
+        self._pending = lines.pop()
+        records = []
+        for line in lines:
+            # A line break ends the record unless it is inside a quoted value.
+            self._record.append(line)
+            self._quotes += line.count('"')
+            if self._quotes % 2 == 0:
+                records.append("\n".join(self._record))
+                self._record, self._quotes = [], 0
+        self._rows(records)
+
+    def _rows(self, records: List[str]) -> None:
+        for row in csv.reader(records):
+            if self.vars is None:
+                self.vars = row
+                continue
+            binding = {}
+            for name, value in zip(self.vars, row):
+                if not value:
+                    continue
+                if value.startswith("_:"):
+                    binding[name] = {"type": "bnode", "value": value[2:]}
+                elif IRI_SYNTAX.match(value):
+                    binding[name] = {"type": "uri", "value": value}
+                else:
+                    binding[name] = {"type": "literal", "value": value}
+            self.bindings.append(binding)
+
+    def close(self) -> Tuple[List[str], List[Dict[str, Any]]]:
+        rest = "\n".join(self._record + [self._pending + self._text.decode(b"", final=True)])
+        if rest.strip():
+            self._rows([rest])
+        return self.vars or [], self.bindings
+
+
+class XMLDecoder:
+    def __init__(self):
+        self.vars: List[str] = []
+        self.bindings: List[Dict[str, Any]] = []
+        self._parser = ET.XMLPullParser(events=("end",))
+
+    def feed(self, chunk: bytes) -> None:
+        self._parser.feed(chunk)
+        self._events()
+
+    def _events(self) -> None:
+        for _, element in self._parser.read_events():
+            tag = element.tag
+            if tag == SPARQL_RESULTS_NS + "variable":
+                self.vars.append(element.get("name"))
+            elif tag == SPARQL_RESULTS_NS + "result":
+                binding = {}
+                for child in element:
+                    term = child[0] if len(child) else None
+                    if term is None:
+                        continue
+                    kind = term.tag[len(SPARQL_RESULTS_NS):]
+                    value = {"type": kind, "value": term.text or ""}
+                    if kind == "literal":
+                        if term.get("datatype"):
+                            value["datatype"] = term.get("datatype")
+                        lang = term.get("{http://www.w3.org/XML/1998/namespace}lang")
+                        if lang:
+                            value["xml:lang"] = lang
+                    binding[child.get("name")] = value
+                self.bindings.append(binding)
+                element.clear()
+
+    def close(self) -> Tuple[List[str], List[Dict[str, Any]]]:
+        self._parser.close()
+        self._events()
+        return self.vars, self.bindings
+
+
+DECODERS = {"json": JSONDecoder, "tsv": TSVDecoder, "xml": XMLDecoder, "csv": CSVDecoder}
+
+
+def format_of(content_type: str) -> Optional[str]:
+    """The result format of a response Content-Type, if it is one the decoders read."""
+    media_type = content_type.split(";")[0].strip().lower()
+    for name, known in MEDIA_TYPES.items():
+        if media_type == known:
+            return name
+    return {"application/json": "json", "text/tsv": "tsv", "application/xml": "xml", "text/xml": "xml"}.get(media_type)
+
+
+class FormatStats:
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0  # decayed decode time
+        self.terms = 0.0  # decayed number of decoded terms
+        self.wire_bytes = 0
+        self.body_bytes = 0
+
+    def cost(self) -> float:
+        return self.seconds / self.terms if self.terms else float("inf")
+
+
+class FormatChooser:
+    """Per-endpoint choice of the result format, by measured decode time."""
+
+    def __init__(self):
+        self._stats: Dict[Tuple[str, str], FormatStats] = {}
+        self._rejected: set = set()
+        self._untyped_only: set = set()  # formats served without term types
+        self._calls: Dict[str, int] = {}
+        self._random = random.Random()
+
+    def _get(self, endpoint: str, name: str) -> FormatStats:
+        return self._stats.setdefault((endpoint, name), FormatStats())
+
+    def choose(self, endpoint: str, typed: bool = True) -> str:
+        rejected = self._rejected | self._untyped_only if typed else self._rejected
+        candidates = [f for f in (TYPED_FORMATS if typed else DECODERS) if (endpoint, f) not in rejected]
+        if not candidates:
+            return "json"
+        calls = self._calls[endpoint] = self._calls.get(endpoint, 0) + 1
+        untried = [f for f in candidates if self._get(endpoint, f).calls < TRIAL_CALLS]
+        if untried:
+            return min(untried, key=lambda f: self._get(endpoint, f).calls)
+        if calls % EXPLORE_EVERY == 0:
+            return self._random.choice(candidates)
+        return min(candidates, key=lambda f: self._get(endpoint, f).cost())
+
+    def record(self, endpoint: str, name: str, seconds: float, terms: int, wire_bytes: int, body_bytes: int) -> None:
+        stats = self._get(endpoint, name)
+        stats.calls += 1
+        stats.wire_bytes += wire_bytes
+        stats.body_bytes += body_bytes
+        if terms:
+            stats.seconds = stats.seconds * DECAY + seconds
+            stats.terms = stats.terms * DECAY + terms
+
+    def reject(self, endpoint: str, name: str, typed_only: bool = False) -> None:
+        """Stop requesting a format the endpoint does not serve (with term types, if `typed_only`)."""
+        if name != "json":
+            (self._untyped_only if typed_only else self._rejected).add((endpoint, name))
+
+    def stats(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        report: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for (endpoint, name), s in self._stats.items():
+            report.setdefault(endpoint, {})[name] = {
+                "calls": s.calls,
+                "decode_us_per_term": round(s.cost() * 1e6, 3) if s.terms else None,
+                "wire_bytes": s.wire_bytes,
+                "body_bytes": s.body_bytes,
+                "rejected": (endpoint, name) in self._rejected,
+                "untyped_only": (endpoint, name) in self._untyped_only,
+            }
+        return report
+
+
+chooser = FormatChooser()
+
+
+async def fetch_bindings(client: httpx.AsyncClient, endpoint: str, sparql_query: str, typed: bool = True,
+                         result_format: Optional[str] = None) -> Dict[str, Any]:
+    """
+    POST a SELECT query and decode the results while they are streamed.
+
+    Args:
+        typed (bool): Whether the caller needs term types (IRI, literal, datatype, language).
+            If not, CSV is also a candidate format.
+        result_format (str, optional): Request this format instead of choosing one.
+
+    Returns:
+        dict: "vars", "bindings" (as in the SPARQL JSON format), "format", "wire_bytes" and "body_bytes".
+    """
+    name = result_format or chooser.choose(endpoint, typed)
+    async with client.stream(
+        "POST", endpoint, data={"query": sparql_query},
+        headers={"Accept": MEDIA_TYPES[name], "Accept-Encoding": http_client.ACCEPT_ENCODING}
+    ) as response:
+        served = format_of(response.headers.get("content-type", ""))
+        unsupported = name != "json" and (response.status_code in (406, 415) or (
+            not response.is_error and (served is None or (typed and served == "csv"))))
+        untyped = False
+        if not unsupported:
+            response.raise_for_status()
+            if served is None:
+                raise ValueError(f"Unexpected content type of SPARQL results: {response.headers.get('content-type')}")
+            decoder = DECODERS[served]()
+            seconds, body_bytes = 0.0, 0
+            async for chunk in response.aiter_bytes():
+                body_bytes += len(chunk)
+                started = time.perf_counter()
+                decoder.feed(chunk)
+                seconds += time.perf_counter() - started
+            started = time.perf_counter()
+            variables, bindings = decoder.close()
+            seconds += time.perf_counter() - started
+            wire_bytes = response.num_bytes_downloaded
+            # Virtuoso's TSV loses the term types, which the caller needs.
+            untyped = name != "json" and typed and served == "tsv" and not decoder.w3c
+    if unsupported or untyped:
+        # Retried once the first response is closed, so the retry does not wait for its slot.
+        chooser.reject(endpoint, name, typed_only=not unsupported)
+        return await fetch_bindings(client, endpoint, sparql_query, typed, "json")
+    chooser.record(endpoint, served, seconds, len(bindings) * max(len(variables), 1), wire_bytes, body_bytes)
+    return {"vars": variables, "bindings": bindings, "format": served,
+            "wire_bytes": wire_bytes, "body_bytes": body_bytes}
+
+
+def stats() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Calls, decode cost and bytes per endpoint and result format."""
+    return chooser.stats()
@@ -0,0 +1,96 @@
+import base64
+import secrets
+from typing import Optional, Tuple
+
+import shared_store
+
+# --- Paging of oversized tool responses ---
+# Large responses are kept in a bounded server-side buffer. The client receives the
+# first page and an opaque cursor, and pulls later pages with `fetch_more`.
+# Buffers are evicted least-recently-used first once the total size exceeds the byte cap.
+# They are kept in `shared_store`, so a cursor can be followed from any worker process.
+
+PAGE_SIZE = 40_000  # characters per page
+BUFFER_MAX_BYTES = 64 * 1024 * 1024
+BUFFER_NAMESPACE = "pages"
+
+shared_store.configure(BUFFER_NAMESPACE, BUFFER_MAX_BYTES)
+
+
+def _encode_cursor(buffer_id: str, offset: int) -> str:
+    return base64.urlsafe_b64encode(f"{buffer_id}:{offset}".encode("ascii")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("ascii")
+        buffer_id, offset = raw.rsplit(":", 1)
+        return buffer_id, int(offset)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def _store(text: str) -> str:
+    buffer_id = secrets.token_urlsafe(9)
+    shared_store.put_text(BUFFER_NAMESPACE, buffer_id, text)
+    return buffer_id
+
+
+def _page_end(text: str, offset: int, page_size: int) -> int:
+    end = offset + page_size
+    if end >= len(text):
+        return len(text)
+    # Prefer to break after a newline so that CSV rows and YAML lines stay intact.
+    newline = text.rfind("\n", offset, end)
+    return newline + 1 if newline > offset else end
+
+
+def _render(buffer_id: str, text: str, offset: int, page_size: int) -> str:
+    end = _page_end(text, offset, page_size)
+    page = text[offset:end]
+    if end >= len(text):
+        return page
+    return (
+        f"{page}\n"
+        f"[Truncated: characters {offset}-{end} of {len(text)} shown. "
+        f'Call `fetch_more` with cursor="{_encode_cursor(buffer_id, end)}" for the next page.]'
+    )
+
+
+def paginate(text: str, page_size: Optional[int] = None) -> str:
+    """
+    Return `text` unchanged if it fits in one page. Otherwise keep it in the buffer and
+    return the first page followed by a note carrying the cursor for the next page.
+
+    Args:
+        text (str): The full tool response.
+        page_size (int, optional): Characters per page. Defaults to `PAGE_SIZE`.
+
+    Returns:
+        str: The whole text or its first page.
+    """
+    page_size = page_size or PAGE_SIZE
+    if len(text) <= page_size:
+        return text
+    buffer_id = _store(text)
+    return _render(buffer_id, text, 0, page_size)
+
+
+def fetch_page(cursor: str, page_size: Optional[int] = None) -> str:
+    """
+    Return the page starting at `cursor`, followed by the cursor of the next page if any.
+
+    Args:
+        cursor (str): A cursor returned by `paginate` or a previous `fetch_page`.
+        page_size (int, optional): Characters per page. Defaults to `PAGE_SIZE`.
+
+    Returns:
+        str: The requested page.
+    """
+    buffer_id, offset = _decode_cursor(cursor)
+    text = shared_store.get_text(BUFFER_NAMESPACE, buffer_id)
+    if text is None:
+        raise KeyError("The cursor has expired. Run the original request again.")
+    if not 0 <= offset < len(text):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return _render(buffer_id, text, offset, page_size or PAGE_SIZE)
@@ -0,0 +1,264 @@
+import math
+import random
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# --- Streaming result summaries ---
+# A summary describes the shape of a result set in one pass over its rows and in memory that
+# does not depend on the number of rows. Rows are read from the SPARQL TSV format, whose
+# terms keep their kind (`<iri>`, `_:bnode`, `"literal"^^<type>`, bare numbers). Virtuoso's
+# TSV is not the W3C format: it has quoted variable names without `?`, and writes IRIs as
+# quoted strings, which are then told from literals by their syntax. Per variable
+# the summary keeps
+#   - a HyperLogLog sketch estimating the number of distinct values,
+#   - space-saving counters for the most frequent values,
+#   - min, max and mean of the numeric values,
+#   - the number of IRIs, literals, blank nodes and unbound values,
+# and a reservoir sample of whole rows is kept for the result.
+
+HLL_PRECISION = 12  # 4096 registers, about 1.6% standard error
+TOP_K = 5
+TOP_K_COUNTERS = 64  # counters kept by the space-saving sketch; more counters, fewer errors
+SAMPLE_SIZE = 5
+MAX_VALUE_LENGTH = 100  # values are shortened to this many characters in the summary
+
+XSD = "http://www.w3.org/2001/XMLSchema#"
+NUMERIC_TYPES = {XSD + t for t in (
+    "integer", "decimal", "float", "double", "int", "long", "short", "byte", "nonNegativeInteger",
+    "positiveInteger", "negativeInteger", "nonPositiveInteger", "unsignedInt", "unsignedLong",
+    "unsignedShort", "unsignedByte")}
+IRI_SYNTAX = re.compile(r"^(?:https?|ftp|urn|mailto):\S*$")
+TSV_ESCAPES = {"t": "\t", "n": "\n", "r": "\r", '"': '"', "'": "'", "\\": "\\"}
+
+
+class HyperLogLog:
+    """Distinct-count estimate (Flajolet et al. 2007, with linear counting for small sets)."""
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m)
+
+    def add(self, value: str) -> None:
+        # The built-in string hash is SipHash: well mixed, and stable within the process,
+        # which is all a sketch that is never persisted needs.
+        h = hash(value) & 0xFFFFFFFFFFFFFFFF
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def estimate(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+
+class SpaceSaving:
+    """
+    Most frequent values (Metwally et al. 2005). A value's count is an upper bound that
+    overestimates by at most its `error`; any value occurring more than n / capacity times is kept.
+    """
+
+    def __init__(self, capacity: int = TOP_K_COUNTERS):
+        self.capacity = capacity
+        self.counters: Dict[str, List[int]] = {}  # value -> [count, error]
+        self._minimum: List[str] = []  # candidates for eviction, found by one scan of the counters
+        self._lowest = 0
+
+    def add(self, value: str) -> None:
+        counter = self.counters.get(value)
+        if counter is not None:
+            counter[0] += 1
+        elif len(self.counters) < self.capacity:
+            self.counters[value] = [1, 0]
+        else:
+            count = self._evict()
+            self.counters[value] = [count + 1, count]
+
+    def _evict(self) -> int:
+        # The candidates all had the minimum count when they were collected; as counts only
+        # grow, a candidate whose count is unchanged still has the minimum count.
+        while True:
+            if not self._minimum:
+                lowest = min(counter[0] for counter in self.counters.values())
+                self._minimum = [v for v, counter in self.counters.items() if counter[0] == lowest]
+                self._lowest = lowest
+            value = self._minimum.pop()
+            counter = self.counters.get(value)
+            if counter is not None and counter[0] == self._lowest:
+                del self.counters[value]
+                return self._lowest
+
+    def top(self, k: int = TOP_K, min_count: int = 1) -> List[Tuple[str, int, int]]:
+        """The `k` values with the highest guaranteed counts of at least `min_count`, as (value, count, error)."""
+        ordered = sorted(self.counters.items(), key=lambda item: item[1][0] - item[1][1], reverse=True)
+        return [(value, count, error) for value, (count, error) in ordered[:k] if count - error >= min_count]
+
+
+def parse_header(line: str) -> Tuple[List[str], bool]:
+    """
+    The variable names of a TSV header line, and whether it is the W3C format (`?var`)
+    rather than Virtuoso's (`"var"`).
+    """
+    names = line.rstrip("\r\n").split("\t") if line.strip() else []
+    w3c = all(name[:1] in "?$" for name in names)
+    return [name.lstrip("?$").strip('"') for name in names], w3c
+
+
+def parse_term(term: str, w3c: bool = True) -> Tuple[str, str, Optional[str]]:
+    """
+    Split a term of the SPARQL TSV format into its kind ("iri", "bnode", "literal" or
+    "unbound"), its value and, for literals, its datatype or "@lang". Without `w3c`, quoted
+    strings that look like IRIs are taken for IRIs (Virtuoso's TSV).
+    """
+    if not term:
+        return "unbound", "", None
+    if term[0] == "<" and term[-1] == ">":
+        return "iri", term[1:-1], None
+    if term.startswith("_:"):
+        return "bnode", term, None
+    if term[0] == '"':
+        end = term.rfind('"')
+        lexical = _unescape(term[1:end]) if end > 0 else term[1:]
+        suffix = term[end + 1:] if end > 0 else ""
+        if suffix.startswith("^^"):
+            return "literal", lexical, suffix[2:].strip("<>")
+        if not w3c and not suffix:
+            if lexical.startswith("_:"):
+                return "bnode", lexical, None
+            if IRI_SYNTAX.match(lexical):
+                return "iri", lexical, None
+        return "literal", lexical, suffix or None
+    # Turtle abbreviations of numbers and booleans
+    if term in ("true", "false"):
+        return "literal", term, XSD + "boolean"
+    if term.lstrip("+-").isdigit():
+        return "literal", term, XSD + "integer"
+    return "literal", term, XSD + ("double" if "e" in term.lower() else "decimal")
+
+
+def _unescape(text: str) -> str:
+    if "\\" not in text:
+        return text
+    out, i = [], 0
+    while i < len(text):
+        if text[i] == "\\" and i + 1 < len(text):
+            out.append(TSV_ESCAPES.get(text[i + 1], text[i + 1]))
+            i += 2
+        else:
+            out.append(text[i])
+            i += 1
+    return "".join(out)
+
+
+class VariableSummary:
+    def __init__(self):
+        self.kinds = {"iri": 0, "literal": 0, "bnode": 0, "unbound": 0}
+        self.distinct = HyperLogLog()
+        self.frequent = SpaceSaving()
+        self.numeric_count = 0
+        self.numeric_sum = 0.0
+        self.numeric_min: Optional[float] = None
+        self.numeric_max: Optional[float] = None
+        self.datatypes = SpaceSaving(8)
+
+    def add(self, term: str, w3c: bool = True) -> None:
+        kind, value, datatype = parse_term(term, w3c)
+        self.kinds[kind] += 1
+        if kind == "unbound":
+            return
+        self.distinct.add(term)
+        self.frequent.add(value)
+        if kind != "literal":
+            return
+        self.datatypes.add(datatype or XSD + "string")
+        if datatype in NUMERIC_TYPES:
+            try:
+                number = float(value)
+            except ValueError:
+                return
+            self.numeric_count += 1
+            self.numeric_sum += number
+            if self.numeric_min is None or number < self.numeric_min:
+                self.numeric_min = number
+            if self.numeric_max is None or number > self.numeric_max:
+                self.numeric_max = number
+
+    def result(self, rows: int, shorten: Callable[[str], str]) -> Dict[str, Any]:
+        bound = rows - self.kinds["unbound"]
+        summary: Dict[str, Any] = {
+            "bound": bound,
+            "distinct_estimate": min(self.distinct.estimate(), bound),
+            "kinds": {kind: round(n / rows, 3) for kind, n in self.kinds.items() if n} if rows else {},
+            "top_values": [{"value": shorten(value), "count": count, **({"max_overcount": error} if error else {})}
+                           for value, count, error in self.frequent.top(min_count=2)],
+        }
+        if self.kinds["literal"]:
+            summary["datatypes"] = [shorten(datatype) for datatype, _, _ in self.datatypes.top(3)]
+        if self.numeric_count:
+            summary["numeric"] = {
+                "count": self.numeric_count,
+                "min": self.numeric_min,
+                "max": self.numeric_max,
+                "mean": round(self.numeric_sum / self.numeric_count, 6),
+            }
+        return summary
+
+
+class ResultSummarizer:
+    """
+    Summarizes the rows of a SPARQL TSV result as they arrive.
+
+    Usage:
+        summarizer = ResultSummarizer(header_line)
+        for line in lines:
+            summarizer.add_line(line)
+        summary = summarizer.result(compactor.compact)
+    """
+
+    def __init__(self, header: str, sample_size: int = SAMPLE_SIZE, seed: Optional[int] = None):
+        self.variables, self.w3c = parse_header(header)
+        self.summaries = [VariableSummary() for _ in self.variables]
+        self.rows = 0
+        self.sample_size = sample_size
+        self.sample: List[List[str]] = []
+        self._random = random.Random(seed)
+
+    def add_line(self, line: str) -> None:
+        line = line.rstrip("\r\n")
+        if not line and len(self.variables) != 1:
+            return
+        terms = line.split("\t")
+        self.rows += 1
+        for summary, term in zip(self.summaries, terms):
+            summary.add(term, self.w3c)
+        for summary in self.summaries[len(terms):]:
+            summary.add("")
+        # Reservoir sampling (Algorithm R): every row ends up in the sample with equal probability.
+        if len(self.sample) < self.sample_size:
+            self.sample.append(terms)
+        else:
+            slot = self._random.randrange(self.rows)
+            if slot < self.sample_size:
+                self.sample[slot] = terms
+
+    def result(self, compact: Callable[[str], str] = lambda iri: iri) -> Dict[str, Any]:
+        def shorten(value: str) -> str:
+            value = compact(value) if "://" in value else value
+            return value if len(value) <= MAX_VALUE_LENGTH else value[:MAX_VALUE_LENGTH - 3] + "..."
+
+        def sample_value(term: str) -> str:
+            return shorten(parse_term(term, self.w3c)[1])
+
+        return {
+            "rows": self.rows,
+            "variables": {variable: summary.result(self.rows, shorten)
+                          for variable, summary in zip(self.variables, self.summaries)},
+            "sample": [{variable: sample_value(term) for variable, term in zip(self.variables, row) if term}
+                       for row in self.sample],
+        }
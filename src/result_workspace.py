@@ -0,0 +1,420 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+# --- Result workspace ---
+# SPARQL results are materialized into an in-process SQLite database (one table per
+# result handle) so that follow-up filtering, grouping, joining and sampling run
+# locally instead of being sent back to the remote endpoint.
+# The handle metadata lives in the same database. When RDFPORTAL_SHARED_DIR is set (see
+# `serve.py`), the database is a file in that directory shared by all worker processes.
+
+WORKSPACE_MAX_BYTES = 256 * 1024 * 1024  # Total (approximate) size of all stored results.
+WORKSPACE_MAX_AGE = 60 * 60  # Seconds a result is kept after it was last used.
+WORKSPACE_MAX_ROWS_RETURNED = 1000
+WORKSPACE_FILE = (os.path.join(os.environ["RDFPORTAL_SHARED_DIR"], "workspace.sqlite")
+                  if os.environ.get("RDFPORTAL_SHARED_DIR") else ":memory:")
+
+FILTER_OPERATORS = {
+    "=": "{col} = ?",
+    "!=": "{col} != ?",
+    "<": "{col} < ?",
+    "<=": "{col} <= ?",
+    ">": "{col} > ?",
+    ">=": "{col} >= ?",
+    "contains": "instr({col}, ?) > 0",
+    "startswith": "substr({col}, 1, length(?)) = ?",
+    "endswith": "substr({col}, -length(?)) = ?",
+    "in": "{col} IN ({placeholders})",
+    "is_null": "{col} IS NULL",
+    "not_null": "{col} IS NOT NULL",
+}
+
+AGGREGATE_FUNCTIONS = {
+    "count": "COUNT({col})",
+    "count_distinct": "COUNT(DISTINCT {col})",
+    "sum": "SUM({col})",
+    "avg": "AVG({col})",
+    "min": "MIN({col})",
+    "max": "MAX({col})",
+}
+
+# Only numbers that read back exactly as written are stored as numbers: identifiers such as
+# "0123", "1.10" or "1e3" stay text, as do integers beyond SQLite's 64-bit range.
+NUMBER = re.compile(r"[+-]?(?:0|[1-9][0-9]*)(\.[0-9]+)?([eE][+-]?[0-9]+)?")
+SQLITE_INTEGER_RANGE = (-2 ** 63, 2 ** 63 - 1)
+EMPTY_COLUMN = "_empty"  # the only column of a result without columns
+
+META_COLUMNS = ("handle", "dbname", "sparql_query", "columns", "row_count", "bytes", "created", "last_used")
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    if path != ":memory:":
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    if path != ":memory:":
+        conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS _workspace_results ("
+        " handle TEXT PRIMARY KEY, dbname TEXT, sparql_query TEXT, columns TEXT,"
+        " row_count INTEGER, bytes INTEGER, created REAL, last_used REAL)"
+    )
+    conn.commit()
+    return conn
+
+
+_conn = _connect(WORKSPACE_FILE)
+_lock = threading.RLock()
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _coerce(value: Any) -> Any:
+    """Store integer/decimal-looking literals as numbers so that aggregates and comparisons work."""
+    if not isinstance(value, str):
+        return value
+    match = NUMBER.fullmatch(value)
+    if match is None:
+        return value
+    if match.group(1) or match.group(2):
+        number = float(value)
+        return number if math.isfinite(number) and repr(number) == value else value
+    number = int(value)
+    low, high = SQLITE_INTEGER_RANGE
+    return number if low <= number <= high and str(number) == value else value
+
+
+def _select_list(columns: List[str], prefix: str = "") -> str:
+    return ", ".join(prefix + _quote(c) for c in columns) or prefix + _quote(EMPTY_COLUMN)
+
+
+def _meta(row: tuple) -> Dict[str, Any]:
+    meta = dict(zip(META_COLUMNS, row))
+    meta["columns"] = json.loads(meta["columns"])
+    return meta
+
+
+def _all_results() -> List[Dict[str, Any]]:
+    rows = _conn.execute(f"SELECT {', '.join(META_COLUMNS)} FROM _workspace_results").fetchall()
+    return [_meta(row) for row in rows]
+
+
+def _get(handle: str) -> Dict[str, Any]:
+    row = _conn.execute(
+        f"SELECT {', '.join(META_COLUMNS)} FROM _workspace_results WHERE handle = ?", (handle,)).fetchone()
+    if row is None:
+        raise KeyError(f"Unknown or expired result handle: {handle}")
+    meta = _meta(row)
+    meta["last_used"] = time.time()
+    _conn.execute("UPDATE _workspace_results SET last_used = ? WHERE handle = ?", (meta["last_used"], handle))
+    _conn.commit()
+    return meta
+
+
+def _check_columns(meta: Dict[str, Any], columns: List[str]) -> None:
+    unknown = [c for c in columns if c not in meta["columns"]]
+    if unknown:
+        raise ValueError(f"Unknown column(s) {unknown} for result {meta['handle']}. Available columns: {meta['columns']}")
+
+
+def _evict() -> None:
+    """
+    Drop expired results, then the least recently used ones beyond WORKSPACE_MAX_BYTES.
+    The most recently used result is kept even if it alone exceeds the limit.
+    """
+    now = time.time()
+    results = _all_results()
+    for meta in [m for m in results if now - m["last_used"] > WORKSPACE_MAX_AGE]:
+        drop_result(meta["handle"])
+        results.remove(meta)
+    total = sum(m["bytes"] for m in results)
+    for meta in sorted(results, key=lambda m: m["last_used"])[:-1]:
+        if total <= WORKSPACE_MAX_BYTES:
+            break
+        total -= meta["bytes"]
+        drop_result(meta["handle"])
+
+
+def store_rows(rows: List[Dict[str, Any]], dbname: str = "", sparql_query: str = "",
+               columns: Optional[List[str]] = None) -> str:
+    """
+    Materialize a list of rows (e.g. the output of `execute_sparql_json`) under a new result handle.
+
+    Args:
+        rows (list): The rows to store. Each row is a dictionary from column names to values.
+        dbname (str): The database the rows came from (kept as metadata).
+        sparql_query (str): The query that produced the rows (kept as metadata).
+        columns (list, optional): Column order. Defaults to the order in which keys first appear.
+
+    Returns:
+        str: The result handle.
+    """
+    if columns is None:
+        columns = []
+        for row in rows:
+            for key in row:
+                if key not in columns:
+                    columns.append(key)
+    handle = "r" + uuid.uuid4().hex[:12]
+    table = _quote(handle)
+    size = 0
+    values = []
+    if columns:
+        for row in rows:
+            record = tuple(_coerce(row.get(c)) for c in columns)
+            size += sum(len(str(v)) for v in record if v is not None)
+            values.append(record)
+    with _lock:
+        # The table and its metadata are created in one transaction, so a failed insert leaves nothing behind.
+        _conn.execute("BEGIN")
+        try:
+            _conn.execute(f"CREATE TABLE {table} ({_select_list(columns)})")
+            if values:
+                placeholders = ", ".join("?" for _ in columns)
+                _conn.executemany(f"INSERT INTO {table} VALUES ({placeholders})", values)
+            now = time.time()
+            _conn.execute(
+                "INSERT INTO _workspace_results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (handle, dbname, sparql_query, json.dumps(columns), len(rows), size, now, now))
+        except BaseException:
+            _conn.rollback()
+            raise
+        _conn.commit()
+        _evict()
+    return handle
+
+
+def drop_result(handle: str) -> bool:
+    """Remove a stored result. Returns False if the handle did not exist."""
+    with _lock:
+        deleted = _conn.execute("DELETE FROM _workspace_results WHERE handle = ?", (handle,)).rowcount
+        if not deleted:
+            _conn.commit()
+            return False
+        _conn.execute(f"DROP TABLE IF EXISTS {_quote(handle)}")
+        _conn.commit()
+    return True
+
+
+def describe_result(handle: str) -> Dict[str, Any]:
+    """Return the metadata of a stored result (columns, row count, size, origin)."""
+    with _lock:
+        meta = _get(handle)
+        return {k: v for k, v in meta.items() if k != "last_used"}
+
+
+def list_results() -> List[Dict[str, Any]]:
+    """Return the metadata of all stored results, most recently used first."""
+    with _lock:
+        _evict()
+        ordered = sorted(_all_results(), key=lambda m: m["last_used"], reverse=True)
+        return [{k: m[k] for k in ("handle", "dbname", "columns", "row_count", "bytes")} for m in ordered]
+
+
+def _where_clause(meta: Dict[str, Any], conditions: Optional[List[Dict[str, Any]]]) -> tuple:
+    if not conditions:
+        return "", []
+    clauses = []
+    params: List[Any] = []
+    for cond in conditions:
+        column = cond.get("column")
+        op = cond.get("op", "=")
+        if op not in FILTER_OPERATORS:
+            raise ValueError(f"Unsupported operator '{op}'. Supported operators are {', '.join(FILTER_OPERATORS)}.")
+        _check_columns(meta, [column])
+        col = _quote(column)
+        value = cond.get("value")
+        if op == "in":
+            values = list(value) if isinstance(value, (list, tuple)) else [value]
+            clauses.append(FILTER_OPERATORS[op].format(col=col, placeholders=", ".join("?" for _ in values)))
+            params.extend(_coerce(v) for v in values)
+        elif op in ("is_null", "not_null"):
+            clauses.append(FILTER_OPERATORS[op].format(col=col))
+        elif op in ("startswith", "endswith"):
+            # The pattern is referenced twice in the expression, so it is bound twice.
+            clauses.append(FILTER_OPERATORS[op].format(col=col))
+            params.extend([str(value), str(value)])
+        elif op == "contains":
+            clauses.append(FILTER_OPERATORS[op].format(col=col))
+            params.append(str(value))
+        else:
+            clauses.append(FILTER_OPERATORS[op].format(col=col))
+            params.append(_coerce(value))
+    return " WHERE " + " AND ".join(clauses), params
+
+
+def _run(sql: str, params: List[Any], save: bool, dbname: str, origin: str) -> Dict[str, Any]:
+    with _lock:
+        cursor = _conn.execute(sql, params)
+        columns = [d[0] for d in cursor.description]
+        rows = [dict(zip(columns, r)) for r in cursor.fetchall()]
+    if columns == [EMPTY_COLUMN]:
+        columns, rows = [], [{} for _ in rows]
+    response: Dict[str, Any] = {"columns": columns, "row_count": len(rows)}
+    if save:
+        response["handle"] = store_rows(rows, dbname=dbname, sparql_query=origin, columns=columns)
+    response["rows"] = rows[:WORKSPACE_MAX_ROWS_RETURNED]
+    response["truncated"] = len(rows) > WORKSPACE_MAX_ROWS_RETURNED
+    return response
+
+
+def _order_limit(meta_columns: List[str], order_by: Optional[List[str]], descending: bool,
+                 limit: Optional[int], offset: int = 0) -> str:
+    sql = ""
+    if order_by:
+        unknown = [c for c in order_by if c not in meta_columns]
+        if unknown:
+            raise ValueError(f"Unknown order_by column(s) {unknown}. Available columns: {meta_columns}")
+        direction = " DESC" if descending else ""
+        sql += " ORDER BY " + ", ".join(_quote(c) + direction for c in order_by)
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"
+        if offset:
+            sql += f" OFFSET {int(offset)}"
+    elif offset:
+        sql += f" LIMIT -1 OFFSET {int(offset)}"
+    return sql
+
+
+def filter_result(handle: str, conditions: Optional[List[Dict[str, Any]]] = None,
+                  columns: Optional[List[str]] = None, distinct: bool = False,
+                  order_by: Optional[List[str]] = None, descending: bool = False,
+                  limit: Optional[int] = 100, offset: int = 0, save: bool = False) -> Dict[str, Any]:
+    """
+    Select rows (and optionally columns) of a stored result.
+
+    Args:
+        handle (str): The result handle.
+        conditions (list, optional): Conditions combined with AND, each `{"column": ..., "op": ..., "value": ...}`.
+        columns (list, optional): Columns to return. Defaults to all columns.
+        distinct (bool): Return only distinct rows.
+        order_by (list, optional): Columns to sort by.
+        descending (bool): Sort in descending order.
+        limit (int, optional): Maximum number of rows (top-k when combined with order_by).
+        offset (int): Number of rows to skip.
+        save (bool): Store the output under a new handle.
+
+    Returns:
+        dict: The selected columns and rows (and the new handle if `save` is set).
+    """
+    with _lock:
+        meta = _get(handle)
+        columns = columns or meta["columns"]
+        _check_columns(meta, columns)
+        where, params = _where_clause(meta, conditions)
+        select = ("SELECT DISTINCT " if distinct else "SELECT ") + _select_list(columns)
+        sql = f"{select} FROM {_quote(handle)}{where}" + _order_limit(meta["columns"], order_by, descending, limit, offset)
+        return _run(sql, params, save, meta["dbname"], f"filter of {handle}")
+
+
+def aggregate_result(handle: str, aggregates: List[str], group_by: Optional[List[str]] = None,
+                     conditions: Optional[List[Dict[str, Any]]] = None, order_by: Optional[List[str]] = None,
+                     descending: bool = True, limit: Optional[int] = 100, save: bool = False) -> Dict[str, Any]:
+    """
+    Group and aggregate a stored result.
+
+    Args:
+        handle (str): The result handle.
+        aggregates (list): Aggregates in the form `"function:column"` (e.g. `"count_distinct:protein"`),
+            or `"count"` for the number of rows. Functions: count, count_distinct, sum, avg, min, max.
+        group_by (list, optional): Columns to group by.
+        conditions (list, optional): Row filters applied before grouping (same form as `filter_result`).
+        order_by (list, optional): Output columns to sort by, e.g. `["count"]`.
+        descending (bool): Sort in descending order (default True, for top-k).
+        limit (int, optional): Maximum number of groups.
+        save (bool): Store the output under a new handle.
+
+    Returns:
+        dict: The grouped rows (and the new handle if `save` is set).
+    """
+    with _lock:
+        meta = _get(handle)
+        group_by = group_by or []
+        _check_columns(meta, group_by)
+        select_exprs = [_quote(c) for c in group_by]
+        output_columns = list(group_by)
+        for spec in aggregates:
+            func, _, column = spec.partition(":")
+            if func not in AGGREGATE_FUNCTIONS:
+                raise ValueError(f"Unsupported aggregate '{func}'. Supported aggregates are {', '.join(AGGREGATE_FUNCTIONS)}.")
+            if column:
+                _check_columns(meta, [column])
+                name = f"{func}_{column}"
+                col = _quote(column)
+            elif func == "count":
+                name, col = "count", "*"
+            else:
+                raise ValueError(f"Aggregate '{func}' requires a column, e.g. '{func}:column'.")
+            select_exprs.append(AGGREGATE_FUNCTIONS[func].format(col=col) + " AS " + _quote(name))
+            output_columns.append(name)
+        if not select_exprs:
+            raise ValueError("At least one aggregate or group_by column is required.")
+        where, params = _where_clause(meta, conditions)
+        sql = f"SELECT {', '.join(select_exprs)} FROM {_quote(handle)}{where}"
+        if group_by:
+            sql += " GROUP BY " + ", ".join(_quote(c) for c in group_by)
+        sql += _order_limit(output_columns, order_by, descending, limit)
+        return _run(sql, params, save, meta["dbname"], f"aggregate of {handle}")
+
+
+def join_results(left: str, right: str, on: List[str], how: str = "inner",
+                 limit: Optional[int] = 100, save: bool = True) -> Dict[str, Any]:
+    """
+    Join two stored results on shared column names.
+
+    Args:
+        left (str): The left result handle.
+        right (str): The right result handle.
+        on (list): Column names present in both results to join on.
+        how (str): "inner" or "left".
+        limit (int, optional): Maximum number of rows to return (the saved result is not limited).
+        save (bool): Store the joined rows under a new handle (default True).
+
+    Returns:
+        dict: The joined rows (and the new handle if `save` is set).
+    """
+    if how not in ("inner", "left"):
+        raise ValueError("Supported join types are 'inner' and 'left'.")
+    with _lock:
+        lmeta, rmeta = _get(left), _get(right)
+        _check_columns(lmeta, on)
+        _check_columns(rmeta, on)
+        select = [_select_list(lmeta["columns"], "l.")]
+        for c in rmeta["columns"]:
+            if c in on:
+                continue
+            alias = c if c not in lmeta["columns"] else f"{c}_right"
+            select.append(f"r.{_quote(c)} AS {_quote(alias)}")
+        condition = " AND ".join(f"l.{_quote(c)} = r.{_quote(c)}" for c in on)
+        sql = (f"SELECT {', '.join(select)} FROM {_quote(left)} AS l "
+               f"{'LEFT ' if how == 'left' else ''}JOIN {_quote(right)} AS r ON {condition}")
+        result = _run(sql, [], save, lmeta["dbname"], f"{how} join of {left} and {right}")
+    if limit is not None:
+        result["truncated"] = result["truncated"] or len(result["rows"]) > limit
+        result["rows"] = result["rows"][:limit]
+    return result
+
+
+def sample_result(handle: str, n: int = 10) -> Dict[str, Any]:
+    """
+    Return a uniform random sample of rows from a stored result.
+
+    Args:
+        handle (str): The result handle.
+        n (int): The number of rows to sample.
+
+    Returns:
+        dict: The sampled rows.
+    """
+    with _lock:
+        meta = _get(handle)
+        sql = f"SELECT * FROM {_quote(handle)} ORDER BY random() LIMIT {int(n)}"
+        return _run(sql, [], False, meta["dbname"], f"sample of {handle}")
@@ -0,0 +1,221 @@
+import asyncio
+import functools
+import heapq
+import itertools
+import time
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import httpx
+from fastmcp.server.middleware import Middleware
+
+# --- Scheduling of outbound requests ---
+# Every request sent through `http_client` waits for a slot of its upstream host. A host
+# admits requests at a token-bucket rate and up to a number of concurrent requests. Waiting
+# requests are served by weighted fair queuing over flows, a flow being a (priority class,
+# client session) pair: interactive calls get the largest share, while batch jobs and
+# background refreshes use the capacity interactive calls leave, and no single session can
+# monopolize a host. As queuing only orders the waiting requests, a share of each host's
+# concurrent slots (INTERACTIVE_RESERVED_SHARE, at least one) is also kept for interactive
+# calls: batch and background requests never hold all slots, so an interactive call does not
+# wait for a long batch query to finish. The priority class and the session are taken from
+# context variables, set with `priority(...)` and by `SessionMiddleware`.
+
+PRIORITY_WEIGHTS = {"interactive": 16, "batch": 4, "background": 1}
+DEFAULT_PRIORITY = "interactive"
+INTERACTIVE_RESERVED_SHARE = 0.25  # of the concurrent slots of a host
+
+# Requests per second, burst and maximum concurrent requests per upstream host.
+HOST_LIMITS: Dict[str, Tuple[float, int, int]] = {
+    "rdfportal.org": (10.0, 20, 8),
+    "ts.glycosmos.org": (5.0, 10, 4),
+    "api.glycosmos.org": (5.0, 10, 4),
+    "query.wikidata.org": (5.0, 10, 4),
+    "www.wikidata.org": (10.0, 20, 8),
+}
+DEFAULT_HOST_LIMITS = (20.0, 40, 16)
+
+_priority: ContextVar[str] = ContextVar("request_priority", default=DEFAULT_PRIORITY)
+_session: ContextVar[str] = ContextVar("request_session", default="")
+
+
+@contextmanager
+def priority(name: str) -> Iterator[None]:
+    """Send the requests made in this block (and in tasks started from it) with the given priority class."""
+    if name not in PRIORITY_WEIGHTS:
+        raise ValueError(f"Unknown priority '{name}'. Supported priorities are {', '.join(PRIORITY_WEIGHTS)}.")
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class HostScheduler:
+    """Token bucket, concurrency limit and weighted fair queue of one upstream host."""
+
+    def __init__(self, rate: float, burst: int, max_concurrent: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.active = 0
+        self.active_other = 0  # batch and background requests being served
+        self.other_limit = max_concurrent - max(1, int(max_concurrent * INTERACTIVE_RESERVED_SHARE))
+        self.virtual_time = 0.0
+        self._finish: Dict[Tuple[str, str], float] = {}
+        self._queue: List[Tuple[float, int, asyncio.Future, str]] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.admitted: Dict[str, int] = {name: 0 for name in PRIORITY_WEIGHTS}
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _admit(self, priority_name: str) -> None:
+        self.tokens -= 1
+        self.active += 1
+        self.active_other += priority_name != "interactive"
+        self.admitted[priority_name] += 1
+
+    def _allowed(self, priority_name: str) -> bool:
+        return priority_name == "interactive" or self.active_other < self.other_limit
+
+    async def acquire(self, priority_name: str, session: str) -> None:
+        self._refill()
+        if (not self._queue and self.active < self.max_concurrent and self.tokens >= 1
+                and self._allowed(priority_name)):
+            self._admit(priority_name)
+            return
+        flow = (priority_name, session)
+        finish = max(self.virtual_time, self._finish.get(flow, 0.0)) + 1.0 / PRIORITY_WEIGHTS[priority_name]
+        self._finish[flow] = finish
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (finish, next(self._seq), future, priority_name))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(priority_name)  # admitted just as the caller gave up
+            raise
+
+    def release(self, priority_name: str) -> None:
+        self.active -= 1
+        self.active_other -= priority_name != "interactive"
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._refill()
+        held = []  # batch and background requests waiting for a slot outside the reserved share
+        while self._queue and self.active < self.max_concurrent and self.tokens >= 1:
+            item = heapq.heappop(self._queue)
+            finish, _, future, priority_name = item
+            if future.done():  # cancelled while waiting
+                continue
+            if not self._allowed(priority_name):
+                held.append(item)
+                continue
+            self.virtual_time = finish
+            self._admit(priority_name)
+            future.set_result(None)
+        for item in held:
+            heapq.heappush(self._queue, item)
+        if len(self._finish) > 1000:
+            self._finish = {flow: f for flow, f in self._finish.items() if f > self.virtual_time}
+        if (self.tokens < 1 and self.active < self.max_concurrent
+                and any(self._allowed(priority_name) for *_, priority_name in self._queue)):
+            # Wait for the next token. (Completed requests dispatch through `release`.)
+            delay = (1 - self.tokens) / self.rate
+            self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+
+_hosts: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, HostScheduler]]" = weakref.WeakKeyDictionary()
+
+
+def host_scheduler(host: str) -> HostScheduler:
+    """The scheduler of an upstream host (one per event loop)."""
+    schedulers = _hosts.setdefault(asyncio.get_running_loop(), {})
+    scheduler = schedulers.get(host)
+    if scheduler is None:
+        limits = next((v for k, v in HOST_LIMITS.items() if host == k or host.endswith("." + k)), DEFAULT_HOST_LIMITS)
+        scheduler = schedulers[host] = HostScheduler(*limits)
+    return scheduler
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that gives the host slot back once it has been read (or closed)."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._release is not None:
+                release, self._release = self._release, None
+                release()
+
+
+class ScheduledTransport(httpx.AsyncBaseTransport):
+    """Transport that holds each request until the scheduler of its host admits it."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        scheduler = host_scheduler(request.url.host)
+        priority_name = _priority.get()
+        await scheduler.acquire(priority_name, _session.get())
+        release = functools.partial(scheduler.release, priority_name)
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        if response.is_closed:  # the body was read by the transport
+            release()
+        else:
+            response.stream = _ReleasingStream(response.stream, release)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class SessionMiddleware(Middleware):
+    """Tags the requests made by a tool call with the MCP session that called it."""
+
+    async def on_call_tool(self, context, call_next):
+        session = ""
+        if context.fastmcp_context is not None:
+            try:
+                session = context.fastmcp_context.session_id or ""
+            except RuntimeError:
+                pass
+        token = _session.set(session)
+        try:
+            return await call_next(context)
+        finally:
+            _session.reset(token)
+
+
+def stats() -> Dict[str, Dict[str, object]]:
+    """Admitted requests per priority class, and current load, per host."""
+    return {host: {"admitted": dict(s.admitted), "active": s.active, "active_batch_background": s.active_other,
+                   "queued": len(s._queue)}
+            for schedulers in _hosts.values() for host, s in schedulers.items()}
@@ -0,0 +1,313 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+import yaml
+
+import http_client
+import scheduler
+from compact_results import IRICompactor
+from id_cache import CACHE_DIR
+
+# --- Schema profiler for drafting MIE files ---
+# Characterizes a database with sampled, LIMIT-bounded queries run concurrently:
+#   1. the most frequent classes among a sample of typed resources, and their instance counts
+#      (counted up to PROFILE_COUNT_LIMIT unless exact counts are asked for);
+#   2. for each class, the predicates used by a sample of its instances, with the share of
+#      instances using them, the maximum number of values per instance, and the value types;
+#   3. a few example instances.
+# Every answered query is appended to a checkpoint, so an interrupted profile can be resumed
+# where it stopped. The checkpoint is deleted once a profile completes without errors, and
+# answers older than PROFILE_CHECKPOINT_MAX_AGE are not reused.
+# The result is a draft MIE skeleton (schema_info, shape_expressions, sample_rdf_entries and
+# data_statistics) for the agent to refine and save with `save_MIE_file`.
+
+PROFILE_DIR = os.path.join(CACHE_DIR, "profiles")
+PROFILE_CONCURRENCY = 4  # concurrent queries per endpoint
+PROFILE_QUERY_TIMEOUT = 60.0
+PROFILE_TYPE_SAMPLE = 100_000  # typed resources sampled to rank the classes
+PROFILE_SAMPLE_SIZE = 1000  # instances sampled per class
+PROFILE_MAX_CLASSES = 25
+PROFILE_SAMPLE_ENTRIES = 5  # classes for which an example instance is included
+PROFILE_ENTRY_TRIPLES = 25
+PROFILE_COUNT_LIMIT = 1_000_000  # instances counted per class; larger classes are reported as ">= N"
+PROFILE_CHECKPOINT_MAX_AGE = 7 * 24 * 3600  # seconds
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+XSD_STRING = "http://www.w3.org/2001/XMLSchema#string"
+
+
+class Checkpoint:
+    """Answers of the profiling queries of one database, appended to a JSONL file as they arrive."""
+
+    def __init__(self, dbname: str, resume: bool = False):
+        self.path = os.path.join(PROFILE_DIR, f"{dbname}.jsonl")
+        self.answers: Dict[str, List[Dict[str, Any]]] = {}
+        if not resume:
+            self.delete()
+            return
+        oldest = time.time() - PROFILE_CHECKPOINT_MAX_AGE
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut off by the interruption
+                    if record.get("time", 0) >= oldest:
+                        self.answers[record["key"]] = record["bindings"]
+        except FileNotFoundError:
+            pass
+        except (OSError, KeyError, AttributeError) as e:
+            print(f"Warning: ignoring profile checkpoint {self.path}: {e}", file=sys.stderr)
+
+    def add(self, key: str, bindings: List[Dict[str, Any]]) -> None:
+        self.answers[key] = bindings
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(json.dumps({"key": key, "time": time.time(), "bindings": bindings}) + "\n")
+        except OSError as e:
+            print(f"Warning: could not save profile checkpoint {self.path}: {e}", file=sys.stderr)
+
+    def delete(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Warning: could not delete profile checkpoint {self.path}: {e}", file=sys.stderr)
+
+
+class Profiler:
+    def __init__(self, endpoint: str, graphs: List[str], checkpoint: Checkpoint,
+                 concurrency: int = PROFILE_CONCURRENCY, timeout: float = PROFILE_QUERY_TIMEOUT):
+        self.endpoint = endpoint
+        self.graphs = graphs
+        self.checkpoint = checkpoint
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.queries = 0
+        self.resumed = 0
+        self.errors: List[str] = []
+
+    def from_clause(self) -> str:
+        return "".join(f"FROM <{g}>\n" for g in self.graphs)
+
+    async def select(self, query: str, label: str) -> Optional[List[Dict[str, Any]]]:
+        """Run a SELECT query (or take its checkpointed answer). Returns None if it failed."""
+        key = hashlib.sha256(f"{self.endpoint}\n{query}".encode("utf-8")).hexdigest()
+        self.queries += 1
+        if key in self.checkpoint.answers:
+            self.resumed += 1
+            return self.checkpoint.answers[key]
+        async with self.semaphore:
+            try:
+                async with http_client.session() as client:
+                    with scheduler.priority("batch"):
+                        response = await client.post(
+                            self.endpoint, data={"query": query},
+                            headers={"Accept": "application/sparql-results+json"}, timeout=self.timeout)
+                response.raise_for_status()
+                bindings = response.json()["results"]["bindings"]
+            except (httpx.HTTPError, ValueError, KeyError) as e:
+                message = str(e).splitlines()[0] if str(e) else ""
+                self.errors.append(f"{label}: {type(e).__name__}: {message}"[:300])
+                return None
+        self.checkpoint.add(key, bindings)
+        return bindings
+
+    async def classes(self, max_classes: int) -> List[str]:
+        query = (f"SELECT ?class (COUNT(?s) AS ?n)\n{self.from_clause()}"
+                 f"WHERE {{ {{ SELECT ?s ?class WHERE {{ ?s a ?class }} LIMIT {PROFILE_TYPE_SAMPLE} }} }}\n"
+                 f"GROUP BY ?class ORDER BY DESC(?n) LIMIT {max_classes}")
+        rows = await self.select(query, "class ranking") or []
+        return [r["class"]["value"] for r in rows if r.get("class", {}).get("type") == "uri"]
+
+    async def count(self, cls: str, limit: Optional[int] = PROFILE_COUNT_LIMIT) -> Optional[int]:
+        """The number of instances of a class, counted up to `limit` (None for an exact count)."""
+        if limit is None:
+            query = f"SELECT (COUNT(?s) AS ?n)\n{self.from_clause()}WHERE {{ ?s a <{cls}> }}"
+        else:
+            query = (f"SELECT (COUNT(?s) AS ?n)\n{self.from_clause()}"
+                     f"WHERE {{ {{ SELECT ?s WHERE {{ ?s a <{cls}> }} LIMIT {limit} }} }}")
+        rows = await self.select(query, f"count of {cls}")
+        return int(rows[0]["n"]["value"]) if rows else None
+
+    async def sampled(self, cls: str, sample_size: int) -> Optional[int]:
+        query = (f"SELECT (COUNT(?s) AS ?n)\n{self.from_clause()}"
+                 f"WHERE {{ {{ SELECT ?s WHERE {{ ?s a <{cls}> }} LIMIT {sample_size} }} }}")
+        rows = await self.select(query, f"sample of {cls}")
+        return int(rows[0]["n"]["value"]) if rows else None
+
+    async def predicates(self, cls: str, sample_size: int) -> Optional[List[Dict[str, Any]]]:
+        query = (
+            "SELECT ?p (COUNT(?s) AS ?subjects) (SUM(?c) AS ?triples) (MAX(?c) AS ?max)"
+            " (SUM(?iris) AS ?iri_objects) (SAMPLE(?ex) AS ?example) (SAMPLE(?dt) AS ?datatype)\n"
+            f"{self.from_clause()}"
+            "WHERE {\n"
+            "  { SELECT ?s ?p (COUNT(?o) AS ?c) (SUM(IF(isIRI(?o), 1, 0)) AS ?iris) (SAMPLE(?o) AS ?ex) (SAMPLE(?d) AS ?dt)\n"
+            "    WHERE {\n"
+            f"      {{ SELECT ?s WHERE {{ ?s a <{cls}> }} LIMIT {sample_size} }}\n"
+            "      ?s ?p ?o .\n"
+            "      BIND(DATATYPE(?o) AS ?d)\n"
+            "    } GROUP BY ?s ?p }\n"
+            "}\n"
+            "GROUP BY ?p ORDER BY DESC(?subjects)")
+        return await self.select(query, f"predicates of {cls}")
+
+    async def example(self, cls: str) -> Optional[Dict[str, Any]]:
+        rows = await self.select(
+            f"SELECT ?s\n{self.from_clause()}WHERE {{ ?s a <{cls}> FILTER(isIRI(?s)) }} LIMIT 1", f"instance of {cls}")
+        if not rows:
+            return None
+        subject = rows[0]["s"]["value"]
+        triples = await self.select(
+            f"SELECT ?p ?o\n{self.from_clause()}WHERE {{ <{subject}> ?p ?o }} LIMIT {PROFILE_ENTRY_TRIPLES}",
+            f"triples of {subject}")
+        return {"subject": subject, "triples": triples or []}
+
+
+def _value(binding: Dict[str, Any], name: str, default: Any = None) -> Any:
+    return binding.get(name, {}).get("value", default)
+
+
+def _term(term: Dict[str, Any], compactor: IRICompactor) -> str:
+    if term.get("type") == "uri":
+        curie = compactor.compact(term["value"])
+        return curie if curie != term["value"] else f"<{term['value']}>"
+    if term.get("type") == "bnode":
+        return "[]"
+    literal = json.dumps(term.get("value", ""), ensure_ascii=False)
+    if term.get("xml:lang"):
+        return f"{literal}@{term['xml:lang']}"
+    datatype = term.get("datatype")
+    if datatype and datatype != XSD_STRING:
+        return f"{literal}^^{_term({'type': 'uri', 'value': datatype}, compactor)}"
+    return literal
+
+
+def _shape(cls: str, rows: List[Dict[str, Any]], sampled: int, compactor: IRICompactor) -> str:
+    label = _term({"type": "uri", "value": cls}, compactor)
+    lines = [f"{label} {{", f"  a [ {label} ] ;"]
+    for row in rows:
+        predicate = _value(row, "p")
+        if predicate == RDF_TYPE:
+            continue
+        subjects, triples = int(_value(row, "subjects", 0)), int(_value(row, "triples", 0))
+        iris, maximum = int(_value(row, "iri_objects", 0)), int(_value(row, "max", 1))
+        if iris == triples:
+            value_type = "IRI"
+        elif iris == 0:
+            datatype = _value(row, "datatype")
+            value_type = _term({"type": "uri", "value": datatype}, compactor) if datatype else "LITERAL"
+        else:
+            value_type = "."
+        required = sampled and subjects >= sampled
+        cardinality = ("+" if maximum > 1 else "") if required else ("*" if maximum > 1 else "?")
+        example = _term(row["example"], compactor) if "example" in row else ""
+        share = f"{subjects / sampled:.0%}" if sampled else f"{subjects}"
+        comment = f"{share} of sampled instances" + (f", e.g. {example[:60]}" if example else "")
+        lines.append(f"  {_term({'type': 'uri', 'value': predicate}, compactor)} {value_type}{cardinality} ;  # {comment}")
+    lines.append("}")
+    return "\n".join(lines)
+
+
+def _count(count: Optional[int], limit: Optional[int]) -> Any:
+    if count is None:
+        return "unknown (count failed)"
+    return f">= {limit}" if limit is not None and count >= limit else count
+
+
+def _entry(cls: str, example: Dict[str, Any], compactor: IRICompactor) -> Dict[str, str]:
+    subject = _term({"type": "uri", "value": example["subject"]}, compactor)
+    statements = [f"{_term(t['p'], compactor)} {_term(t['o'], compactor)}" for t in example["triples"]]
+    rdf = subject + (" " + " ;\n  ".join(statements) + " ." if statements else " .")
+    return {"title": f"Example {_term({'type': 'uri', 'value': cls}, compactor)}",
+            "description": "TODO: describe this example.", "rdf": rdf + "\n"}
+
+
+class _LiteralDumper(yaml.SafeDumper):
+    pass
+
+
+_LiteralDumper.add_representer(
+    str, lambda dumper, data: dumper.represent_scalar("tag:yaml.org,2002:str", data, style="|" if "\n" in data else None))
+
+
+async def profile(dbname: str, endpoint: str, graphs: List[str], namespaces: Dict[str, str],
+                  max_classes: int = PROFILE_MAX_CLASSES, sample_size: int = PROFILE_SAMPLE_SIZE,
+                  resume: bool = False, exact_counts: bool = False) -> Dict[str, Any]:
+    """
+    Profile a database and build a draft MIE skeleton.
+
+    Args:
+        dbname (str): The database name (names the checkpoint).
+        endpoint (str): The SPARQL endpoint.
+        graphs (list): Named graphs to profile. Empty for the endpoint's default graph.
+        namespaces (dict): Namespace-to-prefix table used to write CURIEs.
+        max_classes (int): The number of most frequent classes to profile.
+        sample_size (int): Instances sampled per class.
+        resume (bool): Reuse the answers checkpointed by an earlier, interrupted run (if not
+            older than PROFILE_CHECKPOINT_MAX_AGE). Otherwise the checkpoint is started afresh.
+        exact_counts (bool): Count all instances of each class, instead of up to PROFILE_COUNT_LIMIT.
+            The exact counts of large classes may time out.
+
+    Returns:
+        dict: schema_info, shape_expressions, sample_rdf_entries and data_statistics.
+    """
+    started = time.perf_counter()
+    checkpoint = Checkpoint(dbname, resume)
+    profiler = Profiler(endpoint, graphs, checkpoint)
+    count_limit = None if exact_counts else PROFILE_COUNT_LIMIT
+    classes = await profiler.classes(max_classes)
+
+    async def profile_class(i: int, cls: str) -> Dict[str, Any]:
+        count, sampled, rows, example = await asyncio.gather(
+            profiler.count(cls, count_limit), profiler.sampled(cls, sample_size), profiler.predicates(cls, sample_size),
+            profiler.example(cls) if i < PROFILE_SAMPLE_ENTRIES else asyncio.sleep(0))
+        return {"class": cls, "count": count, "sampled": sampled, "predicates": rows, "example": example}
+
+    profiles = await asyncio.gather(*(profile_class(i, cls) for i, cls in enumerate(classes)))
+
+    compactor = IRICompactor(namespaces)
+    shapes = [_shape(p["class"], p["predicates"], p["sampled"] or 0, compactor) for p in profiles if p["predicates"]]
+    entries = [_entry(p["class"], p["example"], compactor) for p in profiles if p["example"]]
+    counts = {_term({"type": "uri", "value": p["class"]}, compactor): _count(p["count"], count_limit)
+              for p in profiles}
+    if not profiler.errors:
+        checkpoint.delete()
+    prefixes = "".join(f"PREFIX {label}: <{ns}>\n" for label, ns in sorted(compactor.used.items()))
+    today = datetime.date.today().isoformat()
+    return {
+        "schema_info": {
+            "title": f"TODO: title of {dbname}",
+            "description": "TODO: describe the database.",
+            "endpoint": endpoint,
+            "graphs": graphs,
+            "version": {"mie_created": today, "last_tested": today},
+        },
+        "shape_expressions": prefixes + "\n" + "\n\n".join(shapes) + "\n",
+        "sample_rdf_entries": entries,
+        "data_statistics": {
+            "class_instances": counts,
+            "profiling": {
+                "sampled_instances_per_class": sample_size,
+                "instances_counted_up_to": count_limit or "all",
+                "queries": profiler.queries,
+                "resumed_from_checkpoint": profiler.resumed,
+                "failed_queries": profiler.errors,
+                "elapsed_seconds": round(time.perf_counter() - started, 1),
+            },
+        },
+    }
+
+
+def to_yaml(skeleton: Dict[str, Any]) -> str:
+    """Dump a skeleton as YAML, with multi-line strings as literal blocks."""
+    return yaml.dump(skeleton, Dumper=_LiteralDumper, sort_keys=False, allow_unicode=True, width=120)
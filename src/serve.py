@@ -0,0 +1,99 @@
+import argparse
+import asyncio
+import importlib
+import os
+import sys
+import tempfile
+from contextlib import asynccontextmanager
+
+# --- Network deployment of the MCP servers ---
+# `server.py` and `api_tools.py` run on stdio when started directly. This entry point serves
+# either of them over streamable HTTP (or SSE) instead, optionally with several worker
+# processes behind one listening socket:
+#
+#   uv run src/serve.py server --port 8000 --workers 4
+#   uv run src/serve.py api_tools --port 8001
+#   uv run src/serve.py unified --port 8000   (both servers in one app, see `unified.py`)
+#
+# With more than one worker, the workers share the response pages (`result_pager`), the
+# result workspace, the parsed MIE files and the ID-resolution cache through SQLite files
+# in WAL mode under `--shared-dir`, and the HTTP transport is stateless, so that any worker
+# can answer any request. SSE keeps a session per connection and needs a single worker.
+
+APPS = ("server", "api_tools", "unified")
+TRANSPORTS = ("http", "sse", "stdio")
+DEFAULT_SHARED_DIR = os.path.join(tempfile.gettempdir(), "rdfportal-mcp-shared")
+
+
+def create_app():
+    """ASGI application factory run in each worker (configured through environment variables)."""
+    module = importlib.import_module(os.environ["RDFPORTAL_APP"])
+    app = module.mcp.http_app(
+        path=os.environ.get("RDFPORTAL_PATH") or None,
+        transport=os.environ.get("RDFPORTAL_TRANSPORT", "http"),
+        stateless_http=os.environ.get("RDFPORTAL_STATELESS") == "1",
+    )
+    # Run the app's startup hook (e.g. the endpoint probes of `server`) in the worker's event loop.
+    on_startup = getattr(module, "on_startup", None)
+    if on_startup is not None:
+        app_lifespan = app.router.lifespan_context
+
+        @asynccontextmanager
+        async def lifespan(app):
+            on_startup()
+            async with app_lifespan(app) as state:
+                yield state
+
+        app.router.lifespan_context = lifespan
+    return app
+
+
+async def run_stdio(module) -> None:
+    on_startup = getattr(module, "on_startup", None)
+    if on_startup is not None:
+        on_startup()
+    await module.mcp.run_async()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve an RDF Portal MCP server over the network.")
+    parser.add_argument("app", choices=APPS, help="The server to run.")
+    parser.add_argument("--transport", choices=TRANSPORTS, default="http")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--path", default=None, help="URL path of the MCP endpoint (default /mcp, or /sse for SSE).")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes.")
+    parser.add_argument("--shared-dir", default=DEFAULT_SHARED_DIR,
+                        help="Directory of the caches shared by the workers.")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1.")
+    if args.transport == "stdio":
+        if args.workers > 1:
+            parser.error("The stdio transport runs a single process.")
+        asyncio.run(run_stdio(importlib.import_module(args.app)))
+        return
+    if args.transport == "sse" and args.workers > 1:
+        parser.error("The SSE transport keeps per-connection sessions; use --transport http with several workers.")
+
+    os.environ["RDFPORTAL_APP"] = args.app
+    os.environ["RDFPORTAL_TRANSPORT"] = args.transport
+    os.environ["RDFPORTAL_PATH"] = args.path or ""
+    if args.workers > 1:
+        # Set before the workers import any module, as the stores are opened at import time.
+        os.makedirs(args.shared_dir, exist_ok=True)
+        os.environ["RDFPORTAL_SHARED_DIR"] = args.shared_dir
+        os.environ["RDFPORTAL_STATELESS"] = "1"
+
+    import uvicorn
+
+    print(f"Serving {args.app} over {args.transport} on {args.host}:{args.port} with {args.workers} worker(s)",
+          file=sys.stderr)
+    uvicorn.run("serve:create_app", factory=True, host=args.host, port=args.port, workers=args.workers,
+                log_level=args.log_level, lifespan="on")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,33 @@
+import asyncio
 import httpx
 import json
 import os
 import yaml
 import sys
 from fastmcp import FastMCP
-from typing import Annotated, List, Dict, Any
+from typing import Annotated, List, Dict, Any, Union
 from pydantic import Field
 
+import compact_results
+import endpoints
+import http_client
+import link_tables
+import mie_cache
+import named_queries
+import query_stats
+import result_formats
+import result_pager
+import result_summary
+import result_workspace
+import scheduler
+import schema_profiler
+import shex_index
+import subgraph_cache
+
 # Initialize the FastMCP server
 # This is the entry point for the MCP server, which will handle requests and provide tools.
 mcp = FastMCP("RDF Portal MCP Server")
+mcp.add_middleware(scheduler.SessionMiddleware())
 
 @mcp.resource("resource://boilerplate")
 def boilerplate() -> str:
@@ -17,31 +35,17 @@ def boilerplate() -> str:
 
 # --- Constants and Configuration (Consolidated) ---
 # The SPARQL endpoints for various RDF databases. These endpoints are used to query the RDF data.
-# See also: https://github.com/rdfportal/rdfportal.github.io/blob/feature/legacy/info/ep_dataset_graph.tsv
-SPARQL_ENDPOINT = {
-    "uniprot": "https://rdfportal.org/backend/sib/sparql",
-    "pubchem": "https://rdfportal.org/backend/pubchem/sparql",
-    "pdb": "https://rdfportal.org/backend/pdb/sparql",
-    "chembl": "https://rdfportal.org/backend/ebi/sparql",
-    "chebi": "https://rdfportal.org/backend/ebi/sparql",
-    "reactome": "https://rdfportal.org/backend/ebi/sparql",
-    "mesh": "https://rdfportal.org/primary/sparql",
-    "go": "https://rdfportal.org/primary/sparql",
-    "taxonomy": "https://rdfportal.org/primary/sparql",
-    "wikidata": "https://query.wikidata.org/sparql",
-    "mondo": "https://rdfportal.org/primary/sparql",
-    "ddbj": "https://rdfportal.org/ddbj/sparql",
-    "glycosmos": "https://ts.glycosmos.org/sparql",
-    "bacdive": "https://rdfportal.org/primary/sparql",
-    "mediadive": "https://rdfportal.org/primary/sparql",
-    "clinvar": "https://rdfportal.org/ncbi/sparql"
-}
+# They are listed, with their mirrors, in resources/endpoints.yaml, which is reloaded when it
+# changes. SPARQL_ENDPOINT maps each database to the endpoint its queries currently go to
+# (the fastest healthy mirror, see `endpoints`).
+SPARQL_ENDPOINT = endpoints.registry
 
 # The MIE files are used to define the shape expressions for SPARQL queries. 
 MIE_DIR = "mie"
 MIE_PROMPT="resources/MIE_prompt.md"
 RDF_PORTAL_GUIDE="resources/rdf_portal_guide.md"
 SPARQL_EXAMPLES="sparql-examples"
+SHEX_DIR = "shex"
 
 RDF_CONFIG_TEMPLATE="rdf-config/template.yaml"
 
@@ -141,13 +145,59 @@ def save_MIE_file(
     except (IOError, OSError) as e:
         return f"Error: Could not save MIE file for '{dbname}'. Reason: {e}"
 
+@mcp.tool(enabled=True, name="profile_database", description="Profile the classes and predicates of a database with concurrent sampled queries, and return a draft MIE skeleton (shape_expressions, sample_rdf_entries, data_statistics) to refine and save with `save_MIE_file`.")
+async def profile_database(
+    dbname: Annotated[str, Field(description=f"The name of the database to profile. Supported values are {', '.join(SPARQL_ENDPOINT.keys())}.")],
+    graphs: Annotated[List[str], Field(description="Named graphs to profile. Defaults to the graphs listed in the database's MIE file, if any.")] = [],
+    max_classes: Annotated[int, Field(description="The number of most frequent classes to profile.")] = schema_profiler.PROFILE_MAX_CLASSES,
+    sample_size: Annotated[int, Field(description="The number of instances sampled per class.")] = schema_profiler.PROFILE_SAMPLE_SIZE,
+    resume: Annotated[bool, Field(description="Reuse the answers of an earlier, interrupted profile of the database.")] = False,
+    exact_counts: Annotated[bool, Field(description=f"Count all instances of each class instead of up to {schema_profiler.PROFILE_COUNT_LIMIT:,}. May time out on large classes.")] = False
+) -> str:
+    """
+    Profile a database for a new MIE file. The most frequent classes, the predicates of a sample
+    of their instances (with cardinalities and value types) and example instances are found with
+    LIMIT-bounded queries run concurrently. Answers are checkpointed, so a profile that was
+    interrupted can be resumed with `resume=True`.
+
+    Returns:
+        str: The draft MIE skeleton in YAML format.
+    """
+    if dbname not in SPARQL_ENDPOINT:
+        raise ValueError(f"Unknown database: {dbname}")
+    mie_file = os.path.join(MIE_DIR, f"{dbname}.yaml")
+    if not graphs and os.path.exists(mie_file):
+        content = mie_cache.load_yaml(mie_file)
+        if isinstance(content, dict):
+            graphs = (content.get("schema_info") or {}).get("graphs") or []
+    skeleton = await schema_profiler.profile(
+        dbname, SPARQL_ENDPOINT[dbname], list(graphs), compact_results.load_prefix_table(MIE_DIR, SHEX_DIR),
+        max_classes=max_classes, sample_size=sample_size, resume=resume, exact_counts=exact_counts)
+    return result_pager.paginate(schema_profiler.to_yaml(skeleton))
+
 @mcp.tool()
 async def get_sparql_endpoints() -> str:
     """ Get the available SPARQL endpoints for RDF Portal. 
     Returns:
         str: A JSON-formatted string containing the available SPARQL endpoints.
     """
-    return json.dumps(SPARQL_ENDPOINT)
+    return json.dumps(dict(SPARQL_ENDPOINT))
+
+@mcp.tool(
+        enabled=True,
+        name="get_endpoint_health",
+        description="Show the health and probe latency of every SPARQL endpoint and mirror, and the databases each one serves."
+)
+def get_endpoint_health() -> list:
+    """
+    Show the state of the SPARQL endpoints of the registry (resources/endpoints.yaml).
+    Queries go to the healthy mirror with the lowest latency and fail over to the others.
+
+    Returns:
+        list: URL, databases (and those it is only a failover for), health, average probe latency (ms), consecutive failures,
+        age of the last probe (seconds) and last error of each endpoint.
+    """
+    return endpoints.health()
 
 @mcp.tool(enabled=False)
 async def get_void(
@@ -196,7 +246,7 @@ WHERE {{
   ] .
 }}
 """
-    async with httpx.AsyncClient() as client:
+    async with http_client.session() as client:
         response = await client.post(
             "https://plod.dbcls.jp/repositories/RDFPortal_VoID2",
             data={"query": query},
@@ -210,6 +260,39 @@ WHERE {{
     return results
 
 # Making this a @mcp.tool() becomes an error, so we keep it as a function.
+async def execute_sparql_bindings(
+    sparql_query: Annotated[str, Field(description="The SPARQL query to execute")],
+    dbname: Annotated[str, Field(description=f"The name of the database to query. To find the supported databases, use the `get_sparql_endpoints` tool. Supported values are {', '.join(SPARQL_ENDPOINT.keys())}.")],
+    typed: Annotated[bool, Field(description="Whether term types (IRI, literal, datatype, language) are needed.")] = True
+) -> dict:
+    """ Execute a SPARQL query on RDF Portal and return the results as SPARQL JSON bindings.
+    The results are requested in the format that decodes fastest for the endpoint (see `result_formats`).
+    Args:
+        sparql_query (str): The SPARQL query to execute.
+        dbname (str): The name of the database to query. To find the supported databases, use the `get_sparql_endpoints` tool.
+        typed (bool): If False, the term types may be guessed from the values (CSV results).
+    Returns:
+        dict: The result variables ("vars") and the bindings with term types ("bindings").
+    """
+
+    if dbname not in SPARQL_ENDPOINT:
+        raise ValueError(f"Unknown database: {dbname}")
+
+    with query_stats.track(sparql_query, dbname) as call:
+        local = subgraph_cache.answer(sparql_query, dbname, "json")
+        if local is not None:
+            call.source = "local"
+            results = json.loads(local)
+            call.bytes = len(local)
+            call.rows = len(results["results"]["bindings"])
+            return {"vars": results["head"]["vars"], "bindings": results["results"]["bindings"]}
+        async with http_client.session() as client:
+            results = await endpoints.failover(
+                dbname, lambda url: result_formats.fetch_bindings(client, url, sparql_query, typed))
+        call.bytes = results["body_bytes"]
+        call.rows = len(results["bindings"])
+    return {"vars": results["vars"], "bindings": results["bindings"]}
+
 async def execute_sparql_json(
     sparql_query: Annotated[str, Field(description="The SPARQL query to execute")],
     dbname: Annotated[str, Field(description=f"The name of the database to query. To find the supported databases, use the `get_sparql_endpoints` tool. Supported values are {', '.join(SPARQL_ENDPOINT.keys())}.")]
@@ -222,15 +305,7 @@ async def execute_sparql_json(
         dict: The results of the SPARQL query in JSON.
     """
 
-    if dbname not in SPARQL_ENDPOINT:
-        raise ValueError(f"Unknown database: {dbname}")
-
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            SPARQL_ENDPOINT[dbname], data={"query": sparql_query}, headers={"Accept": "application/sparql-results+json"}
-        )
-    response.raise_for_status()
-    bindings = response.json()["results"]["bindings"]
+    bindings = (await execute_sparql_bindings(sparql_query, dbname, typed=False))["bindings"]
     # For an example of "bindings", see:
     # https://rdfportal.org/backend/pdb/sparql?default-graph-uri=&query=PREFIX+PDBo%3A+%3Chttp%3A%2F%2Frdf.wwpdb.org%2Fschema%2Fpdbx-v50.owl%23%3E%0D%0A%0D%0ASELECT+%3Ftype_value+%28COUNT%28%3Fpoly%29+as+%3Fcount%29+WHERE+%7B%0D%0A++%3Fentry+a+PDBo%3Adatablock+.%0D%0A++%3Fentry+PDBo%3Ahas_entity_polyCategory+%3Fpoly_cat+.%0D%0A++%3Fpoly_cat+PDBo%3Ahas_entity_poly+%3Fpoly+.%0D%0A++%3Fpoly+PDBo%3Aentity_poly.type+%3Ftype_value+.%0D%0A%7D+GROUP+BY+%3Ftype_value+ORDER+BY+DESC%28%3Fcount%29&format=application%2Fsparql-results%2Bjson&should-sponge=&timeout=0&signal_void=on
     if not bindings:
@@ -253,13 +328,79 @@ async def execute_sparql(
     if dbname not in SPARQL_ENDPOINT:
         raise ValueError(f"Unknown database: {dbname}")
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            SPARQL_ENDPOINT[dbname], data={"query": sparql_query}, headers={"Accept": "text/csv"}
-        )
-    response.raise_for_status()
+    with query_stats.track(sparql_query, dbname) as call:
+        local = subgraph_cache.answer(sparql_query, dbname, "csv")
+        if local is not None:
+            call.source = "local"
+            text = local.decode("utf-8")
+            call.bytes = len(local)
+            call.rows = max(len(text.splitlines()) - 1, 0)
+            return text
+
+        async def send(url: str) -> httpx.Response:
+            response = await client.post(url, data={"query": sparql_query}, headers={"Accept": "text/csv"})
+            call.bytes = len(response.content)
+            response.raise_for_status()
+            return response
+
+        async with http_client.session() as client:
+            response = await endpoints.failover(dbname, send)
+        call.rows = max(len(response.text.splitlines()) - 1, 0)
     return response.text
 
+async def execute_sparql_summary(
+    sparql_query: Annotated[str, Field(description="The SPARQL query to execute")],
+    dbname: Annotated[str, Field(description=f"The name of the database to query. To find the supported databases, use the `get_sparql_endpoints` tool. Supported values are {', '.join(SPARQL_ENDPOINT.keys())}.")]
+) -> result_summary.ResultSummarizer:
+    """ Execute a SPARQL query on RDF Portal and summarize the results while they are streamed.
+    Args:
+        sparql_query (str): The SPARQL query to execute.
+        dbname (str): The name of the database to query. To find the supported databases, use the `get_sparql_endpoints` tool.
+    Returns:
+        ResultSummarizer: The summary of all rows; the rows themselves are not kept.
+    """
+
+    if dbname not in SPARQL_ENDPOINT:
+        raise ValueError(f"Unknown database: {dbname}")
+
+    with query_stats.track(sparql_query, dbname) as call:
+        local = subgraph_cache.answer(sparql_query, dbname, "tsv")
+        if local is not None:
+            call.source = "local"
+            lines = local.decode("utf-8").splitlines()
+            summarizer = result_summary.ResultSummarizer(lines[0] if lines else "")
+            for line in lines[1:]:
+                summarizer.add_line(line)
+            call.bytes = len(local)
+            call.rows = summarizer.rows
+            return summarizer
+
+        async def send(url: str) -> result_summary.ResultSummarizer:
+            async with client.stream(
+                "POST", url, data={"query": sparql_query}, headers={"Accept": "text/tab-separated-values"}
+            ) as response:
+                response.raise_for_status()
+                lines = response.aiter_lines()
+                summarizer = result_summary.ResultSummarizer(await anext(lines, ""))
+                async for line in lines:
+                    summarizer.add_line(line)
+                call.bytes = response.num_bytes_downloaded
+            return summarizer
+
+        async with http_client.session() as client:
+            summarizer = await endpoints.failover(dbname, send)
+        call.rows = summarizer.rows
+    return summarizer
+
+OUTPUT_FORMAT_DESCRIPTION = (
+    'The result format. "csv" (default) returns the CSV produced by the endpoint. '
+    '"compact_csv" and "compact_tsv" abbreviate IRIs to CURIEs (prefixes listed in "# PREFIX" lines) '
+    'and replace frequently repeated values with "#n" codes (listed in "# DICT" lines). '
+    '"summary" returns only the shape of the result, whatever its size: the row count and, per variable, '
+    'the estimated number of distinct values, the most frequent values, numeric min/max/mean and the share '
+    'of IRIs and literals, plus a few randomly sampled rows.'
+)
+
 @mcp.tool(
         enabled=True,
         name="run_sparql",
@@ -268,6 +409,7 @@ async def execute_sparql(
 async def run_sparql(
     sparql_query: Annotated[str, Field(description="The SPARQL query to execute")],
     dbname: Annotated[str, Field(description=f"The name of the database to query. Supported values are {', '.join(SPARQL_ENDPOINT.keys())}.")],
+    output_format: Annotated[str, Field(description=OUTPUT_FORMAT_DESCRIPTION)] = "csv",
 ) -> str:
     """
     Run a SPARQL query on a specific RDF database. Use `describe_rdf_schema()` to understand the RDF graph structure of the database.
@@ -275,11 +417,354 @@ async def run_sparql(
     Args:
         sparql_query (str): The SPARQL query to execute.
         dbname (str): The name of the database to query. Supported values are {', '.join(SPARQL_ENDPOINT_KEYS)}.
+        output_format (str): "csv" (default), "compact_csv", "compact_tsv" or "summary".
 
     Returns:
-        str: CSV-formatted results of the SPARQL query.
+        str: CSV-formatted results of the SPARQL query, or a YAML summary of them.
     """
-    return await execute_sparql(sparql_query, dbname)
+    if output_format == "csv":
+        return result_pager.paginate(await execute_sparql(sparql_query, dbname))
+    if output_format in ("compact_csv", "compact_tsv"):
+        results = await execute_sparql_bindings(sparql_query, dbname)
+        namespaces = compact_results.load_prefix_table(MIE_DIR, SHEX_DIR)
+        delimiter = "\t" if output_format == "compact_tsv" else ","
+        return result_pager.paginate(
+            compact_results.compact_bindings(results["vars"], results["bindings"], namespaces, delimiter))
+    if output_format == "summary":
+        summarizer = await execute_sparql_summary(sparql_query, dbname)
+        compactor = compact_results.IRICompactor(compact_results.load_prefix_table(MIE_DIR, SHEX_DIR))
+        summary = summarizer.result(compactor.compact)
+        if compactor.used:
+            summary["prefixes"] = {label: namespace for label, namespace in sorted(compactor.used.items())}
+        return yaml.dump(summary, sort_keys=False, allow_unicode=True, width=1000)
+    raise ValueError(f"Unknown output format: {output_format}")
+
+@mcp.tool(
+        enabled=True,
+        name="fetch_more",
+        description="Fetch the next page of a large tool response using the cursor given at the end of the previous page."
+)
+def fetch_more(
+    cursor: Annotated[str, Field(description="The cursor given at the end of the previous page.")]
+) -> str:
+    """
+    Fetch the next page of a large response from `run_sparql`, `get_graph_list` or `get_MIE_file`.
+
+    Returns:
+        str: The next page, followed by the cursor of the page after it if there is one.
+    """
+    try:
+        return result_pager.fetch_page(cursor)
+    except (KeyError, ValueError) as e:
+        return f"Error: {e.args[0]}"
+
+# --- Tools for the library of named queries --- #
+NAMED_QUERY_CONCURRENCY = 4  # queries run at once for a batched parameter list
+
+@mcp.tool(
+        enabled=True,
+        name="list_named_queries",
+        description="List the prepared, tested queries of a database and their typed parameters, to run with `run_named_query`."
+)
+def list_named_queries(
+    dbname: Annotated[str, Field(description=f"The name of the database. Supported values are {', '.join(SPARQL_ENDPOINT.keys())}.")]
+) -> list:
+    """
+    List the named queries compiled from the database's MIE examples and sparql-examples file.
+
+    Returns:
+        list: Name, title, description, source and parameters (type, default, description) of each query.
+    """
+    if dbname not in SPARQL_ENDPOINT:
+        raise ValueError(f"Unknown database: {dbname}")
+    library = named_queries.load_library(MIE_DIR, SPARQL_EXAMPLES, list(SPARQL_ENDPOINT.keys()))
+    return [template.describe() for template in library.get(dbname, {}).values()]
+
+@mcp.tool(
+        enabled=True,
+        name="run_named_query",
+        description="Run a prepared, tested query of a database with typed parameters (accession, taxon, keyword, limit) instead of writing SPARQL."
+)
+async def run_named_query(
+    dbname: Annotated[str, Field(description=f"The name of the database. Supported values are {', '.join(SPARQL_ENDPOINT.keys())}.")],
+    name: Annotated[str, Field(description="The name of the query, from `list_named_queries`.")],
+    params: Annotated[Union[Dict[str, Any], List[Dict[str, Any]]], Field(description='Parameter values, e.g. {"accession": ["P04637"], "limit": 10}. Parameters left out keep the values of the example. A list of such objects runs the query once per object.')] = {}
+) -> str:
+    """
+    Run a named query. Parameter values are validated and substituted safely, and results are
+    cached per query and parameter values.
+
+    Returns:
+        str: CSV-formatted results. For a list of parameter objects, the results of each,
+        preceded by a "# params:" line.
+    """
+    if dbname not in SPARQL_ENDPOINT:
+        raise ValueError(f"Unknown database: {dbname}")
+    library = named_queries.load_library(MIE_DIR, SPARQL_EXAMPLES, list(SPARQL_ENDPOINT.keys()))
+    template = library.get(dbname, {}).get(name)
+    if template is None:
+        return f"Error: Unknown named query '{name}' for {dbname}. Use `list_named_queries` to see the available queries."
+    batch = params if isinstance(params, list) else [params]
+    try:
+        values = [template.normalize(p) for p in batch]
+    except ValueError as e:
+        return f"Error: {e}"
+    semaphore = asyncio.Semaphore(NAMED_QUERY_CONCURRENCY)
+
+    async def run(value: Dict[str, Any]) -> str:
+        key = named_queries.cache_key(template, value)
+        text = named_queries.cached_result(key)
+        if text is None:
+            async with semaphore:
+                parts = [await execute_sparql(query, dbname) for query in template.render(value)]
+            # Chunks of a long accession list: keep the CSV header of the first one only.
+            text = parts[0] + "".join(part.split("\n", 1)[1] if "\n" in part else "" for part in parts[1:])
+            named_queries.cache_result(key, text)
+        return text
+
+    if not isinstance(params, list):
+        return result_pager.paginate(await run(values[0]))
+    results = await asyncio.gather(*(run(value) for value in values), return_exceptions=True)
+    sections = []
+    for value, result in zip(values, results):
+        if isinstance(result, Exception):
+            result = f"Error: {result}"
+        sections.append(f"# params: {json.dumps(value)}\n{result.rstrip()}\n")
+    return result_pager.paginate("".join(sections))
+
+# --- Tools for query statistics --- #
+@mcp.tool(
+        enabled=True,
+        name="get_query_stats",
+        description="Show the SPARQL query shapes (fingerprints) that cost the most, with call counts, latencies, result sizes and error rates."
+)
+def get_query_stats(
+    sort_by: Annotated[str, Field(description=f"The statistic to rank by. Supported values are {', '.join(query_stats.SORT_KEYS)}.")] = "total_seconds",
+    limit: Annotated[int, Field(description="The number of fingerprints to return.")] = 20,
+    dbname: Annotated[str, Field(description="Only show queries on this database. Empty for all databases.")] = ""
+) -> dict:
+    """
+    Show the top offenders among the SPARQL queries sent since the server started.
+    Queries that differ only in literals, VALUES lists and FILTER constants share a fingerprint.
+
+    Returns:
+        dict: The slow-query threshold and, per fingerprint and database, the call count,
+        total, mean, p95 and max latency (seconds), bytes, rows, error rate, hits of the local
+        subgraph cache (not included in the other figures) and normalized query,
+        per endpoint the decode cost and bytes of each result format, and the entities, triples
+        and hits of the local subgraph cache.
+    """
+    return {
+        "slow_query_seconds": query_stats.SLOW_QUERY_SECONDS,
+        "fingerprints": query_stats.top(sort_by, limit, dbname),
+        "result_formats": result_formats.stats(),
+        "subgraph_cache": subgraph_cache.stats(),
+    }
+
+@mcp.tool(
+        enabled=True,
+        name="get_slow_queries",
+        description="Show the full text of recent SPARQL queries that exceeded the slow-query threshold."
+)
+def get_slow_queries(
+    limit: Annotated[int, Field(description="The number of queries to return, newest first.")] = 20,
+    fingerprint: Annotated[str, Field(description="Only show queries with this fingerprint (from `get_query_stats`). Empty for all.")] = ""
+) -> list:
+    """
+    Show recent entries of the slow-query log.
+
+    Returns:
+        list: Time, fingerprint, database, latency, bytes, rows, error and full query text of each slow query.
+    """
+    return query_stats.slow_queries(limit, fingerprint)
+
+# --- Tools for the local cross-reference link tables --- #
+@mcp.tool(
+        enabled=True,
+        name="map_ids",
+        description=f"Translate identifiers between databases ({', '.join(link_tables.NAMESPACES)}) in one or more hops, locally from prebuilt cross-reference tables, instead of running SPARQL per hop."
+)
+def map_ids(
+    ids: Annotated[List[str], Field(description='Identifiers in the first namespace of the path, as accessions, CURIEs or IRIs, e.g. ["P04637", "P38398"].')],
+    path: Annotated[List[str], Field(description=f'The namespaces to translate through, e.g. ["uniprot", "pdb"] or ["chembl_target", "uniprot", "reactome"]. Namespaces without a direct link set between them are joined by the shortest route. Supported namespaces are {", ".join(link_tables.NAMESPACES)}.')]
+) -> dict:
+    """
+    Translate identifiers with the local link tables (see `list_link_tables`).
+
+    Returns:
+        dict: The full route, the link sets used (and those older than their database's update
+        frequency), and for each input identifier the identifiers it maps to in the last namespace.
+    """
+    return link_tables.map_ids(ids, path, MIE_DIR)
+
+@mcp.tool(
+        enabled=True,
+        name="list_link_tables",
+        description="List the local cross-reference link tables used by `map_ids`, with their namespaces, size, build time and freshness."
+)
+def list_link_tables() -> list:
+    """
+    List the link sets and the state of their tables. Tables are built and refreshed with
+    `uv run script/build_link_tables.py`.
+
+    Returns:
+        list: Name, source and target namespaces, relation, database, MIE cross-reference
+        pattern, update frequency, build time, number of links and staleness of each link set.
+    """
+    return link_tables.status(MIE_DIR)
+
+# --- Tools for the local subgraph cache --- #
+@mcp.tool(
+        enabled=True,
+        name="describe_entity",
+        description="Show all triples about an entity and about the nodes it points to, as Turtle. The neighborhood is cached locally, so follow-up SELECT queries about the entity are answered in milliseconds."
+)
+async def describe_entity(
+    dbname: Annotated[str, Field(description=f"The name of the database to query. Supported values are {', '.join(SPARQL_ENDPOINT.keys())}.")],
+    iri: Annotated[str, Field(description="The full IRI of the entity, e.g. http://purl.uniprot.org/uniprot/P04637.")]
+) -> str:
+    """
+    Fetch the neighborhood of an entity into the local subgraph cache (see `subgraph_cache`),
+    or read it from there.
+
+    Returns:
+        str: The triples of the entity and of its IRI and blank-node objects in Turtle, or an error message.
+    """
+    if dbname not in SPARQL_ENDPOINT:
+        return f"Error: Unknown database: {dbname}"
+    if not subgraph_cache.available():
+        return "Error: describe_entity needs pyoxigraph. Install it with `uv sync --extra subgraph`."
+    iri = iri.strip().removeprefix("<").removesuffix(">")
+    try:
+        return await subgraph_cache.describe(dbname, iri, compact_results.load_prefix_table(MIE_DIR, SHEX_DIR))
+    except (httpx.HTTPError, ValueError) as e:
+        return f"Error: {e}"
+
+# --- Tools for the local result workspace --- #
+CONDITIONS_DESCRIPTION = (
+    'Row filters combined with AND, each of the form {"column": "name", "op": "=", "value": "..."}. '
+    f"Supported operators are {', '.join(result_workspace.FILTER_OPERATORS.keys())}."
+)
+
+@mcp.tool(
+        enabled=True,
+        name="run_sparql_to_workspace",
+        description="Run a SPARQL query and keep the results in a local workspace for follow-up filtering, aggregation, joins and sampling."
+)
+async def run_sparql_to_workspace(
+    sparql_query: Annotated[str, Field(description="The SPARQL query to execute")],
+    dbname: Annotated[str, Field(description=f"The name of the database to query. Supported values are {', '.join(SPARQL_ENDPOINT.keys())}.")],
+    preview: Annotated[int, Field(description="The number of rows to include in the response.")] = 5
+) -> dict:
+    """
+    Run a SPARQL query once and store the results locally under a result handle.
+    Use the `workspace_*` tools with the handle instead of re-running similar queries remotely.
+
+    Returns:
+        dict: The result handle, column names, row count and the first `preview` rows.
+    """
+    results = await execute_sparql_bindings(sparql_query, dbname, typed=False)
+    rows = [{key: binding[key]["value"] for key in binding} for binding in results["bindings"]]
+    handle = result_workspace.store_rows(rows, dbname=dbname, sparql_query=sparql_query, columns=results["vars"])
+    info = result_workspace.describe_result(handle)
+    return {
+        "handle": handle,
+        "columns": info["columns"],
+        "row_count": info["row_count"],
+        "preview": rows[:preview],
+    }
+
+@mcp.tool(enabled=True, name="workspace_list", description="List the results stored in the local workspace.")
+def workspace_list() -> list:
+    """
+    List the results stored in the local workspace.
+
+    Returns:
+        list: Handle, database, columns, row count and size of each stored result.
+    """
+    return result_workspace.list_results()
+
+@mcp.tool(enabled=True, name="workspace_filter", description="Filter, project, sort (top-k) and page a stored result locally.")
+def workspace_filter(
+    handle: Annotated[str, Field(description="The result handle returned by `run_sparql_to_workspace`.")],
+    conditions: Annotated[List[Dict[str, Any]], Field(description=CONDITIONS_DESCRIPTION)] = [],
+    columns: Annotated[List[str], Field(description="Columns to return. Empty for all columns.")] = [],
+    distinct: Annotated[bool, Field(description="Return only distinct rows.")] = False,
+    order_by: Annotated[List[str], Field(description="Columns to sort by.")] = [],
+    descending: Annotated[bool, Field(description="Sort in descending order.")] = False,
+    limit: Annotated[int, Field(description="The maximum number of rows to return.")] = 100,
+    offset: Annotated[int, Field(description="The number of rows to skip.")] = 0,
+    save: Annotated[bool, Field(description="Store the output under a new handle.")] = False
+) -> dict:
+    """
+    Filter, project, sort and page a stored result without contacting the SPARQL endpoint.
+
+    Returns:
+        dict: The selected columns and rows (and the new handle if `save` is set).
+    """
+    return result_workspace.filter_result(handle, conditions, columns, distinct, order_by, descending, limit, offset, save)
+
+@mcp.tool(enabled=True, name="workspace_aggregate", description="Group and aggregate (count, count_distinct, sum, avg, min, max) a stored result locally.")
+def workspace_aggregate(
+    handle: Annotated[str, Field(description="The result handle returned by `run_sparql_to_workspace`.")],
+    aggregates: Annotated[List[str], Field(description='Aggregates of the form "function:column" (e.g. "count_distinct:protein"), or "count" for the number of rows.')],
+    group_by: Annotated[List[str], Field(description="Columns to group by.")] = [],
+    conditions: Annotated[List[Dict[str, Any]], Field(description=CONDITIONS_DESCRIPTION)] = [],
+    order_by: Annotated[List[str], Field(description='Output columns to sort by, e.g. ["count"].')] = [],
+    descending: Annotated[bool, Field(description="Sort in descending order.")] = True,
+    limit: Annotated[int, Field(description="The maximum number of groups to return.")] = 100,
+    save: Annotated[bool, Field(description="Store the output under a new handle.")] = False
+) -> dict:
+    """
+    Group and aggregate a stored result without contacting the SPARQL endpoint.
+
+    Returns:
+        dict: The grouped rows (and the new handle if `save` is set).
+    """
+    return result_workspace.aggregate_result(handle, aggregates, group_by, conditions, order_by, descending, limit, save)
+
+@mcp.tool(enabled=True, name="workspace_join", description="Join two stored results on shared columns locally.")
+def workspace_join(
+    left: Annotated[str, Field(description="The left result handle.")],
+    right: Annotated[str, Field(description="The right result handle.")],
+    on: Annotated[List[str], Field(description="Column names present in both results to join on.")],
+    how: Annotated[str, Field(description='The join type: "inner" or "left".')] = "inner",
+    limit: Annotated[int, Field(description="The maximum number of rows to return.")] = 100
+) -> dict:
+    """
+    Join two stored results on shared columns. The joined rows are stored under a new handle.
+
+    Returns:
+        dict: The new handle, the columns and the first `limit` joined rows.
+    """
+    return result_workspace.join_results(left, right, on, how, limit)
+
+@mcp.tool(enabled=True, name="workspace_sample", description="Return a random sample of rows from a stored result.")
+def workspace_sample(
+    handle: Annotated[str, Field(description="The result handle returned by `run_sparql_to_workspace`.")],
+    n: Annotated[int, Field(description="The number of rows to sample.")] = 10
+) -> dict:
+    """
+    Return a uniform random sample of rows from a stored result.
+
+    Returns:
+        dict: The sampled rows.
+    """
+    return result_workspace.sample_result(handle, n)
+
+@mcp.tool(enabled=True, name="workspace_drop", description="Remove a stored result from the local workspace.")
+def workspace_drop(
+    handle: Annotated[str, Field(description="The result handle to remove.")]
+) -> str:
+    """
+    Remove a stored result from the local workspace.
+
+    Returns:
+        str: A confirmation message.
+    """
+    if result_workspace.drop_result(handle):
+        return f"Removed result {handle}."
+    return f"Error: Unknown or expired result handle: {handle}"
 
 # --- Tools for exploring RDF databases ---
 @mcp.tool(
@@ -370,30 +855,46 @@ SELECT DISTINCT ?graph WHERE {
     ?s ?p ?o .
   }
 }'''
-    return await execute_sparql(sparql_query, dbname)
+    return result_pager.paginate(await execute_sparql(sparql_query, dbname))
 
 @mcp.tool(enabled=True)
 async def get_shex(
-    dbname: Annotated[str, Field(description=f"database name. Supported values are {', '.join(SPARQL_ENDPOINT.keys())}.")]
+    dbname: Annotated[str, Field(description=f"database name. Supported values are {', '.join(SPARQL_ENDPOINT.keys())}.")],
+    shapes: Annotated[List[str], Field(description='Return only these shapes, given as shape labels (e.g. "MoleculeShape") or classes (e.g. "cco:SmallMolecule").')] = [],
+    predicates: Annotated[List[str], Field(description='Return only the shapes using these predicates, given as CURIEs, IRIs or local names (e.g. "hasActivity").')] = [],
+    depth: Annotated[int, Field(description="Levels of shapes referenced by the selected shapes to include: 0 for none, 1 for direct references, -1 for all.")] = 1,
+    outline: Annotated[bool, Field(description="Return only one line per shape (label, classes, number of predicates, referenced shapes).")] = False
 ) -> str:
     """
-    Get the ShEx schema for a specific RDF database.
+    Get the ShEx schema for a specific RDF database, or the selected shapes of it.
+    The schemas are parsed once into a shape index, so selections are served from memory.
 
     Args:
         dbname(str): The name of the database for which to retrieve the ShEx schema. Supported values are {', '.join(SPARQL_ENDPOINT.keys())}.
+        shapes (list): Shape labels or classes to select.
+        predicates (list): Predicates to select the shapes using them.
+        depth (int): Levels of referenced shapes to include with the selected shapes.
+        outline (bool): Return the list of shapes instead of the schema.
 
     Returns:
-        str: The ShEx schema in ShEx format.
+        str: The ShEx schema (or the selected shapes with the PREFIX declarations they use) in ShEx format.
     """
-    shex_file = "shex/" + dbname + ".shex"
+    shex_file = os.path.join(SHEX_DIR, dbname + ".shex")
     if not os.path.exists(shex_file):
         return f"Error: The shex file for '{dbname}' was not found."
     try:
-        with open(shex_file, "r", encoding="utf-8") as file:
-            content = file.read()
-            return content
+        index = shex_index.load_index(shex_file)
     except Exception as e:
         return f"Error reading shex file for '{dbname}': {e}"
+    if outline:
+        return shex_index.outline(index)
+    if not shapes and not predicates:
+        return index["text"]
+    selected = shex_index.select(index, shapes, predicates, depth)
+    if not selected:
+        return (f"Error: No shape in the ShEx schema of '{dbname}' matches the selectors. "
+                f"The shapes are:\n{shex_index.outline(index)}")
+    return shex_index.render(index, selected)
 
 @mcp.tool(
         enabled=True,
@@ -419,21 +920,20 @@ async def get_MIE_file(
     if not os.path.exists(mie_file):
         return f"Error: The MIE file for '{dbname}' was not found."
     try:
-        with open(mie_file, "r", encoding="utf-8") as file:
-            content = yaml.safe_load(file)
-            content2 = {}
-            if isinstance(content, dict):
-                for key, value in content.items():
-                    if key not in drop_keys:
-                        content2[key] = value
-                yaml_dump = yaml.dump(content2, sort_keys=False)
-            else:
-                # If not a dictionary, just dump the original content
-                yaml_dump = yaml.dump(content, sort_keys=False)
-            
-            response_text = f"""Content-type: application/yaml; charset=utf-8
+        content = mie_cache.load_yaml(mie_file)
+        content2 = {}
+        if isinstance(content, dict):
+            for key, value in content.items():
+                if key not in drop_keys:
+                    content2[key] = value
+            yaml_dump = yaml.dump(content2, sort_keys=False)
+        else:
+            # If not a dictionary, just dump the original content
+            yaml_dump = yaml.dump(content, sort_keys=False)
+
+        response_text = f"""Content-type: application/yaml; charset=utf-8
 {yaml_dump}"""
-            return response_text
+        return result_pager.paginate(response_text)
     except Exception as e:
         return f"Error reading MIE file for '{dbname}': {e}"
 
@@ -461,8 +961,7 @@ def list_databases() -> List[Dict[str, Any]]:
         print(f"##### Processing file: {filename}", file=sys.stderr)
         file_path = os.path.join(resources_dir, filename)
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = yaml.safe_load(f)
+            data = mie_cache.load_yaml(file_path)
             if not isinstance(data, dict):
                 raise yaml.YAMLError("YAML file is not a dictionary.")
             
@@ -521,5 +1020,17 @@ def get_sparql_example(
     except Exception as e:
         return f"Error reading SPARQL example file for '{dbname}': {e}"
 
+def on_startup() -> None:
+    """
+    Start probing the SPARQL endpoints, which also opens the connections to them (see `serve.py`),
+    and fetch the MIE sample entities into the subgraph cache.
+    """
+    endpoints.ensure_probing()
+    subgraph_cache.warm(MIE_DIR, SHEX_DIR)
+
+async def main() -> None:
+    on_startup()
+    await mcp.run_async()
+
 if __name__ == "__main__":
-    mcp.run()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
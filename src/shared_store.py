@@ -0,0 +1,133 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# --- Cache store shared between server worker processes ---
+# A small key-value store with per-namespace byte caps (least recently used entries are
+# evicted first) and optional TTLs. By default it lives in process memory. When
+# RDFPORTAL_SHARED_DIR is set (as `serve.py` does for multi-worker deployments), it is a
+# SQLite database in WAL mode in that directory, so every worker sees the same entries.
+
+SHARED_DIR = os.environ.get("RDFPORTAL_SHARED_DIR", "")
+SHARED_STORE_FILE = os.path.join(SHARED_DIR, "shared_store.sqlite") if SHARED_DIR else ""
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+_limits: Dict[str, int] = {}
+
+
+def configure(namespace: str, max_bytes: int) -> None:
+    """Set the byte cap of a namespace."""
+    _limits[namespace] = max_bytes
+
+
+class MemoryStore:
+    def __init__(self):
+        self._data: "OrderedDict[Tuple[str, str], Tuple[bytes, float]]" = OrderedDict()
+        self._bytes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get((namespace, key))
+            if entry is None:
+                return None
+            if entry[1] and entry[1] <= time.time():
+                self._remove((namespace, key))
+                return None
+            self._data.move_to_end((namespace, key))
+            return entry[0]
+
+    def put(self, namespace: str, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._remove((namespace, key))
+            self._data[(namespace, key)] = (value, time.time() + ttl if ttl else 0.0)
+            self._bytes[namespace] = self._bytes.get(namespace, 0) + len(value)
+            limit = _limits.get(namespace, DEFAULT_MAX_BYTES)
+            for entry_key in list(self._data):
+                if self._bytes[namespace] <= limit:
+                    break
+                if entry_key[0] == namespace and entry_key != (namespace, key):
+                    self._remove(entry_key)
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._remove((namespace, key))
+
+    def _remove(self, entry_key: Tuple[str, str]) -> None:
+        entry = self._data.pop(entry_key, None)
+        if entry is not None:
+            self._bytes[entry_key[0]] -= len(entry[0])
+
+
+class SQLiteStore:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL,"
+            " size INTEGER NOT NULL, expires REAL NOT NULL, last_access REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS kv_lru ON kv (namespace, last_access)")
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires FROM kv WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()
+            if row is None:
+                return None
+            if row[1] and row[1] <= now:
+                self._conn.execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+                return None
+            self._conn.execute(
+                "UPDATE kv SET last_access = ? WHERE namespace = ? AND key = ?", (now, namespace, key))
+            return bytes(row[0])
+
+    def put(self, namespace: str, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        limit = _limits.get(namespace, DEFAULT_MAX_BYTES)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO kv VALUES (?, ?, ?, ?, ?, ?)",
+                    (namespace, key, value, len(value), now + ttl if ttl else 0.0, now))
+                total = self._conn.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM kv WHERE namespace = ?", (namespace,)).fetchone()[0]
+                if total > limit:
+                    rows = self._conn.execute(
+                        "SELECT key, size FROM kv WHERE namespace = ? AND key != ? ORDER BY last_access",
+                        (namespace, key)).fetchall()
+                    for old_key, size in rows:
+                        if total <= limit:
+                            break
+                        self._conn.execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, old_key))
+                        total -= size
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+
+
+store = SQLiteStore(SHARED_STORE_FILE) if SHARED_STORE_FILE else MemoryStore()
+
+
+def get_text(namespace: str, key: str) -> Optional[str]:
+    value = store.get(namespace, key)
+    return None if value is None else value.decode("utf-8")
+
+
+def put_text(namespace: str, key: str, value: str, ttl: Optional[float] = None) -> None:
+    store.put(namespace, key, value.encode("utf-8"), ttl)
@@ -0,0 +1,159 @@
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# --- Shape index of the ShEx schemas ---
+# Each shex/<db>.shex file is parsed once into its PREFIX declarations and shapes. For each
+# shape the index records its classes (`a [ ... ]`), its triple constraints (predicate,
+# value type, cardinality) and the shapes it references (`@<Shape>`), so `get_shex` can
+# return just the shapes asked for and the shapes they depend on. Files are parsed again
+# when they change on disk.
+
+PREFIX_LINE = re.compile(r"^\s*PREFIX\s+([\w.-]*):\s*<([^>]*)>", re.IGNORECASE)
+SHAPE_START = re.compile(r"^(<[^>]+>|[\w.-]*:[\w.-]*)\s+(?:(?:EXTRA|CLOSED)\b[^{]*)?\{\s*(#.*)?$")
+SHAPE_REFERENCE = re.compile(r"@(<[^>]+>|[\w.-]*:[\w.-]*)")
+TYPE_CONSTRAINT = re.compile(r"^(?:a|rdf:type)\s+\[([^\]]*)\]")
+TRIPLE_CONSTRAINT = re.compile(r"^(\S+)\s+(.*?)\s*([*+?]|\{[\d,\s]*\})?\s*;?\s*$")
+COMMENT = re.compile(r"#(?![^<]*>).*$")  # a comment, unless the # is inside an IRI
+PREFIXED_NAME = re.compile(r"(?<![\w<@/#])([A-Za-z][\w.-]*):")
+
+_indexes: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+_lock = threading.Lock()
+
+
+def parse(text: str) -> Dict[str, Any]:
+    """
+    Parse a ShEx schema in the compact syntax used by the shex/ files.
+
+    Returns:
+        dict: `prefixes` (label to namespace) and `shapes` (label to a dict with `text`,
+        `classes`, `predicates` and `references`), in file order.
+    """
+    prefixes: Dict[str, str] = {}
+    shapes: Dict[str, Dict[str, Any]] = {}
+    current: Optional[Dict[str, Any]] = None
+    for line in text.splitlines():
+        if current is None:
+            start = SHAPE_START.match(line)
+            if start:
+                current = {"label": start.group(1), "lines": [line], "classes": [], "predicates": [], "references": []}
+                continue
+            prefix = PREFIX_LINE.match(line)
+            if prefix:
+                prefixes[prefix.group(1)] = prefix.group(2)
+            continue
+        current["lines"].append(line)
+        body = COMMENT.sub("", line).strip()
+        if line.startswith("}"):
+            current["text"] = "\n".join(current.pop("lines"))
+            shapes[current["label"]] = current
+            current = None
+            continue
+        if not body:
+            continue
+        for ref in SHAPE_REFERENCE.findall(body):
+            if ref not in current["references"] and ref != current["label"]:
+                current["references"].append(ref)
+        types = TYPE_CONSTRAINT.match(body)
+        if types:
+            current["classes"].extend(types.group(1).split())
+            continue
+        constraint = TRIPLE_CONSTRAINT.match(body)
+        if constraint and (":" in constraint.group(1) or constraint.group(1).startswith("<")):
+            current["predicates"].append({
+                "predicate": constraint.group(1),
+                "value": constraint.group(2),
+                "cardinality": constraint.group(3) or "",
+            })
+    if current is not None:  # unterminated last shape
+        current["text"] = "\n".join(current.pop("lines"))
+        shapes[current["label"]] = current
+    return {"prefixes": prefixes, "shapes": shapes}
+
+
+def load_index(path: str) -> Dict[str, Any]:
+    """Return the index of a ShEx file, parsing it only if it changed since it was last parsed."""
+    stat = os.stat(path)
+    version = (stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        cached = _indexes.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with open(path, "r", encoding="utf-8") as file:
+        text = file.read()
+    index = parse(text)
+    index["text"] = text
+    with _lock:
+        _indexes[path] = (version, index)
+    return index
+
+
+def _normalize(selector: str) -> str:
+    return selector.strip().strip("<>").lower()
+
+
+def _expand(name: str, prefixes: Dict[str, str]) -> str:
+    label, sep, local = name.partition(":")
+    if sep and label in prefixes and not name.startswith("<"):
+        return prefixes[label] + local
+    return name.strip("<>")
+
+
+def _matches(selector: str, name: str, prefixes: Dict[str, str]) -> bool:
+    """A selector matches a label, CURIE or IRI exactly, or the local name of a CURIE or IRI."""
+    wanted = _normalize(selector)
+    candidates = {_normalize(name), _expand(name, prefixes).lower()}
+    local = re.split(r"[:/#]", name.strip("<>"))[-1].lower()
+    return wanted in candidates or wanted == local
+
+
+def select(index: Dict[str, Any], shapes: Optional[List[str]] = None, predicates: Optional[List[str]] = None,
+           depth: int = 1) -> List[str]:
+    """
+    Labels of the shapes matching the selectors, followed by the shapes they reference.
+
+    Args:
+        shapes (list, optional): Shape labels (e.g. `MoleculeShape`) or classes (e.g. `cco:SmallMolecule`).
+        predicates (list, optional): Predicates as CURIEs, IRIs or local names (e.g. `hasActivity`).
+        depth (int): Levels of references to follow: 0 for none, 1 for the shapes referenced
+            directly, and a negative number for all shapes reachable through references.
+    """
+    prefixes = index["prefixes"]
+    selected: List[str] = []
+    for label, shape in index["shapes"].items():
+        if any(_matches(s, label, prefixes) or any(_matches(s, c, prefixes) for c in shape["classes"])
+               for s in shapes or []):
+            selected.append(label)
+        elif any(_matches(p, c["predicate"], prefixes) for p in predicates or [] for c in shape["predicates"]):
+            selected.append(label)
+    level = list(selected)
+    while level and depth != 0:
+        depth -= 1
+        next_level = []
+        for label in level:
+            for ref in index["shapes"][label]["references"]:
+                if ref in index["shapes"] and ref not in selected:
+                    selected.append(ref)
+                    next_level.append(ref)
+        level = next_level
+    return selected
+
+
+def render(index: Dict[str, Any], labels: List[str]) -> str:
+    """The PREFIX declarations used by the given shapes, followed by the shapes."""
+    texts = [index["shapes"][label]["text"] for label in labels]
+    used = set(PREFIXED_NAME.findall("\n".join(texts)))
+    prefixes = [f"PREFIX {label}: <{ns}>" for label, ns in index["prefixes"].items() if label in used]
+    return "\n".join(prefixes + texts) + "\n"
+
+
+def outline(index: Dict[str, Any]) -> str:
+    """One line per shape: label, classes and referenced shapes."""
+    lines = []
+    for label, shape in index["shapes"].items():
+        line = f"{label} [{' '.join(shape['classes'])}] {len(shape['predicates'])} predicates"
+        if shape["references"]:
+            line += " -> " + " ".join(shape["references"])
+        lines.append(line)
+    return "\n".join(lines)
@@ -0,0 +1,304 @@
+import asyncio
+import itertools
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import httpx
+import yaml
+
+import http_client
+import id_cache
+import image_cache
+from batching import SingleFlight
+
+# --- Declarative GlyCosmos SPARQList driver ---
+# The SPARQList APIs are described in resources/glycosmos_sparqlist_natural_lang_mapping.yml
+# and the ways their outputs feed each other in resources/glycosmos_spaqrlist_chaining_mapping.yml.
+# `call_sparqlist` calls any described API (with caching); identical concurrent calls (same
+# API and parameters, defaults filled in) share one request through `SingleFlight`, which
+# is the coalescing the per-ID tools (`uniprot_aa_seq`, `gtcId2Seq`, ...) had from
+# `batching.coalesce` before they were written on it. `run_chain` runs a chain as a
+# pipelined DAG: every call of a step starts the dependent calls as soon as it returns, and
+# the fan-out of each step runs concurrently. Images (`gtc_image`) are kept in `image_cache`
+# rather than the answer cache, and chains return references to them.
+
+SPARQLIST_MAPPING = "resources/glycosmos_sparqlist_natural_lang_mapping.yml"
+SPARQLIST_CHAINS = "resources/glycosmos_spaqrlist_chaining_mapping.yml"
+SPARQLIST_CONCURRENCY = 8
+
+# Chain variables that are produced under a different field name by the current APIs.
+# glytoucan_id_to_epitope_id still returns `motif_id` (see the TODO in the chain mapping).
+FIELD_ALIASES = {"epitope_id": "motif_id"}
+
+SAME_AS_PATTERN = re.compile(r"^same_as\((\w+)\)$")
+
+_flight = SingleFlight()
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+@lru_cache(maxsize=1)
+def load_apis(path: str = SPARQLIST_MAPPING) -> Dict[str, Dict[str, Any]]:
+    """Load the SPARQList API descriptions, keyed by `api_name`."""
+    with open(path, "r", encoding="utf-8") as file:
+        data = yaml.safe_load(file)
+    return {api["api_name"]: api for api in data.get("apis", [])}
+
+
+@lru_cache(maxsize=1)
+def load_chains(path: str = SPARQLIST_CHAINS) -> Dict[str, Dict[str, Any]]:
+    """Load the SPARQList chain descriptions, keyed by `chain_name`."""
+    with open(path, "r", encoding="utf-8") as file:
+        data = yaml.safe_load(file)
+    return {chain["chain_name"]: chain for chain in data.get("chains", [])}
+
+
+def describe_apis() -> str:
+    """One line per API: name, parameters and title."""
+    lines = []
+    for name, api in load_apis().items():
+        params = ", ".join(
+            p["name"] + ("" if p.get("required") else "?") for p in api.get("parameters", []))
+        lines.append(f"{name}({params}): {api.get('title', '')}")
+    return "\n".join(lines)
+
+
+def describe_chains() -> str:
+    """One line per chain: name and the APIs it calls."""
+    return "\n".join(
+        f"{name}: " + " -> ".join(step["api"] for step in chain.get("steps", []))
+        for name, chain in load_chains().items())
+
+
+def _bind_params(api: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, str]:
+    declared = {p["name"]: p for p in api.get("parameters", [])}
+    unknown = [k for k in params if k not in declared]
+    if unknown:
+        raise ValueError(f"Unknown parameter(s) {unknown} for {api['api_name']}. Parameters are {list(declared)}.")
+    bound = {}
+    for name, spec in declared.items():
+        if params.get(name) not in (None, ""):
+            bound[name] = str(params[name])
+        elif "default" in spec:
+            bound[name] = str(spec["default"])
+        elif spec.get("required"):
+            raise ValueError(f"Missing required parameter '{name}' for {api['api_name']}.")
+    return bound
+
+
+async def call_sparqlist(api_name: str, params: Dict[str, Any], as_text: bool = False, cache: bool = True) -> Any:
+    """
+    Call a GlyCosmos SPARQList API described in the mapping file.
+    Answers are cached (see `id_cache`) and identical concurrent calls share one request.
+
+    Args:
+        api_name (str): The `api_name` in the mapping file.
+        params (dict): The query parameters. Defaults from the mapping file are filled in.
+        as_text (bool): Return the response body as text instead of parsed JSON.
+        cache (bool): Use the answer cache. Callers with their own cache (e.g. images) turn it off.
+
+    Returns:
+        The parsed JSON response (or the text if `as_text` is set).
+    """
+    global _semaphore
+    apis = load_apis()
+    if api_name not in apis:
+        raise ValueError(f"Unknown SPARQList API: {api_name}. Supported APIs are {', '.join(apis)}.")
+    api = apis[api_name]
+    bound = _bind_params(api, params)
+    key = json.dumps([api_name, bound, as_text], sort_keys=True)
+    hit = id_cache.get("glycosmos", key) if cache else None
+    if hit is not None:
+        return hit[0]
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(SPARQLIST_CONCURRENCY)
+
+    async def fetch():
+        async with _semaphore:
+            async with http_client.session() as client:
+                response = await client.get(api["endpoint"], params=bound)
+        response.raise_for_status()
+        value = response.text if as_text else response.json()
+        if cache:
+            id_cache.put("glycosmos", key, value, negative=value in ([], {}, ""))
+        return value
+
+    return await _flight.run(key, fetch)
+
+
+async def gtc_image_entry(accession: str, style: str, notation: str, format: str, graph: str):
+    """
+    Get a GlyTouCan image through the image cache.
+
+    Returns:
+        tuple: The cache entry (None if the image could not be cached) and the API response
+            text (None on a cache hit).
+    """
+    entry = image_cache.lookup(accession, style, notation, format, graph)
+    if entry is not None:
+        return entry, None
+    params = {
+        "accession": accession,
+        "style": style,
+        "notation": notation,
+        "format": format,
+        "graph": graph
+    }
+    text = await call_sparqlist("gtc_image", params, as_text=True, cache=False)
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None, text
+    record = data[0] if isinstance(data, list) and data else data
+    if not isinstance(record, dict) or not record.get("image_base64"):
+        return None, text
+    entry = image_cache.store(accession, style, notation, format, graph,
+                              record["image_base64"], record.get("image_tag", ""))
+    if not os.path.exists(image_cache.blob_path(entry["digest"], format)):
+        return None, text
+    return entry, text
+
+
+def _records(value: Any) -> List[Dict[str, Any]]:
+    if isinstance(value, list):
+        return [v for v in value if isinstance(v, dict)]
+    if isinstance(value, dict):
+        return [value]
+    return []
+
+
+def _local_id(value: Any) -> str:
+    """Outputs are often IRIs (e.g. http://rdf.glycoinfo.org/glycan/G99053DY); inputs expect the ID."""
+    value = str(value)
+    if value.startswith(("http://", "https://")):
+        return re.split(r"[/#]", value.rstrip("/"))[-1]
+    return value
+
+
+def _field_values(records: List[Dict[str, Any]], field: str) -> Optional[List[str]]:
+    """The distinct values of a field (or its alias) in the records; None if no record has it."""
+    for name in (field, FIELD_ALIASES.get(field)):
+        if name and any(name in r for r in records):
+            values = []
+            for r in records:
+                value = r.get(name)
+                for v in (value if isinstance(value, list) else [value]):
+                    if v not in (None, "") and _local_id(v) not in values:
+                        values.append(_local_id(v))
+            return values
+    return None
+
+
+async def _image_reference(params: Dict[str, Any]) -> Dict[str, Any]:
+    """A `gtc_image` call through the image cache: a reference to the image instead of its data."""
+    bound = _bind_params(load_apis()["gtc_image"], params)
+    entry, text = await gtc_image_entry(**bound)
+    if entry is None:
+        raise ValueError(f"No image is available: {text}")
+    return {"accession": bound["accession"], **image_cache.reference_response(entry)}
+
+
+async def run_chain(chain_name: str, inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Run a chain from the chaining file as a pipelined DAG.
+
+    A step mapping a parameter to the `output_to` name of an earlier step depends on that step,
+    and is called once per distinct value produced by each of its calls, as soon as the call
+    returns. Other mappings are `from_question` (taken from `inputs`), `same_as(param)` (the
+    value of another parameter) and constants. A call whose records lack the field a dependent
+    step needs is recorded as an error of that step. `gtc_image` steps return references to
+    images in `image_cache`.
+
+    Args:
+        chain_name (str): The `chain_name` in the chaining file.
+        inputs (dict): Values for the `from_question` parameters.
+
+    Returns:
+        dict: The calls (and errors) of each step, and the values of the chain's `final_output` names.
+    """
+    chains = load_chains()
+    if chain_name not in chains:
+        raise ValueError(f"Unknown chain: {chain_name}. Supported chains are {', '.join(chains)}.")
+    steps = chains[chain_name]["steps"]
+    producers: Dict[str, int] = {}
+    parents: Dict[int, Optional[int]] = {}
+    for i, step in enumerate(steps):
+        parent = None
+        for source in step.get("mapping", {}).values():
+            source = str(source)
+            producer = producers.get(source, producers.get(FIELD_ALIASES.get(source, ""), None))
+            if producer is not None:
+                if parent is not None and parent != producer:
+                    raise ValueError(f"Step {step['api']} depends on more than one earlier step.")
+                parent = producer
+        parents[i] = parent
+        producers[step["output_to"]] = i
+    children = {i: [j for j, p in parents.items() if p == i] for i in range(len(steps))}
+    calls: Dict[int, Dict[str, Dict[str, Any]]] = {i: {} for i in range(len(steps))}
+    errors: Dict[int, List[str]] = {i: [] for i in range(len(steps))}
+
+    def resolve(i: int, parent_records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        fixed: Dict[str, Any] = {}
+        fanned: Dict[str, List[str]] = {}
+        for param, source in steps[i].get("mapping", {}).items():
+            source = str(source)
+            same_as = SAME_AS_PATTERN.match(source)
+            if source == "from_question":
+                if param not in inputs:
+                    raise ValueError(f"Missing input '{param}' for chain {chain_name}.")
+                fixed[param] = inputs[param]
+            elif same_as:
+                fixed[param] = inputs.get(same_as.group(1))
+            elif parents[i] is not None and (source in producers or source in FIELD_ALIASES):
+                values = _field_values(parent_records, source)
+                if values is None:
+                    raise ValueError(f"parent produced no {source}")
+                fanned[param] = values
+            else:
+                fixed[param] = source
+        if not fanned:
+            return [fixed]
+        names = list(fanned)
+        return [{**fixed, **dict(zip(names, combo))} for combo in itertools.product(*(fanned[n] for n in names))]
+
+    async def run_call(i: int, params: Dict[str, Any]) -> None:
+        key = json.dumps(params, sort_keys=True)
+        if key in calls[i]:
+            return
+        call: Dict[str, Any] = {"params": params}
+        calls[i][key] = call
+        try:
+            if steps[i]["api"] == "gtc_image":
+                call["result"] = await _image_reference(params)
+            else:
+                call["result"] = await call_sparqlist(steps[i]["api"], params)
+        except (httpx.HTTPError, ValueError) as e:
+            call["error"] = f"{type(e).__name__}: {e}"
+            return
+        records = _records(call["result"])
+        pending = []
+        for j in children[i]:
+            try:
+                pending += [run_call(j, p) for p in resolve(j, records)]
+            except ValueError as e:
+                errors[j].append(f"{e} (call {key})")
+        await asyncio.gather(*pending)
+
+    await asyncio.gather(*(run_call(i, p) for i in range(len(steps)) if parents[i] is None for p in resolve(i, [])))
+
+    final: Dict[str, Any] = {}
+    for name in chains[chain_name].get("final_output", []):
+        if name in producers:
+            final[name] = [c.get("result") for c in calls[producers[name]].values() if "result" in c]
+        else:
+            all_records = [r for i in calls for c in calls[i].values() for r in _records(c.get("result"))]
+            final[name] = _field_values(all_records, name) or []
+    return {
+        "chain": chain_name,
+        "steps": [{"api": step["api"], "output_to": step["output_to"], "calls": list(calls[i].values()),
+                   **({"errors": errors[i]} if errors[i] else {})}
+                  for i, step in enumerate(steps)],
+        "final_output": final,
+    }
@@ -0,0 +1,633 @@
+import asyncio
+import functools
+import glob
+import itertools
+import os
+import re
+import sys
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import yaml
+
+import compact_results
+import endpoints
+import http_client
+import mie_cache
+import result_formats
+import scheduler
+
+try:
+    import pyoxigraph
+except ImportError:  # the "subgraph" extra; without it every query goes to the endpoint
+    pyoxigraph = None
+
+# --- Local cache of entity neighborhoods ---
+# Agents tend to ask many slightly different questions about the same few entities (one
+# protein, one PDB entry). The neighborhood of such an entity -- all its triples, and the
+# triples of the nodes it points to -- is fetched once into an embedded Oxigraph store, and
+# later SELECT queries that only read that neighborhood are answered from the store in
+# milliseconds instead of by the endpoint.
+# A query is answered locally when every triple pattern
+#   - has a cached entity IRI as its subject, or
+#   - has as its subject a variable that a required (not OPTIONAL/UNION/MINUS) pattern binds
+#     to an object of a cached entity,
+# and the query uses nothing the store cannot evaluate like the endpoint (SERVICE, GRAPH,
+# property paths, blank-node syntax, subqueries, Virtuoso bif:/sql: functions). Prefixes
+# must be declared. A query with FROM clauses reads neighborhoods fetched from the same
+# graphs. Only complete neighborhoods are cached: one with more than NEIGHBORHOOD_MAX_TRIPLES
+# triples is not cached at all.
+# An entity is fetched (at background priority) once ADMIT_AFTER queries have missed on it,
+# and the subjects of the MIE `sample_rdf_entries` are fetched after startup, one at a time
+# (unless $RDFPORTAL_SUBGRAPH_WARMUP is "0"). At most BACKGROUND_FETCHES fetches run at once,
+# so they never take more than a few endpoint slots. Neighborhoods older than MAX_AGE are not
+# used, and the least recently used ones are evicted beyond MAX_TRIPLES triples in all.
+
+MAX_AGE = 24 * 3600.0  # seconds
+MAX_TRIPLES = 1_000_000
+NEIGHBORHOOD_MAX_TRIPLES = 20_000
+ADMIT_AFTER = 2  # misses on an entity before its neighborhood is fetched
+MAX_ANCHORS = 4  # cached entities a query may read
+MAX_MISS_HISTORY = 10_000  # entities whose misses are counted
+SEEDS_PER_DATABASE = 3
+BACKGROUND_FETCHES = 2  # concurrent background fetches
+WARMUP = os.environ.get("RDFPORTAL_SUBGRAPH_WARMUP", "1") != "0"
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+
+TOKEN = re.compile(r"""
+    (?P<space>\s+|\#[^\n]*)
+  | (?P<iri><[^<>"{}|^`\\\s]*>)
+  | (?P<string>\"\"\"(?:[^"\\]|\\.|"(?!""))*\"\"\"|'''(?:[^'\\]|\\.|'(?!''))*'''|"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')
+  | (?P<var>[?$]\w+)
+  | (?P<bnode>_:[\w-]+(?:\.[\w-]+)*)
+  | (?P<pname>(?:[A-Za-z][\w-]*(?:\.[\w-]+)*)?:(?:[\w%:-]|\.(?=[\w%:-]))*)
+  | (?P<number>[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<lang>@[A-Za-z]+(?:-[A-Za-z0-9]+)*)
+  | (?P<word>[A-Za-z_]\w*)
+  | (?P<symbol>\^\^|&&|\|\||!=|<=|>=|[{}()\[\].,;*+/|^!=<>?-])
+""", re.VERBOSE | re.DOTALL)
+PATH_SYMBOLS = {"/", "|", "*", "+", "?", "^"}
+GROUP_KEYWORDS = {"OPTIONAL", "MINUS", "UNION", "FILTER", "BIND", "VALUES"}
+UNSUPPORTED_PREFIXES = {"bif", "sql"}
+FROM_CLAUSE = re.compile(r"\bFROM\s+<[^<>\s]*>", re.IGNORECASE)
+SAMPLE_PREFIX = re.compile(r"^\s*@prefix\s+([A-Za-z][\w.-]*|):\s*<([^<>\s]+)>\s*\.", re.IGNORECASE | re.MULTILINE)
+SAMPLE_SUBJECT = re.compile(r"^\s*(?:<([^<>\s]+)>|([A-Za-z][\w.-]*):(\S*?))[\s;]", re.MULTILINE)
+
+
+class _Unsupported(Exception):
+    pass
+
+
+class _Parser:
+    """
+    Reads the triple patterns of a SELECT query: (subject, predicate, object, required),
+    where terms are ("iri", IRI), ("var", name), ("literal", text) or ("bnode", label).
+    """
+
+    def __init__(self, query: str):
+        self.tokens: List[Tuple[str, str]] = []
+        position = 0
+        while position < len(query):
+            match = TOKEN.match(query, position)
+            if match is None:
+                raise _Unsupported(f"unexpected character at {position}")
+            if match.lastgroup != "space":
+                self.tokens.append((match.lastgroup, match.group()))
+            position = match.end()
+        self.i = 0
+        self.prefixes: Dict[str, str] = {}
+        self.datasets: List[str] = []
+        self.patterns: List[Tuple[Tuple[str, str], Tuple[str, str], Tuple[str, str], bool]] = []
+
+    def peek(self, ahead: int = 0) -> Tuple[str, str]:
+        i = self.i + ahead
+        return self.tokens[i] if i < len(self.tokens) else ("end", "")
+
+    def next(self) -> Tuple[str, str]:
+        token = self.peek()
+        if token[0] == "end":
+            raise _Unsupported("unexpected end of query")
+        self.i += 1
+        return token
+
+    def keyword(self, ahead: int = 0) -> str:
+        kind, text = self.peek(ahead)
+        return text.upper() if kind == "word" else ""
+
+    def expect(self, text: str) -> None:
+        if self.next()[1] != text:
+            raise _Unsupported(f"expected '{text}'")
+
+    def parse(self) -> None:
+        while self.keyword() in ("PREFIX", "BASE"):
+            if self.keyword() == "BASE":
+                raise _Unsupported("BASE")
+            self.next()
+            kind, name = self.next()
+            kind_iri, iri = self.next()
+            if kind != "pname" or not name.endswith(":") or kind_iri != "iri":
+                raise _Unsupported("PREFIX declaration")
+            self.prefixes[name[:-1]] = iri[1:-1]
+        if self.keyword() != "SELECT":
+            raise _Unsupported("not a SELECT query")
+        self.next()
+        while self.peek()[1] != "{":
+            if self.keyword() == "FROM":
+                self.next()
+                kind, text = self.next()
+                if kind not in ("iri", "pname"):
+                    raise _Unsupported("FROM NAMED")
+                self.datasets.append(text[1:-1] if kind == "iri" else self.expand(text))
+                continue
+            self.skip_terms(self.next())
+        self.group(required=True)
+        # Solution modifiers may follow, and a trailing VALUES block, which only restricts.
+        while self.peek()[0] != "end":
+            self.skip_terms(self.next())
+
+    def skip_terms(self, token: Tuple[str, str]) -> None:
+        kind, text = token
+        if kind == "pname":
+            self.expand(text)
+        elif kind == "word" and text.upper() in ("EXISTS", "SERVICE", "GRAPH", "SELECT"):
+            raise _Unsupported(text.upper())
+
+    def skip_balanced(self, opening: str, closing: str) -> None:
+        self.expect(opening)
+        depth = 1
+        while depth:
+            token = self.next()
+            if token[1] == opening:
+                depth += 1
+            elif token[1] == closing:
+                depth -= 1
+            elif token[1] in "{}":
+                raise _Unsupported("group pattern inside an expression")
+            else:
+                self.skip_terms(token)
+
+    def group(self, required: bool) -> None:
+        self.expect("{")
+        after_union = False
+        while True:
+            kind, text = self.peek()
+            word = self.keyword()
+            if text == "}":
+                self.next()
+                return
+            if text == "{":
+                end = self._closing(self.i)
+                union = after_union or (end + 1 < len(self.tokens) and self.tokens[end + 1][1].upper() == "UNION")
+                self.group(required and not union)
+                after_union = False
+                continue
+            if word == "UNION":
+                self.next()
+                after_union = True
+                continue
+            if word in ("OPTIONAL", "MINUS"):
+                self.next()
+                self.group(False)
+            elif word == "FILTER":
+                self.next()
+                if self.keyword() in ("NOT", "EXISTS"):
+                    if self.keyword() == "NOT":
+                        self.next()
+                    self.next()
+                    self.group(False)
+                elif self.peek()[1] == "(":
+                    self.skip_balanced("(", ")")
+                else:
+                    self.skip_terms(self.next())
+                    self.skip_balanced("(", ")")
+            elif word == "BIND":
+                self.next()
+                self.skip_balanced("(", ")")
+            elif word == "VALUES":
+                self.next()
+                if self.peek()[1] == "(":
+                    self.skip_balanced("(", ")")
+                else:
+                    self.next()
+                self.skip_balanced("{", "}")
+            elif text == ".":
+                self.next()
+            elif word and word not in ("A", "TRUE", "FALSE"):
+                raise _Unsupported(word)
+            else:
+                self.triples(required)
+            after_union = False
+
+    def _closing(self, start: int) -> int:
+        depth = 0
+        for i in range(start, len(self.tokens)):
+            if self.tokens[i][1] == "{":
+                depth += 1
+            elif self.tokens[i][1] == "}":
+                depth -= 1
+                if depth == 0:
+                    return i
+        raise _Unsupported("unbalanced braces")
+
+    def triples(self, required: bool) -> None:
+        subject = self.term()
+        while True:
+            predicate = self.verb()
+            while True:
+                self.patterns.append((subject, predicate, self.term(), required))
+                if self.peek()[1] != ",":
+                    break
+                self.next()
+            if self.peek()[1] != ";":
+                return
+            while self.peek()[1] == ";":
+                self.next()
+            if self.peek()[1] in (".", "}") or self.keyword() in GROUP_KEYWORDS:
+                return
+
+    def verb(self) -> Tuple[str, str]:
+        kind, text = self.next()
+        if kind == "word" and text == "a":
+            term = ("iri", RDF_TYPE)
+        elif kind == "var":
+            term = ("var", text[1:])
+        elif kind in ("iri", "pname"):
+            term = ("iri", text[1:-1] if kind == "iri" else self.expand(text))
+        else:
+            raise _Unsupported("property path")
+        if self.peek()[1] in PATH_SYMBOLS:
+            raise _Unsupported("property path")
+        return term
+
+    def term(self) -> Tuple[str, str]:
+        kind, text = self.next()
+        if kind == "var":
+            return ("var", text[1:])
+        if kind == "iri":
+            return ("iri", text[1:-1])
+        if kind == "pname":
+            return ("iri", self.expand(text))
+        if kind == "bnode":
+            return ("bnode", text)
+        if kind == "number" or (kind == "word" and text.lower() in ("true", "false")):
+            return ("literal", text)
+        if kind == "string":
+            if self.peek()[0] == "lang":
+                self.next()
+            elif self.peek()[1] == "^^":
+                self.next()
+                datatype = self.next()
+                if datatype[0] == "pname":
+                    self.expand(datatype[1])
+                elif datatype[0] != "iri":
+                    raise _Unsupported("datatype")
+            return ("literal", text)
+        raise _Unsupported(f"term {text}")
+
+    def expand(self, pname: str) -> str:
+        prefix, local = pname.split(":", 1)
+        if prefix.lower() in UNSUPPORTED_PREFIXES:
+            raise _Unsupported(f"{prefix}: functions")
+        if prefix not in self.prefixes:
+            raise _Unsupported(f"undeclared prefix {prefix}:")
+        return self.prefixes[prefix] + local
+
+
+@functools.lru_cache(maxsize=1024)
+def shape(query: str) -> Optional[Tuple[frozenset, frozenset, Tuple[str, ...]]]:
+    """
+    The cached entities a SELECT query would need, as (entities, entities needed with the
+    triples of their objects, FROM graphs), or None if the query cannot be answered from
+    neighborhoods.
+    """
+    try:
+        parser = _Parser(query)
+        parser.parse()
+    except _Unsupported:
+        return None
+    bound: Dict[str, str] = {}
+    for subject, _, obj, required in parser.patterns:
+        if subject[0] == "iri" and obj[0] == "var" and required:
+            bound.setdefault(obj[1], subject[1])
+    anchors, deep = set(), set()
+    for subject, _, _, _ in parser.patterns:
+        if subject[0] == "iri":
+            anchors.add(subject[1])
+        elif subject[0] == "var" and subject[1] in bound:
+            deep.add(bound[subject[1]])
+        else:
+            return None
+    if not anchors or len(anchors) > MAX_ANCHORS:
+        return None
+    return frozenset(anchors), frozenset(deep), tuple(sorted(set(parser.datasets)))
+
+
+class Neighborhood:
+    def __init__(self, graph: Any, triples: int, depth: int):
+        self.graph = graph
+        self.triples = triples
+        self.depth = depth
+        self.fetched = time.time()
+
+
+_store = None
+_graph_ids = itertools.count(1)
+# Neighborhoods are keyed by (database, FROM graphs, entity IRI).
+Key = Tuple[str, Tuple[str, ...], str]
+_neighborhoods: "OrderedDict[Key, Neighborhood]" = OrderedDict()
+_misses: "OrderedDict[Key, int]" = OrderedDict()
+_pending: Set[Key] = set()
+_too_large: "OrderedDict[Key, float]" = OrderedDict()  # when a neighborhood was found too large
+_tasks: Set[asyncio.Task] = set()
+_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+_counts = {"hits": 0, "misses": 0, "fetches": 0, "fetch_errors": 0, "too_large": 0, "evictions": 0}
+
+
+def available() -> bool:
+    return pyoxigraph is not None
+
+
+def _get_store():
+    global _store
+    if _store is None:
+        _store = pyoxigraph.Store()
+    return _store
+
+
+def _fresh(key: Key, depth: int) -> Optional[Neighborhood]:
+    neighborhood = _neighborhoods.get(key)
+    if neighborhood is None or neighborhood.depth < depth or time.time() - neighborhood.fetched > MAX_AGE:
+        return None
+    return neighborhood
+
+
+def answer(sparql_query: str, dbname: str, result_format: str) -> Optional[bytes]:
+    """
+    Answer a SELECT query from the cached neighborhoods, in "csv", "tsv" or "json" (SPARQL
+    results formats). Returns None if the query has to go to the endpoint.
+    """
+    if pyoxigraph is None:
+        return None
+    needed = shape(sparql_query)
+    if needed is None:
+        return None
+    anchors, deep, datasets = needed
+    keys = [(dbname, datasets, iri) for iri in anchors]
+    neighborhoods, missing = [], []
+    for key in keys:
+        neighborhood = _fresh(key, 2 if key[2] in deep else 1)
+        if neighborhood is None:
+            missing.append(key)
+        else:
+            neighborhoods.append(neighborhood)
+    if missing:
+        _counts["misses"] += 1
+        for key in missing:
+            _admit(key)
+        return None
+    store = _get_store()
+    if len(neighborhoods) > 1:
+        # Neighborhoods may share triples (e.g. a common taxon); merged, each is matched once.
+        store = pyoxigraph.Store()
+        store.extend(pyoxigraph.Quad(q.subject, q.predicate, q.object) for n in neighborhoods
+                     for q in _get_store().quads_for_pattern(None, None, None, n.graph))
+        graphs = None
+    else:
+        graphs = [neighborhoods[0].graph]
+    try:
+        results = store.query(FROM_CLAUSE.sub("", sparql_query), default_graph=graphs)
+        data = results.serialize(format={
+            "csv": pyoxigraph.QueryResultsFormat.CSV,
+            "tsv": pyoxigraph.QueryResultsFormat.TSV,
+            "json": pyoxigraph.QueryResultsFormat.JSON,
+        }[result_format])
+    except (SyntaxError, ValueError, OSError, TypeError):
+        return None
+    for key in keys:
+        _neighborhoods.move_to_end(key)
+    _counts["hits"] += 1
+    return data
+
+
+def _admit(key: Key) -> None:
+    now = time.time()
+    cached = _neighborhoods.get(key)
+    if cached is not None:
+        # Fetched only one level deep, because the two levels were too large: that will not change.
+        if now - cached.fetched > MAX_AGE:
+            _schedule(key)
+        return
+    if now - _too_large.get(key, 0.0) <= MAX_AGE:
+        return
+    misses = _misses[key] = _misses.pop(key, 0) + 1
+    while len(_misses) > MAX_MISS_HISTORY:
+        _misses.popitem(last=False)
+    if misses >= ADMIT_AFTER:
+        _schedule(key)
+
+
+def _schedule(key: Key) -> None:
+    if key in _pending:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    _pending.add(key)
+    with scheduler.priority("background"):
+        task = loop.create_task(_fetch_quietly(key))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+def _fetch_slots() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    slots = _slots.get(loop)
+    if slots is None:
+        slots = _slots[loop] = asyncio.Semaphore(BACKGROUND_FETCHES)
+    return slots
+
+
+async def _fetch_quietly(key: Key) -> None:
+    try:
+        async with _fetch_slots():
+            await fetch(*key)
+    except Exception as e:
+        _counts["fetch_errors"] += 1
+        print(f"Warning: could not fetch the neighborhood of <{key[2]}> from {key[0]}: {e}", file=sys.stderr)
+    finally:
+        _pending.discard(key)
+
+
+def _term(value: Dict[str, str], blank_nodes: Dict[str, Any]) -> Any:
+    kind = value["type"]
+    if kind == "uri":
+        return pyoxigraph.NamedNode(value["value"])
+    if kind == "bnode":
+        # Labels are only meaningful within one result; fresh nodes keep neighborhoods apart.
+        return blank_nodes.setdefault(value["value"], pyoxigraph.BlankNode())
+    if "xml:lang" in value:
+        return pyoxigraph.Literal(value["value"], language=value["xml:lang"])
+    if "datatype" in value:
+        return pyoxigraph.Literal(value["value"], datatype=pyoxigraph.NamedNode(value["datatype"]))
+    return pyoxigraph.Literal(value["value"])
+
+
+def _neighborhood_query(iri: str, datasets: Tuple[str, ...], depth: int) -> str:
+    # One more row than a neighborhood may have tells whether it was cut off.
+    dataset = "".join(f"FROM <{graph}>\n" for graph in datasets)
+    if depth == 2:
+        return (f"SELECT ?p ?o ?p2 ?o2\n{dataset}WHERE {{\n  <{iri}> ?p ?o .\n"
+                f"  OPTIONAL {{ ?o ?p2 ?o2 . FILTER(!isLiteral(?o)) }}\n}}\nLIMIT {NEIGHBORHOOD_MAX_TRIPLES + 1}")
+    return f"SELECT ?p ?o\n{dataset}WHERE {{\n  <{iri}> ?p ?o .\n}}\nLIMIT {NEIGHBORHOOD_MAX_TRIPLES + 1}"
+
+
+async def fetch(dbname: str, datasets: Tuple[str, ...], iri: str) -> Optional[Neighborhood]:
+    """
+    Fetch the neighborhood of an entity into the store: its triples and those of its objects,
+    or only its own triples if that is too large. Returns None if even those are too many.
+    `datasets` are the FROM graphs of the queries it will answer (none for the default graph).
+    """
+    if pyoxigraph is None:
+        raise ValueError("The subgraph cache needs pyoxigraph (install the \"subgraph\" extra).")
+    if not iri or any(ch in iri for ch in '<>"{}|^`\\ \n'):
+        raise ValueError(f"Invalid IRI: {iri}")
+    _counts["fetches"] += 1
+    entity = pyoxigraph.NamedNode(iri)
+    for depth in (2, 1):
+        query = _neighborhood_query(iri, datasets, depth)
+        async with http_client.session() as client:
+            results = await endpoints.failover(
+                dbname, lambda url: result_formats.fetch_bindings(client, url, query, typed=True))
+        rows = results["bindings"]
+        if len(rows) > NEIGHBORHOOD_MAX_TRIPLES:
+            continue
+        blank_nodes: Dict[str, Any] = {}
+        graph = pyoxigraph.NamedNode(f"urn:rdfportal-mcp:neighborhood:{next(_graph_ids)}")
+        quads = set()
+        for row in rows:
+            if "p" not in row or "o" not in row:
+                continue
+            obj = _term(row["o"], blank_nodes)
+            quads.add(pyoxigraph.Quad(entity, _term(row["p"], blank_nodes), obj, graph))
+            if "p2" in row and "o2" in row:
+                quads.add(pyoxigraph.Quad(obj, _term(row["p2"], blank_nodes), _term(row["o2"], blank_nodes), graph))
+        _put((dbname, datasets, iri), Neighborhood(graph, len(quads), depth), quads)
+        return _neighborhoods[(dbname, datasets, iri)]
+    _counts["too_large"] += 1
+    _too_large[(dbname, datasets, iri)] = time.time()
+    _misses.pop((dbname, datasets, iri), None)
+    while len(_too_large) > MAX_MISS_HISTORY:
+        _too_large.popitem(last=False)
+    return None
+
+
+def _put(key: Key, neighborhood: Neighborhood, quads: Set[Any]) -> None:
+    store = _get_store()
+    store.extend(quads)
+    old = _neighborhoods.pop(key, None)
+    if old is not None:
+        store.remove_graph(old.graph)
+    _neighborhoods[key] = neighborhood
+    _misses.pop(key, None)
+    total = sum(n.triples for n in _neighborhoods.values())
+    while total > MAX_TRIPLES and len(_neighborhoods) > 1:
+        _, evicted = _neighborhoods.popitem(last=False)
+        store.remove_graph(evicted.graph)
+        total -= evicted.triples
+        _counts["evictions"] += 1
+
+
+async def describe(dbname: str, iri: str, namespaces: Dict[str, str]) -> str:
+    """The neighborhood of an entity in Turtle, from the cache or fetched now."""
+    key = (dbname, (), iri)
+    neighborhood = _fresh(key, 1)
+    if neighborhood is None:
+        neighborhood = await fetch(*key)
+        if neighborhood is None:
+            raise ValueError(f"The neighborhood of <{iri}> has more than {NEIGHBORHOOD_MAX_TRIPLES} triples.")
+    _neighborhoods.move_to_end(key)
+    triples = sorted((quad.triple for quad in _get_store().quads_for_pattern(None, None, None, neighborhood.graph)),
+                     key=lambda triple: (triple.subject.value != iri, str(triple.subject), str(triple.predicate)))
+    compactor = compact_results.IRICompactor(namespaces)
+    for triple in triples:
+        for term in (triple.subject, triple.predicate, triple.object):
+            if isinstance(term, pyoxigraph.NamedNode):
+                compactor.compact(term.value)
+    return pyoxigraph.serialize(triples, format=pyoxigraph.RdfFormat.TURTLE, prefixes=compactor.used).decode("utf-8")
+
+
+def _sample_subject(rdf: str, prefixes: Dict[str, str]) -> Optional[str]:
+    prefixes = dict(prefixes, **{label: namespace for label, namespace in SAMPLE_PREFIX.findall(rdf)})
+    match = SAMPLE_SUBJECT.search(SAMPLE_PREFIX.sub("", rdf) + "\n")
+    if match is None:
+        return None
+    if match.group(1):
+        return match.group(1)
+    return prefixes[match.group(2)] + match.group(3) if match.group(2) in prefixes else None
+
+
+def sample_entities(mie_dir: str, namespaces: Dict[str, str]) -> List[Tuple[str, str]]:
+    """
+    (dbname, IRI) of the subjects of the first `sample_rdf_entries` of each MIE file. The
+    samples' prefixes are those they declare, those of the MIE's shape expressions, or those
+    of `namespaces` (namespace -> label), in this order.
+    """
+    labels = {label: namespace for namespace, label in namespaces.items()}
+    entities = []
+    for path in sorted(glob.glob(os.path.join(mie_dir, "*.yaml"))):
+        dbname = os.path.splitext(os.path.basename(path))[0]
+        if dbname not in endpoints.registry:
+            continue
+        try:
+            data = mie_cache.load_yaml(path)
+        except (OSError, yaml.YAMLError):
+            continue
+        if not isinstance(data, dict) or not isinstance(data.get("sample_rdf_entries"), list):
+            continue
+        shapes = data.get("shape_expressions")
+        prefixes = dict(labels, **dict(compact_results.PREFIX_PATTERN.findall(shapes if isinstance(shapes, str) else "")))
+        found: List[str] = []
+        for sample in data["sample_rdf_entries"]:
+            iri = _sample_subject(str(sample.get("rdf", "")), prefixes) if isinstance(sample, dict) else None
+            if iri and iri not in found:
+                found.append(iri)
+        entities += [(dbname, iri) for iri in found[:SEEDS_PER_DATABASE]]
+    return entities
+
+
+def warm(mie_dir: str, shex_dir: str) -> None:
+    """Fetch the neighborhoods of the MIE sample entities in the background, one at a time."""
+    if pyoxigraph is None or not WARMUP:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    keys = [(dbname, (), iri) for dbname, iri in
+            sample_entities(mie_dir, compact_results.load_prefix_table(mie_dir, shex_dir))]
+    with scheduler.priority("background"):
+        task = loop.create_task(_warm(keys))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def _warm(keys: List[Key]) -> None:
+    for key in keys:
+        if key in _pending or _fresh(key, 1) is not None:
+            continue
+        _pending.add(key)
+        await _fetch_quietly(key)
+
+
+def stats() -> Dict[str, Any]:
+    """Cached neighborhoods and triples, and query and fetch counts."""
+    return {
+        "enabled": pyoxigraph is not None,
+        "entities": len(_neighborhoods),
+        "triples": sum(n.triples for n in _neighborhoods.values()),
+        "pending_fetches": len(_pending),
+        **_counts,
+    }
@@ -0,0 +1,26 @@
+import asyncio
+
+from fastmcp import FastMCP
+
+import api_tools
+import server
+
+# --- Both servers in one process ---
+# Mounts the RDF Portal server (`server.py`) and the REST API tools (`api_tools.py`) into one
+# FastMCP app without prefixes, so the tool names are the same as with two processes. Both
+# share one interpreter, one event loop, the HTTP connection pool (`http_client`) and the
+# caches. Run with `uv run src/unified.py`, or over HTTP with `uv run src/serve.py unified`.
+
+mcp = FastMCP("RDF Portal MCP Server")
+mcp.mount(server.mcp)
+mcp.mount(api_tools.mcp)
+on_startup = server.on_startup
+
+
+async def main() -> None:
+    on_startup()
+    await mcp.run_async()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())